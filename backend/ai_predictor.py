@@ -2,8 +2,85 @@
 import json
 import random
 import re
+import threading
+import time
 from typing import Dict, Optional, List
 from functools import lru_cache
+from collections import deque
+
+from metrics import observe_stage
+
+class FoodAutomaton:
+    """Aho-Corasick automaton over food names for single-pass meal scanning"""
+    
+    def __init__(self, names):
+        # Trie stored as parallel lists indexed by state number
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        
+        for name in names:
+            state = 0
+            for char in name:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = next_state
+                state = next_state
+            self.output[state].append(name)
+        
+        # Breadth-first pass to build failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                if self.fail[next_state] == next_state:
+                    self.fail[next_state] = 0
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+    
+    @staticmethod
+    def _is_boundary(text: str, index: int) -> bool:
+        """True when index sits on a word boundary of text"""
+        return index < 0 or index >= len(text) or not text[index].isalnum()
+    
+    def scan(self, text: str) -> List[tuple]:
+        """Return non-overlapping (start, end, name) matches, longest first at each position"""
+        candidates = []
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for name in self.output[state]:
+                start = index - len(name) + 1
+                end = index + 1
+                # Accept simple plurals ("eggs", "tomatoes") on the trailing edge
+                if not self._is_boundary(text, end) and text[end:end + 1] == 's':
+                    end += 1
+                elif not self._is_boundary(text, end) and text[end:end + 2] == 'es':
+                    end += 2
+                if self._is_boundary(text, start - 1) and self._is_boundary(text, end):
+                    candidates.append((start, end, name))
+        
+        # Leftmost-longest selection so "chicken breast" wins over "chicken"
+        candidates.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        matches = []
+        last_end = 0
+        for start, end, name in candidates:
+            if start >= last_end:
+                matches.append((start, end, name))
+                last_end = end
+        return matches
+
+_automaton_lock = threading.Lock()
 
 class NutrientPredictor:
     """AI-powered nutrient prediction for common foods"""
@@ -308,25 +385,35 @@ class NutrientPredictor:
     
     @classmethod
     @lru_cache(maxsize=500)
-    def predict_nutrients_cached(cls, food_description: str, quantity_g: Optional[float] = None) -> Dict:
+    def predict_nutrients_cached(cls, food_description: str, quantity_g: Optional[float] = None, category: str = None) -> Dict:
         """Cached version of predict_nutrients for better performance"""
-        return cls.predict_nutrients(food_description, quantity_g)
+        return cls.predict_nutrients(food_description, quantity_g, category)
     
     @classmethod
     def predict_nutrients(cls, food_description: str, quantity_g: Optional[float] = None, category: str = None) -> Dict:
         """Predict nutrients for a food item with optional meal category context"""
         # Clean the food description
+        stage_start = time.perf_counter()
         clean_name = cls.extract_food_name(food_description)
+        now = time.perf_counter()
+        observe_stage("extract_food_name", now - stage_start)
         
         # Extract weight if not provided
+        stage_start = now
         if quantity_g is None:
             quantity_g = cls.extract_weight(food_description)
             if quantity_g is None:
                 quantity_g = 100  # Default to 100g
+        now = time.perf_counter()
+        observe_stage("extract_weight", now - stage_start)
         
         # Find best match
+        stage_start = now
         matched_food = cls.find_best_match(clean_name)
+        now = time.perf_counter()
+        observe_stage("find_best_match", now - stage_start)
         
+        stage_start = now
         if matched_food:
             # Use database values
             nutrients = cls.FOOD_DATABASE[matched_food].copy()
@@ -362,9 +449,91 @@ class NutrientPredictor:
                 "source": "ai_estimation",
                 "matched_food": None
             })
+        observe_stage("compute_nutrients", time.perf_counter() - stage_start)
         
         return nutrients
     
+    @classmethod
+    def get_automaton(cls) -> FoodAutomaton:
+        """Build the food name automaton once and reuse it"""
+        automaton = cls.__dict__.get('_automaton')
+        if automaton is None:
+            with _automaton_lock:
+                automaton = cls.__dict__.get('_automaton')
+                if automaton is None:
+                    automaton = FoodAutomaton(cls.FOOD_DATABASE.keys())
+                    cls._automaton = automaton
+        return automaton
+    
+    @classmethod
+    def decompose_meal(cls, food_description: str, category: str = None) -> Dict:
+        """Split a meal description into foods with their own quantities in one scan"""
+        text = food_description.lower()
+        matches = cls.get_automaton().scan(text)
+        
+        if not matches:
+            # Nothing recognised, treat the whole description as a single food
+            prediction = cls.predict_nutrients(food_description, category=category)
+            components = [prediction]
+        else:
+            # Text between two foods is split at the first and last separator: the part
+            # before belongs to the previous food ("rice 150g, ...") and the part after
+            # to the next one ("... and 100g broccoli"). Parts in between, and parts before
+            # the first or after the last food, name foods the database does not know
+            separator = re.compile(r',|;|\+|&|\b(?:and|with|plus)\b')
+            gaps = [(0, text[:matches[0][0]])]
+            gaps += [(prev_end, text[prev_end:start]) for (_, prev_end, _), (start, _, _) in zip(matches, matches[1:])]
+            gaps.append((matches[-1][1], text[matches[-1][1]:]))
+            before, after, unmatched = [], [], []
+            last = len(gaps) - 1
+            for i, (offset, gap) in enumerate(gaps):
+                bounds = [0]
+                for split in separator.finditer(gap):
+                    bounds += [split.start(), split.end()]
+                bounds.append(len(gap))
+                parts = [(offset + bounds[k], gap[bounds[k]:bounds[k + 1]]) for k in range(0, len(bounds), 2)]
+                if 0 < i < last and len(parts) == 1:
+                    # No separator between two foods: all of it goes with the next one
+                    parts.insert(0, (offset, ''))
+                if i > 0:
+                    after.append(parts.pop(0)[1])
+                if i < last:
+                    before.append(parts.pop()[1])
+                unmatched += [(position, part.strip()) for position, part in parts if cls.extract_food_name(part)]
+            
+            components = []
+            for i, (start, end, name) in enumerate(matches):
+                quantity_g = cls.extract_weight(before[i])
+                if quantity_g is None:
+                    quantity_g = cls.extract_weight(after[i])
+                prediction = cls.predict_nutrients(name, quantity_g, category)
+                prediction["original_name"] = text[start:end]
+                components.append((start, prediction))
+            for position, part in unmatched:
+                # Estimated like an unknown single food, rather than left out of the totals
+                prediction = cls.predict_nutrients(part, category=category)
+                prediction["confidence"] = "low"
+                components.append((position, prediction))
+            components = [prediction for _, prediction in sorted(components, key=lambda c: c[0])]
+        
+        totals = {"calories": 0, "protein": 0, "fat": 0, "carbs": 0, "quantity_g": 0}
+        for component in components:
+            for key in totals:
+                totals[key] += component.get(key, 0)
+        
+        confidence_order = ["low", "medium", "high"]
+        confidence = min((c["confidence"] for c in components), key=confidence_order.index)
+        
+        return {
+            "components": components,
+            "totals": totals,
+            "component_count": len(components),
+            "food_name": ", ".join(c["food_name"] for c in components),
+            "original_name": food_description,
+            "confidence": confidence,
+            "source": "meal_decomposition"
+        }
+    
     @classmethod
     def adjust_by_category(cls, nutrients: Dict, category: str) -> Dict:
         """Adjust nutrient estimates based on meal category"""
@@ -618,4 +787,8 @@ class NutrientPredictor:
         }
 
 # Singleton instance
-predictor = NutrientPredictor()
\ No newline at end of file
+predictor = NutrientPredictor()
+
+def call_predictor(method: str, *args, **kwargs):
+    """Module-level entry point so predictor calls can run on a process pool"""
+    return getattr(predictor, method)(*args, **kwargs)
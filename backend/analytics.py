@@ -0,0 +1,198 @@
+# backend/analytics.py
+"""Vectorized analytics over dense per-day arrays.
+
+The entry store's columns are bucketed into one slot per calendar day with
+np.bincount, then rolling averages, streaks and breakdowns are computed with
+cumulative sums and convolutions instead of Python loops, so multi-year
+histories stay cheap.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from columns import category_code, category_name
+
+DEFAULT_TREND_DAYS = 90
+ROLLING_WINDOWS = (7, 30)
+MAX_RANGE_DAYS = 366 * 50
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+class DailySeries:
+    """Per-day totals for a contiguous date range (index 0 is start)"""
+
+    __slots__ = ('start', 'calories', 'protein', 'meals', 'category_calories')
+
+    def __init__(self, start: date, calories, protein, meals, category_calories: Dict[str, float]):
+        self.start = start
+        self.calories = calories
+        self.protein = protein
+        self.meals = meals
+        self.category_calories = category_calories
+
+    def __len__(self) -> int:
+        return len(self.calories)
+
+    @property
+    def logged(self):
+        return self.meals > 0
+
+    def dates(self) -> List[str]:
+        return [(self.start + timedelta(days=i)).isoformat() for i in range(len(self))]
+
+def parse_range(args, store, default_days: Optional[int] = DEFAULT_TREND_DAYS):
+    """start/end query arguments to dates; without start, the last default_days (or the whole history)"""
+    end = date.fromisoformat(args['end']) if args.get('end') else date.today()
+    if args.get('start'):
+        start = date.fromisoformat(args['start'])
+    elif default_days:
+        start = end - timedelta(days=default_days - 1)
+    else:
+        history = store.date_range()
+        start = min(date.fromisoformat(history[0]), end) if history else end
+
+    if start > end:
+        raise ValueError('start must not be after end')
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'Range is limited to {MAX_RANGE_DAYS} days')
+    return start, end
+
+def daily_series(store, start: date, end: date) -> DailySeries:
+    """Bucket the store's entries between start and end into dense per-day arrays.
+    Archived months contribute their per-day totals, so their files stay closed."""
+    snapshot = store.column_snapshot(start.isoformat(), end.isoformat())
+    archived = store.archived_totals(start.isoformat(), end.isoformat())
+    size = (end - start).days + 1
+
+    if snapshot:
+        days = np.concatenate([np.frombuffer(s[0], dtype=np.int32) for s in snapshot]).astype(np.int64)
+        calories = np.concatenate([np.frombuffer(s[1], dtype=np.int32) for s in snapshot]).astype(np.int64)
+        protein = np.concatenate([np.frombuffer(s[2], dtype=np.int32) for s in snapshot]).astype(np.int64)
+        categories = np.concatenate([np.frombuffer(s[3], dtype=np.uint8) for s in snapshot]).astype(np.int64)
+    else:
+        days = calories = protein = categories = np.zeros(0, dtype=np.int64)
+    meals = np.ones(len(days), dtype=np.int64)
+    if archived:
+        # One row per day and category, weighted by its number of meals
+        rows = np.array([(day, category_code(category), cal, prot, count)
+                         for day, category, cal, prot, count in archived], dtype=np.int64)
+        days, categories, calories, protein, meals = (
+            np.concatenate(pair) for pair in zip((days, categories, calories, protein, meals), rows.T))
+
+    offsets = days - start.toordinal()
+    mask = (offsets >= 0) & (offsets < size)
+    offsets, calories, protein, categories, meals = (
+        offsets[mask], calories[mask], protein[mask], categories[mask], meals[mask])
+
+    category_totals = np.bincount(categories, weights=calories) if len(categories) else np.zeros(0)
+    return DailySeries(
+        start,
+        np.bincount(offsets, weights=calories, minlength=size),
+        np.bincount(offsets, weights=protein, minlength=size),
+        np.bincount(offsets, weights=meals, minlength=size).astype(np.int64),
+        {category_name(code): float(total) for code, total in enumerate(category_totals) if total}
+    )
+
+def rolling_average(values, logged, window: int):
+    """Mean over the logged days in each trailing window; NaN where none were logged"""
+    kernel = np.ones(window)
+    totals = np.convolve(values, kernel)[:len(values)]
+    counts = np.convolve(logged.astype(np.float64), kernel)[:len(values)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, totals / counts, np.nan)
+
+def _json_floats(values, digits: int = 1) -> List[Optional[float]]:
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+def trends_window(start: date, end: date):
+    """Dates trends() reads: far enough back that the first day already has full windows"""
+    return start - timedelta(days=max(ROLLING_WINDOWS) - 1), end
+
+def trends(store, start: date, end: date) -> Dict:
+    """Daily totals with 7- and 30-day rolling averages"""
+    warmup = max(ROLLING_WINDOWS) - 1
+    series = daily_series(store, *trends_window(start, end))
+
+    result = {"start": start.isoformat(), "end": end.isoformat(), "dates": series.dates()[warmup:]}
+    for name, values in (("calories", series.calories), ("protein", series.protein)):
+        result[name] = [int(v) for v in values[warmup:]]
+        for window in ROLLING_WINDOWS:
+            averages = rolling_average(values, series.logged, window)
+            result[f"{name}_avg_{window}"] = _json_floats(averages[warmup:])
+    result["meal_count"] = [int(v) for v in series.meals[warmup:]]
+    return result
+
+def _runs(flags):
+    """(start index, length) of every run of True values"""
+    padded = np.concatenate(([0], flags.astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(padded))
+    starts, stops = edges[0::2], edges[1::2]
+    return starts, stops - starts
+
+def streaks(store, start: date, end: date, protein_goal: int) -> Dict:
+    """Current and longest runs of consecutive days meeting the protein goal"""
+    series = daily_series(store, start, end)
+    met = series.protein >= protein_goal
+    starts, lengths = _runs(met)
+
+    longest = None
+    if len(lengths):
+        best = int(np.argmax(lengths))
+        longest = {
+            "days": int(lengths[best]),
+            "start": (start + timedelta(days=int(starts[best]))).isoformat(),
+            "end": (start + timedelta(days=int(starts[best] + lengths[best] - 1))).isoformat()
+        }
+
+    # Today may still be in progress, so a streak ending yesterday is still current
+    current = 0
+    if len(lengths):
+        last_stop = int(starts[-1] + lengths[-1])
+        if last_stop >= len(met) - (0 if met[-1] else 1):
+            current = int(lengths[-1])
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "protein_goal": protein_goal,
+        "current_streak": current,
+        "longest_streak": longest,
+        "days_met": int(met.sum()),
+        "days_logged": int(series.logged.sum())
+    }
+
+def weekday_breakdown(store, start: date, end: date) -> Dict:
+    """Average calories and protein per logged day, by weekday and weekday vs weekend"""
+    series = daily_series(store, start, end)
+    weekday = (np.arange(len(series)) + start.weekday()) % 7
+    logged = series.logged
+
+    def averages(selection):
+        days = int(np.count_nonzero(selection & logged))
+        return {
+            "days_logged": days,
+            "avg_calories": round(float(series.calories[selection].sum() / days), 1) if days else None,
+            "avg_protein": round(float(series.protein[selection].sum() / days), 1) if days else None
+        }
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "by_weekday": [dict(day=name, **averages(weekday == i)) for i, name in enumerate(WEEKDAYS)],
+        "weekday": averages(weekday < 5),
+        "weekend": averages(weekday >= 5)
+    }
+
+def category_share(store, start: date, end: date) -> Dict:
+    """Calories per category and their share of the total"""
+    series = daily_series(store, start, end)
+    total = sum(series.category_calories.values())
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "total_calories": int(total),
+        "categories": [
+            {"category": name, "calories": int(calories), "share": round(calories / total, 4)}
+            for name, calories in sorted(series.category_calories.items(), key=lambda x: x[1], reverse=True)
+        ]
+    }
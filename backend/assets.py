@@ -0,0 +1,182 @@
+# backend/assets.py
+"""In-memory table of the frontend's static files.
+
+Every file under the frontend directory is read once, fingerprinted with a
+content hash and compressed ahead of time (gzip, plus brotli when the
+package is installed), so serving an asset is a dictionary lookup. Pages
+reference assets by their hashed name (script.<hash>.js), which is served
+with an immutable, year-long Cache-Control; the pages themselves and the
+plain names are served with no-cache and an ETag, so a revalidation costs
+a 304 and a deploy is picked up on the next page load.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+HASH_LENGTH = 12
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_BYTES = 256
+
+# Local references in HTML pages: href="style.css", src="script.js"
+REFERENCE_PATTERN = re.compile(r'''(\b(?:href|src)=["'])([^"':?#]+)(["'])''')
+HASHED_PATTERN = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % HASH_LENGTH)
+
+class Asset:
+    """One file with its precomputed encodings"""
+
+    __slots__ = ('path', 'hashed_path', 'content_type', 'digest', 'encodings', 'stamp')
+
+    def __init__(self, path: str, content: bytes, content_type: str, stamp):
+        self.path = path
+        self.content_type = content_type
+        self.stamp = stamp
+        self.digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+        stem, ext = os.path.splitext(path)
+        self.hashed_path = f'{stem}.{self.digest}{ext}'
+        self.encodings = {'identity': content}
+        if len(content) >= MIN_COMPRESS_BYTES and content_type.startswith(COMPRESSIBLE):
+            # mtime=0 keeps the gzip bytes (and so the ETag) identical across restarts
+            variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants['br'] = brotli.compress(content, quality=11)
+            for name, data in variants.items():
+                if len(data) < len(content):
+                    self.encodings[name] = data
+
+    def etag(self, encoding: str) -> str:
+        return self.digest if encoding == 'identity' else f'{self.digest}-{encoding}'
+
+def _content_type(path: str) -> str:
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type == 'application/javascript':
+        content_type += '; charset=utf-8'
+    return content_type
+
+def _stamp(path: str):
+    st = os.stat(path)
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+class AssetTable:
+    """Assets by plain and hashed path; built on first use"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._assets: Optional[Dict[str, Asset]] = None
+        self._hashed: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        files = {}
+        for root, dirs, names in os.walk(self.directory):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in names:
+                if not name.startswith('.'):
+                    full = os.path.join(root, name)
+                    files[os.path.relpath(full, self.directory).replace(os.sep, '/')] = full
+        return files
+
+    def build(self) -> None:
+        """(Re)read every file and precompute hashes and encodings"""
+        assets = {}
+        pages = []
+        for path, full in self._scan().items():
+            with open(full, 'rb') as f:
+                content = f.read()
+            content_type = _content_type(path)
+            if content_type.startswith('text/html'):
+                pages.append((path, full, content))
+            else:
+                assets[path] = Asset(path, content, content_type, _stamp(full))
+
+        # Pages are fingerprinted after rewriting their references to the hashed names
+        for path, full, content in pages:
+            base = os.path.dirname(path)
+
+            def hashed(match):
+                target = os.path.normpath(os.path.join(base, match.group(2))).replace(os.sep, '/')
+                asset = assets.get(target)
+                if asset is None:
+                    return match.group(0)
+                name = os.path.relpath(asset.hashed_path, base or '.').replace(os.sep, '/')
+                return f'{match.group(1)}{name}{match.group(3)}'
+
+            text = REFERENCE_PATTERN.sub(hashed, content.decode('utf-8'))
+            assets[path] = Asset(path, text.encode('utf-8'), _content_type(path), _stamp(full))
+
+        # Swap both tables at once; lookups read whichever pair is current
+        self._assets, self._hashed = assets, {asset.hashed_path: asset for asset in assets.values()}
+
+    def changed(self) -> bool:
+        """Whether any file was added, removed or modified since the last build (debug reloads)"""
+        files = self._scan()
+        assets = self._assets or {}
+        if files.keys() != assets.keys():
+            return True
+        try:
+            return any(_stamp(full) != assets[path].stamp for path, full in files.items())
+        except FileNotFoundError:
+            return True
+
+    def lookup(self, path: str):
+        """(asset, immutable) for a plain or hashed path, or (None, False)"""
+        if self._assets is None:
+            with self._lock:
+                if self._assets is None:
+                    self.build()
+        asset = self._assets.get(path)
+        if asset is not None:
+            return asset, False
+        asset = self._hashed.get(path)
+        if asset is not None:
+            return asset, True
+        # A stale hash (an old page still open after a deploy): serve the current file, uncacheable
+        match = HASHED_PATTERN.match(path)
+        if match:
+            asset = self._assets.get(match.group('stem') + match.group('ext'))
+            if asset is not None:
+                return asset, False
+        return None, False
+
+def negotiate(asset: Asset, accept_encodings) -> str:
+    """Best precomputed encoding the client accepts (werkzeug Accept header object)"""
+    best, best_quality = 'identity', 0.0
+    for name in ('br', 'gzip'):
+        if name in asset.encodings:
+            quality = accept_encodings[name]
+            if quality > best_quality:
+                best, best_quality = name, quality
+    return best
+
+def serve(app, table: AssetTable, path: str):
+    """Response for a static file, or None when it does not exist"""
+    from flask import request
+
+    if app.debug and table.changed():
+        table.build()
+    asset, immutable = table.lookup(path)
+    if asset is None:
+        return None
+
+    encoding = negotiate(asset, request.accept_encodings)
+    etag = asset.etag(encoding)
+    headers = {
+        'Cache-Control': IMMUTABLE if immutable else REVALIDATE,
+        'Vary': 'Accept-Encoding',
+        'ETag': f'"{etag}"'
+    }
+    if request.if_none_match.contains(etag):
+        return app.response_class(status=304, headers=headers)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return app.response_class(asset.encodings[encoding], content_type=asset.content_type, headers=headers)
@@ -0,0 +1,330 @@
+# backend/async_server.py
+"""Asyncio entry point serving the same routes as server.py.
+
+Connections live on a single event loop, so thousands of idle keep-alive
+clients cost one coroutine each rather than one thread. Every request is
+handed to the Flask app (through WSGI) on a bounded thread pool, which is
+where storage I/O happens; predictor CPU work is forwarded from there to a
+process pool through app.config['PREDICTOR_EXECUTOR'].
+
+Run with:  python async_server.py [--host HOST] [--port PORT]
+"""
+import argparse
+import asyncio
+import io
+import multiprocessing
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import unquote, urlsplit
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 16 * 1024 * 1024
+SHUTDOWN_GRACE = 10.0  # seconds in-flight requests get to finish
+SERVER_NAME = 'NutriTrack-asyncio'
+
+class HTTPError(Exception):
+    """Malformed or unsupported request; the connection is closed after the reply"""
+
+    def __init__(self, status: int):
+        super().__init__(HTTPStatus(status).phrase)
+        self.status = status
+
+def parse_head(raw: bytes):
+    """Request line and headers of one request"""
+    lines = raw.decode('latin-1').split('\r\n')
+    parts = lines[0].split(' ')
+    if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+        raise HTTPError(400)
+    headers = []
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(':')
+        if not sep or not name or name != name.strip():
+            raise HTTPError(400)
+        headers.append((name, value.strip()))
+    return parts[0], parts[1], parts[2], headers
+
+def build_environ(method, target, version, headers, body, peer, server_address):
+    """WSGI environ for one request"""
+    if target.startswith('/'):
+        path, _, query = target.partition('?')
+    else:
+        # Absolute-form target (proxies)
+        split = urlsplit(target)
+        path, query = split.path or '/', split.query
+
+    environ = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': unquote(path, 'latin-1'),
+        'QUERY_STRING': query,
+        'SERVER_NAME': str(server_address[0]),
+        'SERVER_PORT': str(server_address[1]),
+        'SERVER_PROTOCOL': version,
+        'REMOTE_ADDR': peer[0] if peer else '',
+        'REMOTE_PORT': str(peer[1]) if peer else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in headers:
+        key = name.upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def call_app(app, environ):
+    """Run the WSGI app up to its first body chunk (worker thread)"""
+    response = {}
+    written = []
+
+    def start_response(status, response_headers, exc_info=None):
+        if exc_info and response.get('sent'):
+            raise exc_info[1].with_traceback(exc_info[2])
+        response['status'] = status
+        response['headers'] = response_headers
+        return written.append
+
+    body = app(environ, start_response)
+    iterator = iter(body)
+    # Most responses are a single chunk, fetch it here rather than with another hop
+    first = next(iterator, None)
+    response['sent'] = True
+    chunks = written + ([first] if first is not None else [])
+    return response['status'], response['headers'], chunks, iterator, body
+
+def next_chunk(iterator):
+    return next(iterator, None)
+
+def close_body(body):
+    close = getattr(body, 'close', None)
+    if close:
+        close()
+
+class AsyncServer:
+    """HTTP/1.1 server dispatching to a WSGI app on bounded executors"""
+
+    def __init__(self, app, host, port, threads, max_connections, keepalive_timeout):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+        # Requests waiting for a worker are bounded too, beyond that connections wait on the socket
+        self.pending = asyncio.Semaphore(threads * 4)
+        self.connections = 0
+        self.in_flight = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port, limit=MAX_HEADER_BYTES, backlog=1024)
+        return self.server
+
+    async def shutdown(self):
+        """Stop accepting, let in-flight requests finish, then stop the workers"""
+        if self.server is not None:
+            self.server.close()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SHUTDOWN_GRACE
+        while self.in_flight and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        self.threads.shutdown(wait=False)
+
+    async def handle_connection(self, reader, writer):
+        if self.connections >= self.max_connections:
+            writer.close()
+            return
+        self.connections += 1
+        peer = writer.get_extra_info('peername')
+        sockname = writer.get_extra_info('sockname') or (self.host, self.port)
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    raw = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keepalive_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send_error(writer, 431)
+                    break
+                try:
+                    keep_alive = await self.handle_request(reader, writer, raw, peer, sockname)
+                except HTTPError as e:
+                    await self.send_error(writer, e.status)
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def handle_request(self, reader, writer, raw, peer, sockname):
+        """Serve one request; returns whether the connection stays open"""
+        method, target, version, headers = parse_head(raw)
+        lowered = {name.lower(): value for name, value in headers}
+
+        connection = lowered.get('connection', '').lower()
+        if version == 'HTTP/1.1':
+            keep_alive = 'close' not in connection
+        else:
+            keep_alive = 'keep-alive' in connection
+
+        if 'transfer-encoding' in lowered:
+            raise HTTPError(501)
+        try:
+            length = int(lowered.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400)
+        if length < 0:
+            raise HTTPError(400)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413)
+        if length and lowered.get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length), self.keepalive_timeout) if length else b''
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return False
+
+        environ = build_environ(method, target, version, headers, body, peer, sockname)
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            async with self.pending:
+                try:
+                    status, response_headers, chunks, iterator, app_body = await loop.run_in_executor(
+                        self.threads, call_app, self.app, environ)
+                except Exception as e:
+                    print(f"Unhandled error serving {method} {target}: {e}", file=sys.stderr)
+                    await self.send_error(writer, 500)
+                    return False
+            try:
+                return await self.send_response(writer, method, version, keep_alive,
+                                                status, response_headers, chunks, iterator)
+            finally:
+                await loop.run_in_executor(self.threads, close_body, app_body)
+        finally:
+            self.in_flight -= 1
+
+    async def send_response(self, writer, method, version, keep_alive, status, headers, chunks, iterator):
+        names = {name.lower() for name, _ in headers}
+        code = int(status.split(' ', 1)[0])
+        bodyless = method == 'HEAD' or code in (204, 304) or code < 200
+        chunked = False
+        if 'content-length' not in names and not bodyless:
+            if version == 'HTTP/1.1':
+                chunked = True
+            else:
+                # HTTP/1.0 without a length: the body ends when the connection does
+                keep_alive = False
+
+        lines = [f'HTTP/1.1 {status}']
+        lines.extend(f'{name}: {value}' for name, value in headers)
+        if 'date' not in names:
+            lines.append(f'Date: {formatdate(usegmt=True)}')
+        if 'server' not in names:
+            lines.append(f'Server: {SERVER_NAME}')
+        if chunked:
+            lines.append('Transfer-Encoding: chunked')
+        lines.append('Connection: ' + ('keep-alive' if keep_alive else 'close'))
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+        loop = asyncio.get_running_loop()
+        while True:
+            for chunk in chunks:
+                if chunk and not bodyless:
+                    writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+            await writer.drain()
+            if not chunks:
+                break
+            # Streamed responses: pull the remaining chunks on a worker, one at a time
+            chunk = await loop.run_in_executor(self.threads, next_chunk, iterator)
+            chunks = [chunk] if chunk is not None else []
+
+        if chunked:
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        return keep_alive
+
+    async def send_error(self, writer, status):
+        phrase = HTTPStatus(status).phrase
+        body = f'{status} {phrase}\n'.encode()
+        writer.write((f'HTTP/1.1 {status} {phrase}\r\nContent-Type: text/plain\r\n'
+                      f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n').encode('latin-1') + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+def create_predictor_pool(processes):
+    """Process pool for predictor CPU work, warmed so the first request does not pay for startup"""
+    if processes <= 0:
+        return None
+    from ai_predictor import call_predictor
+    # spawn: forking a process that already runs threads is unsafe
+    pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+    list(pool.map(call_predictor, ['get_automaton'] * processes))
+    return pool
+
+async def serve(host, port, threads, processes, max_connections, keepalive_timeout):
+    from server import app
+    import replication
+
+    replication.start_follower()
+    pool = create_predictor_pool(processes)
+    app.config['PREDICTOR_EXECUTOR'] = pool
+    server = AsyncServer(app, host, port, threads, max_connections, keepalive_timeout)
+    await server.start()
+    print(f"🌐 Async server: http://{host}:{port} ({threads} threads, {processes} predictor processes)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: KeyboardInterrupt still ends the loop
+    try:
+        await stop.wait()
+    finally:
+        await server.shutdown()
+        app.config['PREDICTOR_EXECUTOR'] = None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+def main(argv=None):
+    from config import HOST, PORT, ASYNC_THREADS, PREDICT_PROCESSES, MAX_CONNECTIONS, KEEPALIVE_TIMEOUT
+
+    parser = argparse.ArgumentParser(description="Run the NutriTrack API on an asyncio event loop")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--threads', type=int, default=ASYNC_THREADS, help="route/storage worker threads")
+    parser.add_argument('--predict-processes', type=int, default=PREDICT_PROCESSES,
+                        help="predictor worker processes (0 runs predictions on the threads)")
+    parser.add_argument('--max-connections', type=int, default=MAX_CONNECTIONS)
+    parser.add_argument('--keepalive-timeout', type=float, default=KEEPALIVE_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.threads, args.predict_processes,
+                          args.max_connections, args.keepalive_timeout))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# backend/auth.py
+"""Which user's shard a request reads and writes.
+
+API keys map to users (API_KEYS="key=user,key=user"); a request sending a
+known key in the X-API-Key header acts as that user. Requests without a key
+use the default user's shard, unless AUTH_REQUIRED is set. A user's shard is
+created by their first write: reads of the shard of a user without one answer
+404, so no client can make the server create shards by asking for them.
+"""
+import hashlib
+import hmac
+from typing import Dict, Optional
+
+import database
+from config import API_KEYS, AUTH_REQUIRED
+from ratelimit import API_KEY_HEADER
+from replication import READ_METHODS, READ_ONLY_POSTS
+
+# Routes that read the user's shard
+SHARD_ROUTES = ('/api/entries', '/api/goals', '/api/summary/', '/api/analytics/', '/api/query', '/api/export')
+
+def _digest(api_key: str) -> bytes:
+    return hashlib.blake2b(api_key.encode('utf-8'), digest_size=32).digest()
+
+def parse_keys(spec: str) -> Dict[bytes, str]:
+    """API_KEYS ("key=user,key=user") to {key digest: user}; keys are kept hashed"""
+    keys = {}
+    for pair in filter(None, (part.strip() for part in spec.split(','))):
+        api_key, _, user_id = pair.partition('=')
+        api_key, user_id = api_key.strip(), user_id.strip()
+        if not api_key or not database.USER_ID_PATTERN.fullmatch(user_id):
+            raise ValueError(f'API_KEYS entries must look like key=user, got {pair!r}')
+        keys[_digest(api_key)] = user_id
+    return keys
+
+def user_for(api_key: Optional[str], keys: Dict[bytes, str]) -> Optional[str]:
+    """User of an API key; None for an unknown key"""
+    digest = _digest(api_key)
+    for known, user_id in keys.items():
+        if hmac.compare_digest(known, digest):
+            return user_id
+    return None
+
+def is_write(method: str, path: str) -> bool:
+    return method not in READ_METHODS and path not in READ_ONLY_POSTS
+
+def init_app(app) -> None:
+    """Resolve g.user_id for every /api/ request, or answer 401 or 404"""
+    from flask import g, jsonify, request
+
+    app.config.setdefault('API_KEYS', parse_keys(API_KEYS))
+    app.config.setdefault('AUTH_REQUIRED', AUTH_REQUIRED)
+
+    @app.before_request
+    def _authenticate():
+        if not request.path.startswith('/api/'):
+            return None
+        api_key = request.headers.get(API_KEY_HEADER)
+        if api_key:
+            user_id = user_for(api_key, app.config['API_KEYS'])
+            if user_id is None:
+                return jsonify({"error": "Unknown API key"}), 401
+        elif app.config['AUTH_REQUIRED']:
+            return jsonify({"error": f"Send an API key in the {API_KEY_HEADER} header"}), 401
+        else:
+            user_id = database.DEFAULT_USER
+        if (request.path.startswith(SHARD_ROUTES) and not is_write(request.method, request.path)
+                and not database.shards.exists(user_id)):
+            return jsonify({"error": "No data for this user yet"}), 404
+        g.user_id = user_id
+        return None
@@ -0,0 +1,226 @@
+# backend/columns.py
+"""Compact columnar storage for meal entries.
+
+Entries are kept as parallel columns instead of one dict per entry:
+calories and protein in array('i'), dates as day ordinals, categories as
+one-byte codes and food names interned. Dicts are only rebuilt when an
+entry has to be serialized.
+"""
+import sys
+from array import array
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from entry import Entry
+
+CORE_FIELDS = ('id', 'food', 'calories', 'protein', 'category', 'date')
+NO_DAY = 0  # ordinal used for entries without a parsable date
+
+# Category codes are shared by every column set in the process
+_category_names: List[str] = ['Breakfast', 'Lunch', 'Dinner', 'Snack', 'Other']
+_category_codes: Dict[str, int] = {name: code for code, name in enumerate(_category_names)}
+
+# Day ordinal <-> ISO string caches (a multi-year history has only a few thousand days)
+_day_strings: Dict[int, str] = {}
+_day_ordinals: Dict[str, int] = {}
+
+def category_code(name) -> int:
+    name = name if isinstance(name, str) and name else 'Other'
+    code = _category_codes.get(name)
+    if code is None:
+        if len(_category_names) >= 255:
+            return _category_codes['Other']
+        code = len(_category_names)
+        _category_names.append(sys.intern(name))
+        _category_codes[name] = code
+    return code
+
+def category_name(code: int) -> str:
+    return _category_names[code]
+
+def day_ordinal(value) -> int:
+    """ISO date string to day ordinal, NO_DAY when it cannot be parsed"""
+    ordinal = _day_ordinals.get(value)
+    if ordinal is None:
+        try:
+            ordinal = date.fromisoformat(value).toordinal()
+        except (TypeError, ValueError):
+            return NO_DAY
+        _day_ordinals[value] = ordinal
+    return ordinal
+
+def day_string(ordinal: int) -> str:
+    value = _day_strings.get(ordinal)
+    if value is None:
+        value = date.fromordinal(ordinal).isoformat()
+        _day_strings[ordinal] = value
+    return value
+
+def _as_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return 0
+
+class EntryColumns:
+    """Parallel columns holding one segment's entries"""
+
+    __slots__ = ('ids', 'foods', 'calories', 'protein', 'days', 'categories', 'extras', '_index')
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.foods: List[str] = []
+        self.calories = array('i')
+        self.protein = array('i')
+        self.days = array('i')
+        self.categories = array('B')
+        # Rarely used: fields outside CORE_FIELDS and unparsable dates, per row
+        self.extras: List[Optional[dict]] = []
+        self._index: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_dicts(cls, entries) -> 'EntryColumns':
+        columns = cls()
+        for entry in entries:
+            columns.append(entry)
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _encode(self, entry):
+        if isinstance(entry, Entry):
+            # Already parsed and normalized
+            return (entry.id, sys.intern(entry.food), entry.calories, entry.protein,
+                    entry.date.toordinal(), category_code(entry.category), entry.extra)
+        day = day_ordinal(entry.get('date'))
+        extra = {k: v for k, v in entry.items() if k not in CORE_FIELDS}
+        if day == NO_DAY and 'date' in entry:
+            extra['date'] = entry['date']
+        return (
+            entry['id'],
+            sys.intern(str(entry.get('food', ''))),
+            _as_int(entry.get('calories', 0)),
+            _as_int(entry.get('protein', 0)),
+            day,
+            category_code(entry.get('category')),
+            extra or None
+        )
+
+    def append(self, entry) -> None:
+        """Append an Entry or a storage-format dict"""
+        entry_id, food, calories, protein, day, category, extra = self._encode(entry)
+        if self._index is not None:
+            self._index[entry_id] = len(self.ids)
+        self.ids.append(entry_id)
+        self.foods.append(food)
+        self.calories.append(calories)
+        self.protein.append(protein)
+        self.days.append(day)
+        self.categories.append(category)
+        self.extras.append(extra)
+
+    def replace(self, row: int, entry) -> None:
+        entry_id, food, calories, protein, day, category, extra = self._encode(entry)
+        if self._index is not None:
+            del self._index[self.ids[row]]
+            self._index[entry_id] = row
+        self.ids[row] = entry_id
+        self.foods[row] = food
+        self.calories[row] = calories
+        self.protein[row] = protein
+        self.days[row] = day
+        self.categories[row] = category
+        self.extras[row] = extra
+
+    def delete(self, row: int) -> None:
+        for column in (self.ids, self.foods, self.calories, self.protein, self.days, self.categories, self.extras):
+            del column[row]
+        self._index = None
+
+    def index_of(self, entry_id: str) -> int:
+        if self._index is None:
+            self._index = {entry_id: row for row, entry_id in enumerate(self.ids)}
+        return self._index.get(entry_id, -1)
+
+    def row(self, row: int) -> dict:
+        """Rebuild one entry as a dict (for JSON responses and the storage format)"""
+        day = self.days[row]
+        entry = {
+            "food": self.foods[row],
+            "calories": self.calories[row],
+            "protein": self.protein[row],
+            "category": _category_names[self.categories[row]],
+            "date": day_string(day) if day != NO_DAY else None,
+            "id": self.ids[row]
+        }
+        extra = self.extras[row]
+        if extra:
+            entry.update(extra)
+        return entry
+
+    def entry(self, row: int) -> Optional[Entry]:
+        """Rebuild one entry as an Entry, None for legacy rows without a usable date"""
+        day = self.days[row]
+        if day == NO_DAY:
+            return None
+        return Entry(self.foods[row], self.calories[row], self.protein[row],
+                     _category_names[self.categories[row]], date.fromordinal(day),
+                     id=self.ids[row], extra=self.extras[row])
+
+    def rows(self, start_day: Optional[int] = None, end_day: Optional[int] = None) -> Iterator[int]:
+        """Row numbers whose day falls in [start_day, end_day]"""
+        if start_day is None and end_day is None:
+            return iter(range(len(self.ids)))
+        low = start_day if start_day is not None else NO_DAY + 1
+        high = end_day if end_day is not None else sys.maxsize
+        days = self.days
+        return (row for row in range(len(days)) if low <= days[row] <= high)
+
+    def to_dicts(self, rows=None) -> List[dict]:
+        return [self.row(row) for row in (range(len(self.ids)) if rows is None else rows)]
+
+    def copy(self) -> 'EntryColumns':
+        copied = EntryColumns()
+        copied.ids = self.ids[:]
+        copied.foods = self.foods[:]
+        copied.calories = self.calories[:]
+        copied.protein = self.protein[:]
+        copied.days = self.days[:]
+        copied.categories = self.categories[:]
+        copied.extras = self.extras[:]
+        return copied
+
+    def sorted_by_day(self) -> 'EntryColumns':
+        ordered = EntryColumns()
+        order = sorted(range(len(self.ids)), key=self.days.__getitem__)
+        ordered.ids = [self.ids[i] for i in order]
+        ordered.foods = [self.foods[i] for i in order]
+        ordered.calories = array('i', (self.calories[i] for i in order))
+        ordered.protein = array('i', (self.protein[i] for i in order))
+        ordered.days = array('i', (self.days[i] for i in order))
+        ordered.categories = array('B', (self.categories[i] for i in order))
+        ordered.extras = [self.extras[i] for i in order]
+        return ordered
+
+    def day_totals(self) -> Dict[Tuple[int, int], List[int]]:
+        """[calories, protein, count] per (day ordinal, category code)"""
+        totals: Dict[Tuple[int, int], List[int]] = {}
+        days, calories, protein, categories = self.days, self.calories, self.protein, self.categories
+        for row in range(len(days)):
+            key = (days[row], categories[row])
+            total = totals.get(key)
+            if total is None:
+                total = totals[key] = [0, 0, 0]
+            total[0] += calories[row]
+            total[1] += protein[row]
+            total[2] += 1
+        return totals
+
+    def day_range(self):
+        """(first, last) day ordinal of dated rows, or None"""
+        dated = [d for d in self.days if d != NO_DAY]
+        return (min(dated), max(dated)) if dated else None
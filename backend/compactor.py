@@ -0,0 +1,60 @@
+# backend/compactor.py
+"""Background compaction of shard mutation logs.
+
+A shard whose log grows past COMPACT_LOG_BYTES, or holds more than
+COMPACT_GARBAGE_RATIO log records per live entry, asks for compaction after
+a write. A daemon thread then folds the log into fresh segment files
+(EntryStore.compact) while requests keep reading and writing the shard. That
+keeps the log, and with it the replay work when a shard is opened, bounded no
+matter how many edits were made.
+
+The thread is started on first use in each process, so pre-forked workers
+run their own.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+class Compactor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def request(self, store, trigger):
+        """Queue store for compaction; repeated requests before it runs are merged"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+            self._pending.setdefault(id(store), (store, trigger))
+        self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _start(self):
+        # First use, or a forked worker: the parent's thread did not survive the fork
+        self._pid = os.getpid()
+        self._pending = OrderedDict()
+        self._wake = threading.Event()
+        threading.Thread(target=self._run, args=(self._wake,), name='compactor', daemon=True).start()
+
+    def _run(self, wake):
+        while True:
+            wake.wait()
+            wake.clear()
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    _, (store, trigger) = self._pending.popitem(last=False)
+                try:
+                    store.compact(trigger)
+                except Exception as e:
+                    # The log still holds every write; the next request retries
+                    print(f"[{os.getpid()}] compaction of {store.directory} failed: {e}", file=sys.stderr)
+
+compactor = Compactor()
@@ -0,0 +1,127 @@
+# backend/compression.py
+"""Negotiated compression of large API responses.
+
+JSON and text responses of at least COMPRESS_MIN_SIZE bytes are compressed
+with the best codec the client accepts: zstd when the zstandard package is
+installed (several times faster than gzip at a similar ratio), otherwise
+gzip. Streamed responses are compressed chunk by chunk as they are sent, so
+memory stays bounded. Responses that already carry a Content-Encoding, such
+as precompressed static assets, are left alone.
+"""
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is always available
+    zstandard = None
+
+import metrics
+from config import COMPRESSION_ENABLED, COMPRESS_LEVEL, COMPRESS_MIN_SIZE
+
+COMPRESSIBLE = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+ZSTD_LEVEL = 3
+
+class _Gzip:
+    def __init__(self, level):
+        # wbits 16+: gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+class _Zstd:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+CODECS = {'gzip': _Gzip}
+if zstandard is not None:
+    CODECS['zstd'] = _Zstd
+PREFERENCE = ('zstd', 'gzip')
+
+def choose_encoding(accept_encodings):
+    """Preferred codec among those the client accepts with the highest quality, or None"""
+    best, best_quality = None, 0.0
+    for name in PREFERENCE:
+        if name in CODECS:
+            quality = accept_encodings[name]
+            if quality > best_quality:
+                best, best_quality = name, quality
+    return best
+
+def compressible(response) -> bool:
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers or response.direct_passthrough:
+        return False
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    return (response.mimetype or '').startswith(COMPRESSIBLE)
+
+def _compress_stream(chunks, codec, encoding):
+    """Compress an iterable body as it is consumed"""
+    sizes = [0, 0]
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            sizes[0] += len(chunk)
+            data = codec.compress(chunk)
+            if data:
+                sizes[1] += len(data)
+                yield data
+        data = codec.flush()
+        sizes[1] += len(data)
+        yield data
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+        metrics.observe_compression(encoding, *sizes)
+
+def compress_response(response, accept_encodings, level=COMPRESS_LEVEL, min_size=COMPRESS_MIN_SIZE):
+    """Compress response in place when worthwhile; returns it"""
+    if not compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    codec = CODECS[encoding](level)
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, codec, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        data = codec.compress(body) + codec.flush()
+        metrics.observe_compression(encoding, len(body), len(data))
+        response.set_data(data)
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+def init_app(app) -> None:
+    """Compress responses in an after_request hook (app.config['COMPRESSION_ENABLED'])"""
+    from flask import request
+
+    app.config.setdefault('COMPRESSION_ENABLED', COMPRESSION_ENABLED)
+
+    @app.after_request
+    def _compress(response):
+        if not app.config['COMPRESSION_ENABLED'] or request.method == 'HEAD':
+            return response
+        return compress_response(response, request.accept_encodings)
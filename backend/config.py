@@ -1,5 +1,6 @@
 # backend/config.py
 import os
+import socket
 from dotenv import load_dotenv
 import json
 from datetime import datetime
@@ -11,14 +12,17 @@ load_dotenv()
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # File paths
-DATA_FILE = os.path.join(BASE_DIR, 'data.json')
+DATA_FILE = os.getenv('DATA_FILE', os.path.join(BASE_DIR, 'data.json'))  # default user's shard
+DATA_DIR = os.getenv('DATA_DIR', os.path.join(BASE_DIR, 'users'))        # one shard per other user
 ENV_FILE = os.path.join(BASE_DIR, '.env')
+DATA_FILE_HEADER_BYTES = 64  # bytes checked at startup
 
 # Configuration with defaults
 PROTEIN_GOAL = int(os.getenv('PROTEIN_GOAL', 140))  # daily protein goal in grams
 DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
 PORT = int(os.getenv('PORT', 5000))
 AI_ENABLED = os.getenv('AI_ENABLED', 'True').lower() == 'true'
+PRELOAD_PREDICTOR = os.getenv('PRELOAD_PREDICTOR', 'False').lower() == 'true'  # else loaded on first use
 HOST = os.getenv('HOST', '0.0.0.0')
 
 # Validation limits
@@ -27,11 +31,57 @@ MAX_PROTEIN = int(os.getenv('MAX_PROTEIN', 500))
 MIN_CALORIES = int(os.getenv('MIN_CALORIES', 0))
 MIN_PROTEIN = int(os.getenv('MIN_PROTEIN', 0))
 
+# Multi-user storage
+MAX_OPEN_SHARDS = int(os.getenv('MAX_OPEN_SHARDS', 256))  # user shards kept in memory
+API_KEYS = os.getenv('API_KEYS', '')  # "key=user,key=user": X-API-Key values and the user each acts as (auth.py)
+AUTH_REQUIRED = os.getenv('AUTH_REQUIRED', 'False').lower() == 'true'  # else requests without a key use the default user
+
+# Write durability (wal.py): fsync | group | none
+DURABILITY = os.getenv('DURABILITY', 'group').lower()
+GROUP_COMMIT_MS = float(os.getenv('GROUP_COMMIT_MS', 0))  # extra wait for more writes when others are queued
+GROUP_COMMIT_MAX = int(os.getenv('GROUP_COMMIT_MAX', 64))  # writes per batch
+
+# Log compaction (compactor.py): a shard's log is folded into new segment files when it
+# reaches COMPACT_LOG_BYTES, or COMPACT_GARBAGE_RATIO records per live entry (and at least COMPACT_MIN_RECORDS)
+COMPACTION_BACKGROUND = os.getenv('COMPACTION_BACKGROUND', 'True').lower() == 'true'  # else inline after the write
+COMPACT_LOG_BYTES = int(os.getenv('COMPACT_LOG_BYTES', 4 * 1024 * 1024))
+COMPACT_GARBAGE_RATIO = float(os.getenv('COMPACT_GARBAGE_RATIO', 0.5))
+COMPACT_MIN_RECORDS = int(os.getenv('COMPACT_MIN_RECORDS', 256))
+# Closed months whose last entry is older than this many days move to compressed archives; 0 = never
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 0))
+
+# Log shipping (replication.py): a server with REPLICATE_FROM set is a read-only follower of that primary
+REPLICATE_FROM = os.getenv('REPLICATE_FROM', '').rstrip('/')  # primary base URL, e.g. http://10.0.0.1:5000
+REPLICATION_TOKEN = os.getenv('REPLICATION_TOKEN', '')  # shared secret; the primary refuses pulls without it
+REPLICA_ID = os.getenv('REPLICA_ID', f'{socket.gethostname()}:{PORT}')
+REPLICATION_WAIT = float(os.getenv('REPLICATION_WAIT', 5))  # seconds a pull waits for new writes
+REPLICATION_BATCH = int(os.getenv('REPLICATION_BATCH', 5000))  # log records per shard per pull
+REPLICATION_SYNC_TIMEOUT = float(os.getenv('REPLICATION_SYNC_TIMEOUT', 0))  # >0: writes wait for a follower
+
+# Asyncio server (async_server.py)
+ASYNC_THREADS = int(os.getenv('ASYNC_THREADS', min(32, (os.cpu_count() or 1) + 4)))  # route/storage workers
+PREDICT_PROCESSES = int(os.getenv('PREDICT_PROCESSES', min(4, os.cpu_count() or 1)))  # 0 = predict on threads
+MAX_CONNECTIONS = int(os.getenv('MAX_CONNECTIONS', 10000))
+KEEPALIVE_TIMEOUT = float(os.getenv('KEEPALIVE_TIMEOUT', 75))  # seconds an idle connection is kept
+
+# JSON: indent storage files (compact by default, pretty in debug mode)
+JSON_PRETTY = os.getenv('JSON_PRETTY', str(DEBUG)).lower() == 'true'
+
 # Caching
 CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', 300))  # 5 minutes
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1024))  # cached summary/analytics responses
 
-# Rate limiting (requests per minute)
+# Response compression (compression.py)
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True').lower() == 'true'
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # bytes; smaller bodies are sent as is
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))  # gzip level
+
+# Rate limiting (requests per minute, per client)
 RATE_LIMIT = int(os.getenv('RATE_LIMIT', 60))
+RATE_LIMIT_EXPENSIVE = int(os.getenv('RATE_LIMIT_EXPENSIVE', max(1, RATE_LIMIT // 6)))  # predict/export/query
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'False').lower() == 'true'
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', 0))  # proxies whose X-Forwarded-For is used
+RATE_LIMIT_FILE = os.getenv('RATE_LIMIT_FILE', '')  # bucket file shared by workers, empty = per process
 
 # Frontend configuration
 FRONTEND_DIR = os.path.join(BASE_DIR, '../frontend')
@@ -43,52 +93,77 @@ APP_VERSION = "1.0.0"
 APP_DESCRIPTION = "AI-powered calorie and protein tracker"
 APP_AUTHOR = "NutriTrack Team"
 
-def check_data_file():
-    """Ensure data file exists with proper structure"""
+def _new_data_file():
+    return {
+        "entries": [],
+        "metadata": {
+            "created_at": datetime.now().isoformat(),
+            "last_modified": datetime.now().isoformat(),
+            "total_entries": 0,
+            "version": APP_VERSION
+        }
+    }
+
+def check_data_file(repair=False):
+    """Ensure data file exists and looks like a JSON document.
+
+    Only the first bytes are read, so startup does not depend on the size of
+    the history. With repair=True a file that does not parse or lacks its
+    "entries"/"metadata" keys is rewritten (a corrupted one is replaced).
+    Without it, a file that turns out to be corrupted when the default shard
+    imports it is moved aside by database.py.
+    """
     if not os.path.exists(DATA_FILE):
         print(f"Creating new data file at {DATA_FILE}")
+        os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
         with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump({
-                "entries": [],
-                "metadata": {
-                    "created_at": datetime.now().isoformat(),
-                    "last_modified": datetime.now().isoformat(),
-                    "total_entries": 0,
-                    "version": APP_VERSION
-                }
-            }, f, ensure_ascii=False, indent=4)
-    else:
-        # Ensure file has proper structure
-        try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if "entries" not in data:
-                    data["entries"] = []
-                if "metadata" not in data:
-                    data["metadata"] = {
-                        "created_at": datetime.now().isoformat(),
-                        "last_modified": datetime.now().isoformat(),
-                        "total_entries": len(data.get("entries", [])),
-                        "version": APP_VERSION
-                    }
-                data["metadata"]["last_modified"] = datetime.now().isoformat()
-                data["metadata"]["total_entries"] = len(data["entries"])
-                
-                with open(DATA_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=4)
-        except (json.JSONDecodeError, FileNotFoundError):
-            # If file is corrupted, create a new one
-            print(f"Data file corrupted, creating new one at {DATA_FILE}")
-            with open(DATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump({
-                    "entries": [],
-                    "metadata": {
-                        "created_at": datetime.now().isoformat(),
-                        "last_modified": datetime.now().isoformat(),
-                        "total_entries": 0,
-                        "version": APP_VERSION
-                    }
-                }, f, ensure_ascii=False, indent=4)
+            json.dump(_new_data_file(), f, ensure_ascii=False, indent=4)
+        return True
+
+    if not repair:
+        with open(DATA_FILE, 'rb') as f:
+            header = f.read(DATA_FILE_HEADER_BYTES).lstrip()
+        if header.startswith(b'{'):
+            return True
+        print(f"Data file {DATA_FILE} does not look like JSON; it will be moved aside when first opened "
+              "(or run `python config.py --repair`)")
+        return False
+
+    tmp_path = DATA_FILE + '.repair'
+    try:
+        _rewrite_data_file(tmp_path)
+    except ValueError:  # includes UnicodeDecodeError and jsonstream.StreamError
+        # If file is corrupted, create a new one
+        print(f"Data file corrupted, creating new one at {DATA_FILE}")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_new_data_file(), f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, DATA_FILE)
+    return True
+
+def _rewrite_data_file(path):
+    """Copy DATA_FILE to path entry by entry, adding missing keys and refreshing metadata.
+    Streams the entries, so repairing a large history needs little memory."""
+    from jsonstream import EntryStream
+
+    stream = EntryStream(DATA_FILE)
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{\n    "entries": [')
+        for entry in stream:
+            f.write((',' if count else '') + '\n        ' + json.dumps(entry, ensure_ascii=False))
+            count += 1
+        f.write('\n    ]')
+
+        members = stream.members
+        metadata = members.get('metadata')
+        if not isinstance(metadata, dict):
+            metadata = _new_data_file()["metadata"]
+        metadata["last_modified"] = datetime.now().isoformat()
+        metadata["total_entries"] = count
+        members["metadata"] = metadata
+        for key, value in members.items():
+            f.write(f',\n    {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}')
+        f.write('\n}\n')
 
 def get_config_summary():
     """Get configuration summary for debugging"""
@@ -99,17 +174,26 @@ def get_config_summary():
         "port": PORT,
         "host": HOST,
         "ai_enabled": AI_ENABLED,
+        "preload_predictor": PRELOAD_PREDICTOR,
         "protein_goal": PROTEIN_GOAL,
         "data_file": DATA_FILE,
+        "data_dir": DATA_DIR,
+        "max_open_shards": MAX_OPEN_SHARDS,
+        "async_threads": ASYNC_THREADS,
+        "predict_processes": PREDICT_PROCESSES,
         "frontend_dir": FRONTEND_DIR,
         "cache_timeout": CACHE_TIMEOUT,
-        "rate_limit": RATE_LIMIT
+        "rate_limit": RATE_LIMIT,
+        "replicate_from": REPLICATE_FROM or None
     }
 
-# Initialize data file on import
+# Cheap check on import: creates a missing file, never rewrites an existing one
 check_data_file()
 
 if __name__ == "__main__":
+    import sys
+    if '--repair' in sys.argv:
+        check_data_file(repair=True)
     # Print config summary when run directly
     summary = get_config_summary()
     print("Configuration Summary:")
@@ -1,14 +1,1205 @@
-import json
-from config import DATA_FILE
+import gzip
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 
-def load_entries():
+try:
+    import fcntl
+except ImportError:  # Windows: shards are only locked within one process
+    fcntl = None
+
+import jsoncodec
+from jsonstream import EntryStream
+import metrics
+from columns import NO_DAY, EntryColumns, category_code, category_name, day_ordinal, day_string
+from compactor import compactor
+from config import (ARCHIVE_AFTER_DAYS, COMPACT_GARBAGE_RATIO, COMPACT_LOG_BYTES, COMPACT_MIN_RECORDS, COMPACTION_BACKGROUND,
+                    DATA_FILE, DATA_DIR, DURABILITY, GROUP_COMMIT_MAX, GROUP_COMMIT_MS, JSON_PRETTY,
+                    MAX_OPEN_SHARDS, PROTEIN_GOAL, REPLICATION_SYNC_TIMEOUT)
+from wal import DURABILITY_MODES, GroupCommitter, MutationLog, fsync_directory
+
+DEFAULT_USER = 'default'
+USER_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+MONTH_PATTERN = re.compile(r'\d{4}-\d{2}')
+UNDATED = 'undated'  # segment for legacy entries without a usable date
+MANIFEST_VERSION = 1
+CHANGE_LOG_SIZE = 256  # recent writes kept in the manifest for cache revalidation
+RECENT_RECORDS = 4096  # log records kept in memory for followers, older ones are re-read from the log
+REPLICA_STALE = 30  # seconds after which a follower that stopped pulling is not waited for
+ARCHIVE_SUFFIX = '.json.gz'
+INDEX_SUFFIX = '.index.json'
+ARCHIVE_LEVEL = 9  # gzip level; archives are written once and rarely read
+
+def month_of(date_str):
+    """Segment key (YYYY-MM) for an entry date"""
+    month = (date_str or '')[:7]
+    return month if MONTH_PATTERN.fullmatch(month) else UNDATED
+
+def active_month():
+    return datetime.now().strftime('%Y-%m')
+
+def is_closed(month):
+    """Months before the active one are sealed; undated legacy entries stay mutable"""
+    return month != UNDATED and month < active_month()
+
+def archive_boundary(today=None):
+    """First month outside the archive tier: months before it ended more than
+    ARCHIVE_AFTER_DAYS ago. '' (no month is archived) when archiving is off."""
+    if ARCHIVE_AFTER_DAYS <= 0:
+        return ''
+    return ((today or date.today()) - timedelta(days=ARCHIVE_AFTER_DAYS)).strftime('%Y-%m')
+
+def _file_stamp(path):
     try:
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data.get('entries', [])
+        st = os.stat(path)
+        # Files are replaced atomically, so a new inode also marks a rewrite within one mtime tick
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
     except FileNotFoundError:
+        return None
+
+def _has_content(path):
+    try:
+        return os.path.getsize(path) > 0
+    except OSError:
+        return False
+
+def _read_json(path):
+    """Read a JSON file, returning None when it does not exist"""
+    start = time.perf_counter()
+    nbytes = 0
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        nbytes = len(raw)
+        return jsoncodec.loads(raw) if raw.strip() else {}
+    except FileNotFoundError:
+        return None
+    finally:
+        metrics.observe_storage('load', time.perf_counter() - start, nbytes)
+
+def _read_archive(path):
+    """Read a gzipped JSON archive file"""
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        return jsoncodec.loads(gzip.decompress(raw))
+    finally:
+        metrics.observe_storage('load', time.perf_counter() - start, len(raw))
+
+def _write_json(path, document, compact=False, durable=False):
+    """Atomically replace a JSON file so readers never see a partial write;
+    indented only when JSON_PRETTY is set and compact is not requested.
+    durable: fsync the file and its directory before returning"""
+    _write_file(path, jsoncodec.dumps(document, pretty=JSON_PRETTY and not compact), durable)
+
+def _write_file(path, raw, durable=False):
+    start = time.perf_counter()
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(raw)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    if durable:
+        fsync_directory(directory)
+    metrics.observe_storage('save', time.perf_counter() - start, len(raw))
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def _index_path(path):
+    """Index file of an archive file"""
+    return path[:-len(ARCHIVE_SUFFIX)] + INDEX_SUFFIX
+
+def _segment_files(path):
+    """A segment file, plus its index when it is an archive"""
+    if not path:
         return []
+    return [path, _index_path(path)] if path.endswith(ARCHIVE_SUFFIX) else [path]
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _food_counts(columns, rows, counts):
+    """Add how often each food (lowercased, stripped) was logged in rows to counts"""
+    by_name = {}
+    foods = columns.foods
+    for row in rows:
+        # Food names are interned, so counting by object is cheap
+        name = foods[row]
+        by_name[name] = by_name.get(name, 0) + 1
+    for name, count in by_name.items():
+        key = name.lower().strip()
+        if key:
+            counts[key] = counts.get(key, 0) + count
+    return counts
+
+def _archive_index(month, columns):
+    """Index written next to an archive: date range, counts, totals per day and category,
+    and food counts"""
+    day_range = columns.day_range()
+    return {
+        "month": month,
+        "first_date": day_string(day_range[0]) if day_range else None,
+        "last_date": day_string(day_range[1]) if day_range else None,
+        "count": len(columns),
+        "calories": sum(columns.calories),
+        "protein": sum(columns.protein),
+        "days": [[day_string(day) if day != NO_DAY else None, category_name(category)] + total
+                 for (day, category), total in sorted(columns.day_totals().items())],
+        "foods": _food_counts(columns, range(len(columns)), {})
+    }
+
+class ReplicationGap(ValueError):
+    """Replicated log records do not continue the shard's log"""
+
+def _row_date(columns, row):
+    """Date of a stored row, None for undated legacy rows"""
+    day = columns.days[row]
+    return day_string(day) if day != NO_DAY else None
+
+class Segment:
+    """One month of entries, loaded from its segment file into columns"""
+
+    def __init__(self, month, columns, generation):
+        self.month = month
+        self.columns = columns
+        self.generation = generation
+
+class _Snapshot:
+    """A snapshot being written: the state at log position seq"""
+
+    def __init__(self, seq, stamp, log_offset, log_records, manifest, dirty, columns, boundary):
+        self.seq = seq
+        self.stamp = stamp  # manifest the snapshot was planned against
+        self.log_offset = log_offset
+        self.log_records = log_records
+        self.manifest = manifest
+        self.dirty = dirty  # month -> file the snapshot supersedes
+        self.columns = columns
+        self.boundary = boundary  # months before it are written as archives
+        self.written = {}  # month -> new file
+
+class EntryStore:
+    """One user's shard: monthly segment files, a manifest and a mutation log.
+
+    Writes are appended to the shard's mutation log (wal.py) and applied to the
+    in-memory segments; the segment files and manifest are a snapshot the log
+    is replayed on top of. A new snapshot writes the changed segments to new
+    files, seals (compacts and sorts) closed months, then switches to them by
+    replacing the manifest and drops the log records it covers. Compaction
+    (compactor.py) does this in the background once the log is large; a shard
+    opened after a month ends, or replaced by save(), is snapshotted in place.
+    Months older than ARCHIVE_AFTER_DAYS are written as gzipped archives, each
+    with an index of its totals per day and category: summaries read only the
+    index, and raw entries of archived months are read only when asked for.
+    The manifest records each segment's date range and count so range queries
+    open only the segments they need, plus a short log of which dates recent
+    writes touched, so caches can tell whether a result computed at an older
+    version is still current.
+
+    In memory each segment is held as EntryColumns; summaries scan the columns
+    directly and dicts are rebuilt only for responses and segment files.
+    """
+
+    def __init__(self, directory, legacy_path=None, default_goal=PROTEIN_GOAL, durability=DURABILITY,
+                 background_compaction=COMPACTION_BACKGROUND, on_change=None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'Unknown durability mode {durability!r} (expected one of {", ".join(DURABILITY_MODES)})')
+        self.directory = directory
+        self.legacy_path = legacy_path
+        self.default_goal = default_goal
+        self.durability = durability
+        self.background_compaction = background_compaction
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.replicas_path = os.path.join(directory, 'replicas.json')
+        self.segments_dir = os.path.join(directory, 'entries')
+        self._lock = threading.RLock()
+        self._lock_fd = None
+        self._lock_pid = None
+        self._lock_depth = 0
+        self._manifest = None
+        self._stamp = None
+        self._segments = {}
+        self._dirty = {}  # months changed since the last snapshot -> their snapshot file
+        self._touched = {}  # month -> log sequence number of its last change
+        self._log = MutationLog(os.path.join(directory, 'log.jsonl'), sync=durability != 'none')
+        self._seq = 0  # sequence number of the last log record applied
+        self._log_records = 0
+        self._recent = deque(maxlen=RECENT_RECORDS)  # last records applied, for followers
+        self._on_change = on_change  # called after writes reach the log or a new snapshot
+        self._indexes = {}  # archive index file -> its parsed index
+        self._committer = (GroupCommitter(self._commit, GROUP_COMMIT_MS / 1000, GROUP_COMMIT_MAX)
+                           if durability == 'group' else None)
+
+    # ---- locking ----
+
+    @contextmanager
+    def _locked(self):
+        """Thread lock plus an flock on the shard's lock file, so worker processes
+        sharing the data directory never interleave a read-modify-write"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            if self._lock_depth == 0:
+                if self._lock_pid != os.getpid():
+                    # A forked child must not share the parent's open file description
+                    if self._lock_fd is not None:
+                        os.close(self._lock_fd)
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._lock_fd = os.open(os.path.join(self.directory, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+                    self._lock_pid = os.getpid()
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def __del__(self):
+        if self._lock_fd is not None and self._lock_pid == os.getpid():
+            try:
+                os.close(self._lock_fd)
+            except OSError:
+                pass
+
+    # ---- snapshot and log ----
+
+    def _segment_path(self, month):
+        info = self._manifest['segments'].get(month, {})
+        return os.path.join(self.segments_dir, info.get('file', f'{month}.json'))
+
+    def _current_manifest(self):
+        # Reload when the snapshot changed underneath us (another process or tool checkpointed)
+        stamp = _file_stamp(self.manifest_path)
+        if self._manifest is None or stamp != self._stamp:
+            self._open(stamp)
+        else:
+            # Writes other processes appended since we last looked
+            self._replay()
+        return self._manifest
+
+    def _open(self, stamp):
+        """Read the snapshot and replay the log on top of it"""
+        self._segments = {}
+        self._dirty = {}
+        self._touched = {}
+        self._log_records = 0
+        self._recent.clear()
+        self._indexes = {}
+        manifest = _read_json(self.manifest_path)
+        if manifest is None:
+            self._create()
+            return
+        self._manifest = manifest
+        self._stamp = stamp
+        if 'changes' not in manifest:
+            # Shards written before the change log: nothing older than now can be revalidated
+            manifest['changes'] = []
+            manifest['changes_floor'] = manifest.get('generation', 0)
+        self._seq = manifest.get('log_seq', 0)
+        self._log.offset = 0
+        self._replay()
+        if any(not info.get('sealed') and is_closed(month) for month, info in manifest['segments'].items()):
+            self._checkpoint('seal')
+        elif any(not self._archived(month) for month in self._archive_months()):
+            self._checkpoint('archive')
+
+    def _create(self):
+        """Initialise an empty shard, importing a legacy single-file shard if present"""
+        self._manifest = {"version": MANIFEST_VERSION, "settings": {}, "segments": {}, "generation": 0}
+        self._seq = 0
+        if self.legacy_path and _has_content(self.legacy_path):
+            # Streamed: the legacy document and its dicts are never all in memory at once
+            start = time.perf_counter()
+            legacy = EntryStream(self.legacy_path)
+            try:
+                self._partition(legacy)
+            except ValueError as e:  # includes UnicodeDecodeError and jsonstream.StreamError
+                # Corrupted or truncated: keep the file for inspection and start empty
+                aside = f'{self.legacy_path}.corrupt-{datetime.now().strftime("%Y%m%d%H%M%S")}'
+                os.replace(self.legacy_path, aside)
+                print(f"[{os.getpid()}] {self.legacy_path} is not valid JSON ({e}); moved to {aside}, "
+                      f"starting with no entries", file=sys.stderr)
+                self._manifest = {"version": MANIFEST_VERSION, "settings": {}, "segments": {}, "generation": 0}
+                self._segments, self._dirty, self._touched = {}, {}, {}
+            else:
+                metrics.observe_storage('load', time.perf_counter() - start, os.path.getsize(self.legacy_path))
+                self._manifest['settings'] = legacy.members.get('settings', {})
+                self._manifest['migrated_from'] = self.legacy_path
+        self._manifest['changes'] = []
+        self._manifest['changes_floor'] = self._manifest['generation']
+        self._checkpoint('create')
+
+    def _replay(self):
+        for record in self._log.read_new():
+            self._log_records += 1
+            # Records up to log_seq are already part of the snapshot
+            if record['seq'] > self._seq:
+                self._seq = record['seq']
+                self._apply(record)
+
+    def _checkpoint(self, trigger):
+        """Snapshot while the caller holds the lock (shard creation, save, sealing, archiving)"""
+        start = time.perf_counter()
+        snapshot = self._plan_snapshot()
+        try:
+            self._write_snapshot(snapshot)
+        except BaseException:
+            self._discard_snapshot(snapshot)
+            raise
+        reclaimed = self._switch_snapshot(snapshot)
+        metrics.observe_compaction(trigger, 'done', time.perf_counter() - start, reclaimed)
+        if self._on_change:
+            self._on_change()
+
+    def _plan_snapshot(self):
+        """Copy what a new snapshot needs: the manifest, and the columns of changed
+        and newly closed or newly archived months"""
+        boundary = archive_boundary()
+        manifest = dict(self._manifest,
+                        segments={month: dict(info) for month, info in self._manifest['segments'].items()},
+                        settings=dict(self._manifest['settings']),
+                        changes=[list(change) for change in self._manifest['changes']])
+        dirty = dict(self._dirty)
+        for month, info in manifest['segments'].items():
+            if not info.get('sealed') and is_closed(month):
+                info['sealed'] = True
+                dirty.setdefault(month, self._segment_path(month))
+            if month < boundary and not self._segment_path(month).endswith(ARCHIVE_SUFFIX):
+                dirty.setdefault(month, self._segment_path(month))
+        # Copies, so writers can keep changing the live columns while the files are written
+        columns = {month: self._segment(month, cache=month >= boundary).columns.copy()
+                   for month in dirty if month in manifest['segments']}
+        return _Snapshot(self._seq, self._stamp, self._log.offset, self._log_records, manifest, dirty, columns,
+                         boundary)
+
+    def _write_snapshot(self, snapshot):
+        """Write the snapshot's segment files under new names; needs no lock"""
+        for month, columns in sorted(snapshot.columns.items()):
+            info = snapshot.manifest['segments'][month]
+            if info['sealed']:
+                columns = columns.sorted_by_day()
+            archive = month < snapshot.boundary
+            name = f'{month}.{snapshot.seq}'
+            extension = ARCHIVE_SUFFIX if archive else '.json'
+            path = os.path.join(self.segments_dir, name + extension)
+            suffix = 0
+            while os.path.exists(path):
+                # A shard copied from a primary restarts at the primary's log position
+                suffix += 1
+                path = os.path.join(self.segments_dir, f'{name}-{suffix}{extension}')
+            info['file'] = os.path.basename(path)
+            document = {"month": month, "sealed": info['sealed'], "entries": columns.to_dicts()}
+            durable = self.durability != 'none'
+            snapshot.written[month] = path
+            if archive:
+                # The index first: an archive is never visible without one
+                _write_json(_index_path(path), _archive_index(month, columns), compact=True, durable=durable)
+                _write_file(path, gzip.compress(jsoncodec.dumps(document), ARCHIVE_LEVEL, mtime=0), durable)
+            else:
+                _write_json(path, document, compact=info['sealed'], durable=durable)
+
+    def _discard_snapshot(self, snapshot):
+        """Remove files of a snapshot that will not be switched to (caller holds the lock)"""
+        referenced = {self._segment_path(month) for month in self._manifest['segments']} if self._manifest else set()
+        for path in snapshot.written.values():
+            if path not in referenced:
+                _remove_files(_segment_files(path))
+
+    def _switch_snapshot(self, snapshot):
+        """Make a written snapshot current: replace the manifest, drop the log records it
+        covers and the files it supersedes. Returns the bytes reclaimed."""
+        before = self._log.offset
+        superseded = [path for month, path in snapshot.dirty.items()
+                      if path and path != snapshot.written.get(month)]
+        before += sum(_file_size(file) for path in superseded for file in _segment_files(path))
+
+        manifest = snapshot.manifest
+        manifest['log_seq'] = snapshot.seq
+        # The manifest is the switch: until it is replaced the old files and the log stay valid
+        _write_json(self.manifest_path, manifest, durable=self.durability != 'none')
+        self._stamp = _file_stamp(self.manifest_path)
+        self._log.drop_before(snapshot.log_offset)
+        self._log_records -= snapshot.log_records
+        self._manifest['log_seq'] = snapshot.seq
+
+        # Months changed again while the files were written stay dirty, against the new files
+        segments = self._manifest['segments']
+        for month in snapshot.dirty:
+            path = snapshot.written.get(month)
+            if month in segments and path:
+                segments[month]['file'] = manifest['segments'][month]['file']
+                segments[month]['sealed'] = manifest['segments'][month]['sealed']
+            if self._touched.get(month, 0) > snapshot.seq:
+                self._dirty[month] = path
+            else:
+                self._dirty.pop(month, None)
+                self._touched.pop(month, None)
+                if month < snapshot.boundary:
+                    # Archived: the columns leave memory, summaries read the index from now on
+                    self._segments.pop(month, None)
+
+        for path in superseded:
+            _remove_files(_segment_files(path))
+        after = self._log.offset + sum(_file_size(file) for path in snapshot.written.values()
+                                       for file in _segment_files(path))
+        return max(0, before - after)
+
+    def _compaction_due(self):
+        """Why the log should be folded into a new snapshot ('size' or 'garbage'), or None"""
+        if self._log.offset >= COMPACT_LOG_BYTES:
+            return 'size'
+        if self._log_records >= COMPACT_MIN_RECORDS:
+            live = sum(info['count'] for info in self._manifest['segments'].values())
+            if self._log_records >= COMPACT_GARBAGE_RATIO * live:
+                return 'garbage'
+        return None
+
+    def _log_change(self, *dates):
+        """Record that the given dates (None: any date) changed at the current generation.
+        Data-preserving rewrites such as sealing are not logged."""
+        manifest = self._manifest
+        changes = manifest['changes']
+        generation = manifest.get('generation', 0)
+        for day in dict.fromkeys(dates):
+            changes.append([generation, day, day])
+        while len(changes) > CHANGE_LOG_SIZE:
+            manifest['changes_floor'] = changes.pop(0)[0]
+
+    # ---- writes ----
+
+    def _record(self, op, *args):
+        """Log record for a mutation, None when it would change nothing"""
+        if op == 'add':
+            body = {"entry": args[0].to_dict()}
+            body["entry"].setdefault('id', str(uuid.uuid4()))
+        elif op in ('update', 'delete'):
+            segment, _ = self._locate(args[0])
+            if segment is None:
+                return None
+            body = {"id": args[0], "entry": args[1].to_dict()} if op == 'update' else {"id": args[0]}
+        elif op == 'settings':
+            body = {"changes": args[0]}
+        else:
+            raise ValueError(f'Unknown operation {op!r}')
+        self._seq += 1
+        return dict(seq=self._seq, gen=self._manifest.get('generation', 0) + 1, op=op, **body)
+
+    def _apply(self, record):
+        """Apply one log record to the in-memory shard (live writes and replay);
+        returns False for an update or delete of a missing entry"""
+        op = record['op']
+        # Never backwards: a follower's own generation can be ahead of the primary's
+        self._manifest['generation'] = max(record['gen'], self._manifest.get('generation', 0) + 1)
+        self._recent.append(record)
+        if op == 'settings':
+            # Goals feed into summaries of every date
+            self._manifest['settings'].update(record['changes'])
+            self._log_change(None)
+            return True
+
+        entry = record.get('entry')
+        if op == 'add':
+            segment = self._segment(month_of(entry.get('date')))
+            segment.columns.append(entry)
+            self._touch(segment)
+            self._log_change(entry.get('date'))
+            return True
+
+        segment, row = self._locate(record['id'])
+        if segment is None:
+            return False
+        old_date = _row_date(segment.columns, row)
+        if entry is None:
+            segment.columns.delete(row)
+            self._touch(segment)
+            self._log_change(old_date)
+        elif month_of(entry.get('date')) == segment.month:
+            segment.columns.replace(row, entry)
+            self._touch(segment)
+            self._log_change(old_date, entry.get('date'))
+        else:
+            # The date moved to another month, move the entry between segments
+            segment.columns.delete(row)
+            self._touch(segment)
+            target = self._segment(month_of(entry.get('date')))
+            target.columns.append(entry)
+            self._touch(target)
+            self._log_change(old_date, entry.get('date'))
+        return True
+
+    def _commit(self, mutations):
+        """Apply mutations and append their records to the log in one write;
+        returns (result, log position) per mutation"""
+        with self._locked():
+            self._current_manifest()
+            records, results = [], []
+            try:
+                for mutation in mutations:
+                    record = self._record(*mutation)
+                    results.append((record is not None and self._apply(record), self._seq))
+                    if record is not None:
+                        records.append(record)
+            except BaseException:
+                # Memory may now be ahead of the log, rebuild from disk on next access
+                self._reset()
+                raise
+            self._append(records)
+            return results
+
+    def _append(self, records):
+        """Append records already applied in memory to the log (caller holds the lock),
+        then compact if the log is due"""
+        try:
+            if records:
+                self._log.append(records)
+        except BaseException:
+            # Memory may now be ahead of the log, rebuild from disk on next access
+            self._reset()
+            raise
+        self._log_records += len(records)
+        if records and self._on_change:
+            self._on_change()
+        trigger = self._compaction_due()
+        if trigger and self.background_compaction:
+            compactor.request(self, trigger)
+        elif trigger:
+            try:
+                self._checkpoint(trigger)
+            except OSError as e:
+                # The writes are safe in the log; the checkpoint is retried after the next write
+                print(f"[{os.getpid()}] checkpoint of {self.directory} failed: {e}", file=sys.stderr)
+
+    def _mutate(self, *mutation):
+        if self._committer is not None:
+            result, seq = self._committer.submit(mutation)
+        else:
+            result, seq = self._commit([mutation])[0]
+        if REPLICATION_SYNC_TIMEOUT > 0:
+            self._await_replicas(seq, REPLICATION_SYNC_TIMEOUT)
+        return result
+
+    def _await_replicas(self, seq, timeout):
+        """Wait until a follower that is pulling has applied the log up to seq;
+        False on timeout or when no follower is pulling"""
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.time()
+            acks = [ack['seq'] for ack in self.replicas().values() if now - ack['time'] < REPLICA_STALE]
+            if not acks:
+                return False
+            if max(acks) >= seq:
+                return True
+            if time.monotonic() >= deadline:
+                metrics.REPLICATION_SYNC_TIMEOUTS.inc()
+                return False
+            time.sleep(0.005)
+
+    def _reset(self):
+        self._manifest = None
+        self._stamp = None
+        self._segments = {}
+        self._dirty = {}
+        self._touched = {}
+        self._recent.clear()
+        self._indexes = {}
+
+    # ---- segments ----
+
+    def _segment(self, month, cache=True):
+        """A month's entries, loaded on first use. Archived months are decompressed
+        for one use only (cache=False) unless a write keeps them in memory."""
+        segment = self._segments.get(month)
+        if segment is None:
+            info = self._manifest['segments'].get(month)
+            path = self._segment_path(month)
+            if not info:
+                document = None
+            elif path.endswith(ARCHIVE_SUFFIX):
+                document = _read_archive(path)
+            else:
+                document = _read_json(path)
+            entries = document.get('entries', []) if document else []
+            # Ensure each entry has an ID
+            for entry in entries:
+                if 'id' not in entry:
+                    entry['id'] = str(uuid.uuid4())
+            segment = Segment(month, EntryColumns.from_dicts(entries), info['generation'] if info else 0)
+            if cache:
+                self._segments[month] = segment
+        return segment
+
+    def _archive_months(self, start_date=None, end_date=None):
+        """Months of the range in the archive tier"""
+        boundary = archive_boundary()
+        return [month for month in self._months_between(start_date, end_date, archived=True) if month < boundary]
+
+    def _archived(self, month):
+        """Whether month is read from an archive file and its index (not changed since)"""
+        return month not in self._dirty and self._segment_path(month).endswith(ARCHIVE_SUFFIX)
+
+    def _index_of(self, month):
+        """Index of an archived month, with its day rows as (day, category, calories, protein, count)"""
+        path = _index_path(self._segment_path(month))
+        index = self._indexes.get(path)
+        if index is None:
+            index = _read_json(path)
+            if index is None:
+                # Lost index: rebuild it from the archive
+                index = _archive_index(month, self._segment(month, cache=False).columns)
+            index['days'] = [(day_ordinal(day), category_code(category), calories, protein, count)
+                             for day, category, calories, protein, count in index['days']]
+            self._indexes[path] = index
+        return index
+
+    def _touch(self, segment):
+        """Refresh the manifest row of a changed segment; its file is written at the next checkpoint"""
+        segments = self._manifest['segments']
+        self._dirty.setdefault(segment.month, self._segment_path(segment.month) if segment.month in segments else None)
+        self._touched[segment.month] = self._seq
+        segment.generation = self._manifest.get('generation', 0)
+        if not len(segment.columns):
+            segments.pop(segment.month, None)
+            self._segments.pop(segment.month, None)
+            return
+
+        info = segments.get(segment.month, {})
+        day_range = segment.columns.day_range()
+        segments[segment.month] = dict(info, **{
+            "generation": segment.generation,
+            "sealed": info.get('sealed', is_closed(segment.month)),
+            "count": len(segment.columns),
+            "first_date": day_string(day_range[0]) if day_range else None,
+            "last_date": day_string(day_range[1]) if day_range else None
+        })
+        self._segments[segment.month] = segment
+
+    def _partition(self, entries):
+        """Replace all segments with entries (any iterable of dicts) split by month"""
+        # Encoded into columns as they arrive, so the dicts can be dropped right away
+        by_month = {}
+        for entry in entries:
+            if 'id' not in entry:
+                entry['id'] = str(uuid.uuid4())
+            month = month_of(entry.get('date'))
+            columns = by_month.get(month)
+            if columns is None:
+                columns = by_month[month] = EntryColumns()
+            columns.append(entry)
+
+        self._manifest['generation'] = self._manifest.get('generation', 0) + 1
+        # Not logged; a new log position keeps the new files from overwriting the snapshot's
+        self._seq += 1
+        for month in list(self._manifest['segments']):
+            if month not in by_month:
+                self._touch(Segment(month, EntryColumns(), 0))
+        for month, columns in by_month.items():
+            self._touch(Segment(month, columns, 0))
+
+    def _months_between(self, start_date=None, end_date=None, archived=False):
+        """Months overlapping the range; those in the archive tier only when archived is set"""
+        start_month = month_of(start_date) if start_date else None
+        end_month = month_of(end_date) if end_date else None
+        boundary = '' if archived else archive_boundary()
+        months = []
+        for month in sorted(self._manifest['segments']):
+            if month < boundary:
+                continue
+            if month == UNDATED:
+                if start_date is None and end_date is None:
+                    months.append(month)
+                continue
+            if start_month and month < start_month:
+                continue
+            if end_month and month > end_month:
+                continue
+            months.append(month)
+        return months
+
+    def _locate(self, entry_id):
+        # Most edits touch recent entries, so search newest segments first
+        boundary = archive_boundary()
+        for month in sorted(self._manifest['segments'], reverse=True):
+            segment = self._segment(month, cache=month >= boundary)
+            row = segment.columns.index_of(entry_id)
+            if row >= 0:
+                # Kept in memory for the write that follows
+                self._segments[month] = segment
+                return segment, row
+        return None, -1
+
+    def _scan(self, start_date=None, end_date=None, archived=False):
+        """Yield (columns, rows) for every segment overlapping the date range
+        (including archived months when archived is set)"""
+        start_day = day_ordinal(start_date) if start_date else None
+        end_day = day_ordinal(end_date) if end_date else None
+        boundary = archive_boundary()
+        for month in self._months_between(start_date, end_date, archived):
+            columns = self._segment(month, cache=month >= boundary).columns
+            yield columns, columns.rows(start_day, end_day)
+
+    def _archived_totals(self, start_date=None, end_date=None):
+        """(day, category, calories, protein, count) rows of the archive tier within the range"""
+        low = day_ordinal(start_date) if start_date else NO_DAY + 1
+        high = day_ordinal(end_date) if end_date else sys.maxsize
+        rows = []
+        for month in self._archive_months(start_date, end_date):
+            if self._archived(month):
+                totals = self._index_of(month)['days']
+            else:
+                # Not archived yet, or changed since
+                columns = self._segment(month, cache=False).columns
+                totals = [key + tuple(total) for key, total in columns.day_totals().items()]
+            rows.extend(row for row in totals if low <= row[0] <= high)
+        return rows
+
+    # ---- public API ----
+
+    def invalidate(self):
+        """Drop in-memory copies so the next access reads from disk"""
+        with self._locked():
+            self._reset()
+
+    def load(self, archived=False):
+        """Return all of the shard's entries as dicts (archived months only when asked for)"""
+        return self.load_range(archived=archived)
+
+    def load_range(self, start_date=None, end_date=None, archived=False):
+        """Entries with start_date <= date <= end_date as dicts, opening only overlapping segments"""
+        with self._locked():
+            self._current_manifest()
+            entries = []
+            for columns, rows in self._scan(start_date, end_date, archived):
+                entries.extend(columns.to_dicts(rows))
+            return entries
+
+    def entries(self, start_date=None, end_date=None, archived=False):
+        """Dated entries in the range as Entry objects"""
+        with self._locked():
+            self._current_manifest()
+            entries = []
+            for columns, rows in self._scan(start_date, end_date, archived):
+                for row in rows:
+                    entry = columns.entry(row)
+                    if entry is not None:
+                        entries.append(entry)
+            return entries
+
+    def version(self):
+        """Data version: changes whenever any segment or the settings of the shard are written"""
+        with self._locked():
+            return self._current_manifest().get('generation', 0)
+
+    def changes_since(self, version):
+        """(first, last) date ranges written after version, None meaning any date;
+        returns None when the change log no longer reaches back to version"""
+        with self._locked():
+            manifest = self._current_manifest()
+            if version < manifest.get('changes_floor', 0):
+                return None
+            return [(first, last) for generation, first, last in manifest['changes'] if generation > version]
+
+    def column_snapshot(self, start_date=None, end_date=None, foods=False, archived=False):
+        """Copies of the day, calories, protein and category (and optionally food) columns
+        of the overlapping segments"""
+        with self._locked():
+            self._current_manifest()
+            snapshot = []
+            boundary = archive_boundary()
+            for month in self._months_between(start_date, end_date, archived):
+                columns = self._segment(month, cache=month >= boundary).columns
+                # Slices copy, so callers may wrap them in NumPy arrays while the store keeps appending
+                part = (columns.days[:], columns.calories[:], columns.protein[:], columns.categories[:])
+                snapshot.append(part + (columns.foods[:],) if foods else part)
+            return snapshot
+
+    def date_range(self):
+        """(first, last) entry date from the manifest, or None for an empty shard"""
+        with self._locked():
+            rows = [info for info in self._current_manifest()['segments'].values() if info.get('first_date')]
+            if not rows:
+                return None
+            return min(r['first_date'] for r in rows), max(r['last_date'] for r in rows)
+
+    def count(self):
+        with self._locked():
+            return sum(info['count'] for info in self._current_manifest()['segments'].values())
+
+    def daily_totals(self, start_date, end_date):
+        """{date: {"calories", "protein", "count"}} computed straight from the columns,
+        and from the indexes of archived months"""
+        with self._locked():
+            self._current_manifest()
+            totals = {}
+            for columns, rows in self._scan(start_date, end_date):
+                days, calories, protein = columns.days, columns.calories, columns.protein
+                for row in rows:
+                    day = totals.get(days[row])
+                    if day is None:
+                        day = totals[days[row]] = [0, 0, 0]
+                    day[0] += calories[row]
+                    day[1] += protein[row]
+                    day[2] += 1
+            for ordinal, _, calories, protein, count in self._archived_totals(start_date, end_date):
+                day = totals.get(ordinal)
+                if day is None:
+                    day = totals[ordinal] = [0, 0, 0]
+                day[0] += calories
+                day[1] += protein
+                day[2] += count
+            return {day_string(day): {"calories": c, "protein": p, "count": n}
+                    for day, (c, p, n) in totals.items()}
+
+    def food_counts(self, start_date=None, end_date=None):
+        """How often each food (lowercased, stripped) was logged; archived months the
+        range covers in full are counted from their indexes"""
+        with self._locked():
+            self._current_manifest()
+            counts = {}
+            for columns, rows in self._scan(start_date, end_date):
+                _food_counts(columns, rows, counts)
+            start_day = day_ordinal(start_date) if start_date else None
+            end_day = day_ordinal(end_date) if end_date else None
+            for month in self._archive_months(start_date, end_date):
+                # ISO dates compare as strings, and '<month>-31' sorts after every day of the month
+                covered = ((not start_date or start_date <= f'{month}-01')
+                           and (not end_date or end_date >= f'{month}-31'))
+                if covered and self._archived(month):
+                    for name, count in self._index_of(month)['foods'].items():
+                        counts[name] = counts.get(name, 0) + count
+                else:
+                    columns = self._segment(month, cache=False).columns
+                    _food_counts(columns, columns.rows(start_day, end_day), counts)
+            return counts
+
+    def archived_totals(self, start_date=None, end_date=None):
+        """Totals per day and category of the archived months in the range, read from their
+        indexes without opening the archives: [(day ordinal, category, calories, protein, count)]"""
+        with self._locked():
+            self._current_manifest()
+            return [(day, category_name(category), calories, protein, count)
+                    for day, category, calories, protein, count in self._archived_totals(start_date, end_date)]
+
+    def archived_months(self, start_date=None, end_date=None):
+        """Months of the range in the archive tier, which raw reads skip unless asked"""
+        with self._locked():
+            self._current_manifest()
+            return self._archive_months(start_date, end_date)
+
+    def archive_boundary(self):
+        """First month not archived; raw reads skip the months before it unless asked"""
+        return archive_boundary()
+
+    def segment_info(self):
+        with self._locked():
+            return dict(self._current_manifest()['segments'])
+
+    def save(self, entries):
+        """Replace all entries; written as a checkpoint rather than logged"""
+        with self._locked():
+            self._current_manifest()
+            self._partition(entries)
+            self._log_change(None)
+            self._checkpoint('save')
+
+    def add(self, entry):
+        """Append a parsed Entry; returns once it is as durable as the shard's mode makes it"""
+        self._mutate('add', entry)
+
+    def update(self, entry_id, entry):
+        """Replace an entry by ID with a parsed Entry; returns False when it does not exist"""
+        if entry.id is None:
+            entry.id = entry_id
+        elif entry.id != entry_id:
+            raise ValueError(f'Entry ID {entry.id!r} does not match {entry_id!r}')
+        return self._mutate('update', entry_id, entry)
+
+    def delete(self, entry_id):
+        """Remove an entry by ID; returns False when it does not exist"""
+        return self._mutate('delete', entry_id)
+
+    def checkpoint(self):
+        """Write the logged changes into the segment files now, holding the lock throughout"""
+        with self._locked():
+            self._current_manifest()
+            self._checkpoint('manual')
+
+    def compact(self, trigger='manual'):
+        """Fold the log into a new snapshot. The segment files are written without
+        holding the shard lock, so reads and writes continue meanwhile; returns False
+        when there was nothing to do or another snapshot switched in first."""
+        start = time.perf_counter()
+        with self._locked():
+            self._current_manifest()
+            if trigger != 'manual' and self._compaction_due() is None:
+                return False
+            if not self._dirty and not self._log.offset:
+                return False
+            snapshot = self._plan_snapshot()
+        try:
+            self._write_snapshot(snapshot)
+        except BaseException:
+            with self._locked():
+                self._discard_snapshot(snapshot)
+            raise
+        with self._locked():
+            self._current_manifest()
+            if self._stamp != snapshot.stamp:
+                # Another checkpoint (this process or another) replaced the manifest
+                self._discard_snapshot(snapshot)
+                metrics.observe_compaction(trigger, 'abandoned', time.perf_counter() - start, 0)
+                return False
+            reclaimed = self._switch_snapshot(snapshot)
+        metrics.observe_compaction(trigger, 'done', time.perf_counter() - start, reclaimed)
+        if self._on_change:
+            self._on_change()
+        return True
+
+    def get_settings(self):
+        with self._locked():
+            settings = dict(self._current_manifest()['settings'])
+        settings.setdefault('protein_goal', self.default_goal)
+        return settings
+
+    def update_settings(self, **changes):
+        self._mutate('settings', changes)
+        return self.get_settings()
+
+    # ---- replication ----
+
+    def replication_state(self):
+        """(log position, primary the shard was copied from or None)"""
+        with self._locked():
+            manifest = self._current_manifest()
+            return self._seq, manifest.get('replicated_from')
+
+    def log_since(self, seq, limit=None):
+        """Log records after position seq (at most limit); None when the log no longer
+        reaches back to seq and a follower needs a full copy instead"""
+        with self._locked():
+            manifest = self._current_manifest()
+            if seq < manifest.get('log_seq', 0) or seq > self._seq:
+                return None
+            recent = self._recent
+            if recent and recent[0]['seq'] <= seq + 1:
+                records = [record for record in recent if record['seq'] > seq]
+            else:
+                records = [record for record in self._log.read_all() if record['seq'] > seq]
+            return records[:limit] if limit else records
+
+    def snapshot(self):
+        """Full copy of the shard for a follower: log position, generation, settings and entries"""
+        with self._locked():
+            manifest = self._current_manifest()
+            entries = []
+            for columns, rows in self._scan(archived=True):
+                entries.extend(columns.to_dicts(rows))
+            return {"seq": self._seq, "generation": manifest.get('generation', 0),
+                    "settings": dict(manifest['settings']), "entries": entries}
+
+    def apply_replicated(self, records):
+        """Apply and log records shipped from the primary, keeping their sequence numbers;
+        returns the new log position. Raises ReplicationGap when records are missing."""
+        with self._locked():
+            self._current_manifest()
+            applied, gap = [], None
+            try:
+                for record in records:
+                    if record['seq'] <= self._seq:
+                        continue  # already have it (a retried pull)
+                    if record['seq'] != self._seq + 1:
+                        gap = ReplicationGap(f'{self.directory}: expected record {self._seq + 1}, got {record["seq"]}')
+                        break
+                    self._seq = record['seq']
+                    self._apply(record)
+                    applied.append(record)
+            except BaseException:
+                self._reset()
+                raise
+            self._append(applied)
+            if gap is not None:
+                raise gap
+            return self._seq
+
+    def install_snapshot(self, snapshot, source):
+        """Replace the shard with a copy from snapshot(), continuing at the primary's log
+        position; source names the primary"""
+        with self._locked():
+            manifest = self._current_manifest()
+            # _partition moves to the next position, which is to be the primary's
+            self._seq = snapshot['seq'] - 1
+            self._partition(snapshot['entries'])
+            manifest['settings'] = dict(snapshot['settings'])
+            manifest['generation'] = max(snapshot['generation'], manifest['generation'])
+            manifest['replicated_from'] = source
+            self._log_change(None)
+            self._recent.clear()
+            self._checkpoint('replica')
+
+    def note_replica(self, replica, seq):
+        """Record that follower replica has applied the log up to seq (in replicas.json,
+        so every worker process sees it)"""
+        with self._locked():
+            acks = _read_json(self.replicas_path) or {}
+            acks[replica] = {"seq": seq, "time": time.time()}
+            _write_json(self.replicas_path, acks, compact=True)
+
+    def replicas(self):
+        """{follower: {"seq", "time"}} as last reported by each follower"""
+        return _read_json(self.replicas_path) or {}
+
+class ShardManager:
+    """Maps user IDs to their shards, keeping at most max_open shards in memory"""
+
+    def __init__(self, data_file, data_dir, max_open=MAX_OPEN_SHARDS, durability=DURABILITY):
+        self.data_file = data_file
+        self.data_dir = data_dir
+        self.max_open = max_open
+        self.durability = durability
+        self._lock = threading.Lock()
+        self._open = OrderedDict()
+        # Shards evicted from the LRU but still used by an in-flight request;
+        # handing out the same object keeps one write lock per user
+        self._live = weakref.WeakValueDictionary()
+        # Writes bump a counter (and, for other processes, the mtime of .changes) that
+        # followers' pulls wait on, instead of polling every shard
+        self.changes_path = os.path.join(data_dir, '.changes')
+        self._change = threading.Condition()
+        self._change_count = 0
+        self._positions = {}  # user -> (file stamps, log position) when last looked up
+
+    def path_for(self, user_id):
+        return os.path.join(self.data_dir, user_id)
+
+    def legacy_path_for(self, user_id):
+        """Single-file shard written by earlier versions, imported on first open"""
+        if user_id == DEFAULT_USER:
+            return self.data_file
+        return os.path.join(self.data_dir, f'{user_id}.json')
+
+    def get(self, user_id=DEFAULT_USER):
+        if not USER_ID_PATTERN.fullmatch(user_id):
+            raise ValueError(f'Invalid user id: {user_id!r}')
+
+        with self._lock:
+            store = self._open.get(user_id)
+            if store is not None:
+                self._open.move_to_end(user_id)
+                return store
+
+            store = self._live.get(user_id)
+            if store is None:
+                store = EntryStore(self.path_for(user_id), self.legacy_path_for(user_id), durability=self.durability,
+                                   on_change=self._changed)
+                self._live[user_id] = store
+
+            self._open[user_id] = store
+            if len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+            return store
+
+    def exists(self, user_id):
+        """Whether user_id has a shard (the default user always has one)"""
+        if user_id == DEFAULT_USER or user_id in self._open:
+            return True
+        return os.path.exists(self.path_for(user_id)) or _has_content(self.legacy_path_for(user_id))
+
+    def _changed(self):
+        with self._change:
+            self._change_count += 1
+            self._change.notify_all()
+        try:
+            os.utime(self.changes_path)
+        except FileNotFoundError:
+            os.makedirs(self.data_dir, exist_ok=True)
+            open(self.changes_path, 'a').close()
+
+    def change_token(self):
+        """Changes when any shard is written, by this process or another"""
+        return self._change_count, _file_stamp(self.changes_path)
+
+    def wait_for_change(self, token, timeout, poll=0.02):
+        """Block until change_token() differs from token, or timeout seconds passed. Writes in
+        this process wake the waiter at once; those of others are seen within poll seconds."""
+        deadline = time.monotonic() + timeout
+        with self._change:
+            while True:
+                current = self.change_token()
+                remaining = deadline - time.monotonic()
+                if current != token or remaining <= 0:
+                    return current
+                self._change.wait(min(poll, remaining))
+
+    def log_position(self, user_id):
+        """Log position of a user's shard; the shard is opened only when its files changed
+        since the last call"""
+        directory = self.path_for(user_id)
+        # Stamped before reading, so a write racing the read shows up as a change next time
+        stamps = (_file_stamp(os.path.join(directory, 'log.jsonl')),
+                  _file_stamp(os.path.join(directory, 'manifest.json')))
+        cached = self._positions.get(user_id)
+        if cached is not None and cached[0] == stamps:
+            return cached[1]
+        position = self.get(user_id).replication_state()[0]
+        self._positions[user_id] = (stamps, position)
+        return position
+
+    def open_count(self):
+        return len(self._open)
+
+    def user_ids(self):
+        """Users with a shard on disk"""
+        users = {DEFAULT_USER} if os.path.exists(self.path_for(DEFAULT_USER)) or _has_content(self.data_file) else set()
+        try:
+            names = os.listdir(self.data_dir)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            user_id = name[:-5] if name.endswith('.json') else name
+            if USER_ID_PATTERN.fullmatch(user_id):
+                users.add(user_id)
+        return sorted(users)
+
+shards = None
+
+def init_storage(data_file=DATA_FILE, data_dir=DATA_DIR, max_open=MAX_OPEN_SHARDS, durability=DURABILITY):
+    """(Re)configure the global shard manager"""
+    global shards
+    shards = ShardManager(data_file, data_dir, max_open, durability)
+    return shards
+
+init_storage()
+
+def load_entries():
+    return shards.get().load()
 
 def save_entries(entries):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump({"entries": entries}, f, ensure_ascii=False, indent=4)
+    shards.get().save(entries)
@@ -0,0 +1,125 @@
+# backend/entry.py
+"""Typed meal entry shared by the server, the summaries and the CLI.
+
+Entries are parsed and normalized once, when they enter the system: numbers
+become ints and the date a datetime.date. Everything downstream can then sum
+and compare without coping with strings.
+"""
+from datetime import date
+from typing import Dict, List, Optional
+
+CATEGORIES = ('Breakfast', 'Lunch', 'Dinner', 'Snack')  # accepted on input
+DEFAULT_CATEGORY = 'Other'                              # legacy entries without one
+REQUIRED_FIELDS = ('food', 'calories', 'protein', 'category', 'date')
+FIELDS = REQUIRED_FIELDS + ('id',)
+
+MAX_CALORIES = 10000
+MAX_PROTEIN = 500
+
+class EntryError(ValueError):
+    """Raised when entry data does not validate; errors holds every problem found"""
+
+    def __init__(self, errors: List[str]):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+def _parse_int(value, label: str, maximum: int, unit: str, errors: List[str]) -> Optional[int]:
+    # int() would read true as 1 and cut 300.7 down to 300
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        errors.append(f'{label} must be a whole number')
+        return None
+    try:
+        number = int(value)
+    except (ValueError, TypeError):
+        errors.append(f'{label} must be a valid number')
+        return None
+    if number < 0 or number > maximum:
+        errors.append(f'{label} must be between 0 and {maximum}{unit}')
+        return None
+    return number
+
+class Entry:
+    """One logged meal"""
+
+    __slots__ = ('id', 'food', 'calories', 'protein', 'category', 'date', 'extra')
+
+    def __init__(self, food: str, calories: int, protein: int, category: str, date: date,
+                 id: Optional[str] = None, extra: Optional[Dict] = None):
+        self.id = id
+        self.food = food
+        self.calories = calories
+        self.protein = protein
+        self.category = category
+        self.date = date
+        # Fields outside FIELDS are carried through untouched
+        self.extra = extra
+
+    @classmethod
+    def parse(cls, data: Dict, entry_id: Optional[str] = None, categories=CATEGORIES) -> 'Entry':
+        """Validate user input and build a normalized entry, raising EntryError"""
+        errors = []
+        for field in REQUIRED_FIELDS:
+            if field not in data:
+                errors.append(f'Missing field: {field}')
+            elif isinstance(data[field], str) and not data[field].strip():
+                errors.append(f'Empty field: {field}')
+
+        calories = protein = day = None
+        if 'calories' in data:
+            calories = _parse_int(data['calories'], 'Calories', MAX_CALORIES, '', errors)
+        if 'protein' in data:
+            protein = _parse_int(data['protein'], 'Protein', MAX_PROTEIN, 'g', errors)
+
+        if 'date' in data:
+            try:
+                day = date.fromisoformat(data['date'])
+            except (ValueError, TypeError):
+                errors.append('Invalid date format (use YYYY-MM-DD)')
+
+        if 'category' in data and data['category'] not in categories:
+            errors.append(f'Category must be one of: {", ".join(categories)}')
+
+        if errors:
+            raise EntryError(errors)
+
+        extra = {k: v for k, v in data.items() if k not in FIELDS}
+        return cls(str(data['food']).strip(), calories, protein, data['category'], day,
+                   id=entry_id or data.get('id'), extra=extra or None)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Entry':
+        """Build an entry from the storage format; trusts the data, only coerces types"""
+        extra = {k: v for k, v in data.items() if k not in FIELDS}
+        return cls(
+            data.get('food', ''),
+            int(data.get('calories', 0)),
+            int(data.get('protein', 0)),
+            data.get('category') or DEFAULT_CATEGORY,
+            date.fromisoformat(data['date']),
+            id=data.get('id'),
+            extra=extra or None
+        )
+
+    def to_dict(self) -> Dict:
+        """Storage/JSON representation"""
+        data = {
+            "food": self.food,
+            "calories": self.calories,
+            "protein": self.protein,
+            "category": self.category,
+            "date": self.date.isoformat()
+        }
+        if self.id is not None:
+            data["id"] = self.id
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __eq__(self, other):
+        if not isinstance(other, Entry):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return (f"Entry(food={self.food!r}, calories={self.calories}, protein={self.protein}, "
+                f"category={self.category!r}, date={self.date.isoformat()!r}, id={self.id!r})")
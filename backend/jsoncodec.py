@@ -0,0 +1,91 @@
+# backend/jsoncodec.py
+"""JSON encoding shared by the storage layer, the API and tracker.py.
+
+Uses orjson when it is installed and the stdlib json module otherwise. Both
+produce UTF-8 bytes, compact by default; pretty=True indents by two spaces.
+Values outside plain JSON (dates, UUIDs, NumPy scalars and arrays) are
+converted the same way by both codecs.
+"""
+import json
+import uuid
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+def _default(value):
+    """Fallback for types json cannot encode natively"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'tolist'):  # NumPy scalars and arrays
+        return value.tolist()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+class StdlibCodec:
+    name = 'json'
+
+    def dumps(self, obj: Any, pretty: bool = False) -> bytes:
+        if pretty:
+            return json.dumps(obj, ensure_ascii=False, indent=2, default=_default).encode('utf-8')
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+    def loads(self, data) -> Any:
+        return json.loads(data)
+
+class OrjsonCodec:
+    name = 'orjson'
+    OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+    def dumps(self, obj: Any, pretty: bool = False) -> bytes:
+        options = self.OPTIONS | orjson.OPT_INDENT_2 if pretty else self.OPTIONS
+        try:
+            return orjson.dumps(obj, default=_default, option=options)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which the stdlib still encodes
+            return CODECS['json'].dumps(obj, pretty)
+
+    def loads(self, data) -> Any:
+        return orjson.loads(data)
+
+CODECS: Dict[str, Any] = {'json': StdlibCodec()}
+if orjson is not None:
+    CODECS['orjson'] = OrjsonCodec()
+
+codec = CODECS.get('orjson') or CODECS['json']
+
+def use(name: str):
+    """Switch the shared codec ('orjson' or 'json'); returns it"""
+    global codec
+    if name not in CODECS:
+        raise ValueError(f'JSON codec {name!r} is not available (have: {", ".join(CODECS)})')
+    codec = CODECS[name]
+    return codec
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    return codec.dumps(obj, pretty)
+
+def loads(data) -> Any:
+    """Parse bytes or str"""
+    return codec.loads(data)
+
+def init_app(app) -> None:
+    """Make jsonify() and request.get_json() use the shared codec (pretty in debug mode)"""
+    from flask.json.provider import JSONProvider
+
+    class CodecJSONProvider(JSONProvider):
+        def dumps(self, obj, **kwargs):
+            return dumps(obj, pretty=app.debug).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return app.response_class(dumps(obj, pretty=app.debug), mimetype='application/json')
+
+    app.json_provider_class = CodecJSONProvider
+    app.json = CodecJSONProvider(app)
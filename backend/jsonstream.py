@@ -0,0 +1,172 @@
+# backend/jsonstream.py
+"""Incremental reader for the "entries" array of a data file.
+
+json.load() holds the whole document and every entry dict at once. This
+reader walks the top-level object through a buffered file and decodes one
+array element at a time with the stdlib's C scanner (JSONDecoder.raw_decode),
+so a scan over a multi-gigabyte history needs memory for one buffer and one
+entry. Top-level members other than the array (settings, metadata) are small
+and are collected on the side.
+
+    stream = EntryStream('data.json')
+    for entry in stream:
+        ...
+    stream.members  # {"metadata": {...}, ...} once iteration is done
+"""
+import codecs
+import json
+import re
+from typing import Any, Dict, Iterator
+
+CHUNK_SIZE = 1 << 16
+MAX_VALUE_CHARS = 64 * 1024 * 1024  # one array element or member larger than this is refused
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Separator after an array element, with the whitespace around it
+SEPARATOR = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+SCALAR_END = frozenset(' \t\n\r,]}')  # characters that may follow a complete scalar
+
+class StreamError(ValueError):
+    """The file is not a JSON object (or array) of the expected shape"""
+
+class _Reader:
+    """Decoded text buffer over a binary file, refilled on demand"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.first = True
+
+    def fill(self) -> bool:
+        """Read another chunk; False at end of file"""
+        if self.eof:
+            return False
+        # The first read is long enough to recognize a byte order mark
+        raw = self.f.read(max(self.chunk_size, 4) if self.first else self.chunk_size)
+        self.eof = not raw
+        if self.first:
+            # Tolerate a UTF-8 byte order mark
+            raw = raw[3:] if raw.startswith(codecs.BOM_UTF8) else raw
+            self.first = False
+        text = self.decoder.decode(raw, final=self.eof)
+        # Drop what was consumed so the buffer stays one chunk plus one value
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return not self.eof or bool(text)
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of file)"""
+        while True:
+            self.pos = pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if pos < len(self.buffer):
+                return self.buffer[pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise StreamError(f'Expected {char!r}, found {found or "end of file"!r}')
+        self.pos += 1
+
+    def value(self, scan) -> Any:
+        """Decode the next JSON value with a scanner (JSONDecoder.scan_once),
+        reading more when it spans the buffer end"""
+        self.peek()
+        while True:
+            try:
+                value, end = scan(self.buffer, self.pos)
+            except (StopIteration, json.JSONDecodeError) as e:
+                # Incomplete value: read more and retry; at end of file it is really invalid
+                if len(self.buffer) - self.pos <= MAX_VALUE_CHARS and self.fill():
+                    continue
+                raise StreamError(f'Invalid JSON near {self.buffer[self.pos:self.pos + 40]!r}') from e
+            # A bare scalar (number, true, false, null) is complete only when followed by
+            # whitespace, ',', ']' or '}': "12." at a chunk end scans as 12
+            if (self.buffer[self.pos] not in '"{[' and not self.eof
+                    and (end == len(self.buffer) or self.buffer[end] not in SCALAR_END)):
+                if self.fill():
+                    continue
+            self.pos = end
+            return value
+
+class EntryStream:
+    """Iterates the elements of one top-level array member (default "entries").
+
+    A file whose top level is itself an array is streamed element by element
+    too. Iterating again re-reads the file.
+    """
+
+    def __init__(self, path: str, key: str = 'entries', chunk_size: int = CHUNK_SIZE):
+        self.path = path
+        self.key = key
+        self.chunk_size = chunk_size
+        self.members: Dict[str, Any] = {}
+        self.found = False
+
+    def __iter__(self) -> Iterator[Any]:
+        decoder = json.JSONDecoder().scan_once
+        self.members = {}
+        self.found = False
+        with open(self.path, 'rb') as f:
+            reader = _Reader(f, self.chunk_size)
+            first = reader.peek()
+            if first == '[':
+                self.found = True
+                yield from self._array(reader, decoder)
+            elif first == '{':
+                reader.pos += 1
+                yield from self._object(reader, decoder)
+            else:
+                raise StreamError('Expected a JSON object or array')
+            if reader.peek() != '':
+                raise StreamError('Unexpected data after the top-level value')
+
+    def _object(self, reader, decoder):
+        if reader.peek() == '}':
+            reader.pos += 1
+            return
+        while True:
+            if reader.peek() != '"':
+                raise StreamError('Expected an object key')
+            name = reader.value(decoder)
+            reader.expect(':')
+            if name == self.key and reader.peek() == '[':
+                self.found = True
+                yield from self._array(reader, decoder)
+            else:
+                self.members[name] = reader.value(decoder)
+            separator = reader.peek()
+            reader.pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise StreamError(f'Expected "," or "}}", found {separator or "end of file"!r}')
+
+    def _array(self, reader, decoder):
+        reader.expect('[')
+        if reader.peek() == ']':
+            reader.pos += 1
+            return
+        while True:
+            yield reader.value(decoder)
+            # Fast path: the separator and the start of the next element are in the buffer
+            match = SEPARATOR.match(reader.buffer, reader.pos)
+            if match and match.end() < len(reader.buffer):
+                reader.pos = match.end()
+                if match.group(1) == ']':
+                    return
+                continue
+            separator = reader.peek()
+            reader.pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise StreamError(f'Expected "," or "]", found {separator or "end of file"!r}')
+
+def iter_entries(path: str, key: str = 'entries') -> Iterator[Any]:
+    """Entries of a data file, one at a time"""
+    return iter(EntryStream(path, key))
@@ -0,0 +1,322 @@
+# backend/metrics.py
+"""Lightweight in-process metrics exposed in Prometheus text format"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Request latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Prediction stages run in microseconds to milliseconds
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+# Writes per group commit
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}')
+        return lines
+
+class Histogram:
+    """Cumulative histogram with fixed buckets keyed by label values"""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[label_values] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+class Gauge:
+    """Gauge whose samples are computed by a callback at scrape time"""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        try:
+            samples = self.callback() if self.callback else {}
+        except Exception:
+            samples = {}
+        for label_values, value in sorted(samples.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}')
+        return lines
+
+class Registry:
+    """Ordered collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def _process_start_time() -> float:
+    """Wall-clock time the process started (Linux /proc), else when this module was imported"""
+    try:
+        with open('/proc/self/stat', 'rb') as f:
+            # Field 22, counted after the parenthesised command name which may contain spaces
+            start_ticks = int(f.read().rsplit(b')', 1)[1].split()[19])
+        with open('/proc/uptime', 'rb') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+REGISTRY = Registry()
+PROCESS_START_TIME = _process_start_time()
+# Seconds from process start until the app was importable / answered its first request
+STARTUP = {"ready_seconds": None, "first_request_seconds": None}
+
+# ====================
+# Metric definitions
+# ====================
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'nutritrack_http_requests_total', 'HTTP requests by route, method and status',
+    ('route', 'method', 'status')))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    'nutritrack_http_request_duration_seconds', 'HTTP request latency by route and method',
+    ('route', 'method')))
+
+STORAGE_LATENCY = REGISTRY.register(Histogram(
+    'nutritrack_storage_duration_seconds', 'Storage latency (load, save, append, fsync, replay)',
+    ('operation',)))
+STORAGE_BYTES = REGISTRY.register(Counter(
+    'nutritrack_storage_bytes_total', 'Bytes read and written by the storage layer',
+    ('operation',)))
+COMMIT_BATCH = REGISTRY.register(Histogram(
+    'nutritrack_storage_commit_batch_size', 'Writes committed together by one log append (group durability)',
+    buckets=BATCH_BUCKETS))
+
+COMPACTIONS = REGISTRY.register(Counter(
+    'nutritrack_storage_compactions_total', 'Shard snapshots by trigger and result (done, abandoned)',
+    ('trigger', 'result')))
+COMPACTION_LATENCY = REGISTRY.register(Histogram(
+    'nutritrack_storage_compaction_duration_seconds', 'Time to write and switch to a new shard snapshot',
+    ('trigger',)))
+COMPACTION_RECLAIMED = REGISTRY.register(Counter(
+    'nutritrack_storage_compaction_reclaimed_bytes_total', 'Log and segment file bytes freed by snapshots'))
+
+REPLICATION_RECORDS = REGISTRY.register(Counter(
+    'nutritrack_replication_records_total', 'Log records sent to followers (primary) or applied (follower)',
+    ('direction',)))
+REPLICATION_SNAPSHOTS = REGISTRY.register(Counter(
+    'nutritrack_replication_snapshots_total', 'Full shard copies sent to followers or installed from the primary',
+    ('direction',)))
+REPLICATION_SYNC_TIMEOUTS = REGISTRY.register(Counter(
+    'nutritrack_replication_sync_timeouts_total', 'Writes acknowledged before a follower had them (REPLICATION_SYNC_TIMEOUT)'))
+
+PREDICTION_STAGE_LATENCY = REGISTRY.register(Histogram(
+    'nutritrack_prediction_stage_duration_seconds', 'Time spent in each prediction stage',
+    ('stage',), buckets=STAGE_BUCKETS))
+
+RATE_LIMITED = REGISTRY.register(Counter(
+    'nutritrack_rate_limited_total', 'Requests rejected with 429, by bucket',
+    ('bucket',)))
+
+COMPRESSION_BYTES = REGISTRY.register(Counter(
+    'nutritrack_response_compression_bytes_total', 'Response bytes before and after compression',
+    ('encoding', 'stage')))
+
+SINGLEFLIGHT = REGISTRY.register(Counter(
+    'nutritrack_singleflight_total', 'Coalesced requests: leaders computed a response, shared ones reused it',
+    ('role',)))
+
+def _predictor_cache_samples():
+    if 'ai_predictor' not in sys.modules:
+        return {}  # not loaded yet, do not load it just for a scrape
+    from ai_predictor import NutrientPredictor
+    info = NutrientPredictor.predict_nutrients_cached.__func__.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        ('hits',): info.hits,
+        ('misses',): info.misses,
+        ('size',): info.currsize,
+        ('hit_ratio',): round(info.hits / lookups, 4) if lookups else 0.0
+    }
+
+PREDICTOR_CACHE = REGISTRY.register(Gauge(
+    'nutritrack_predictor_cache', 'Predictor cache statistics',
+    ('stat',), callback=_predictor_cache_samples))
+
+def _query_cache_samples():
+    from query import cache_info
+    info = cache_info()
+    return {(stat,): info[stat] for stat in ('hits', 'misses', 'size')}
+
+QUERY_CACHE = REGISTRY.register(Gauge(
+    'nutritrack_query_cache', 'Query result cache statistics',
+    ('stat',), callback=_query_cache_samples))
+
+def _response_cache_samples():
+    from response_cache import responses
+    info = responses.info()
+    return {(stat,): info[stat] for stat in ('hits', 'revalidated', 'misses', 'size')}
+
+RESPONSE_CACHE = REGISTRY.register(Gauge(
+    'nutritrack_response_cache', 'Summary/analytics response cache statistics',
+    ('stat',), callback=_response_cache_samples))
+
+def _replication_lag_samples():
+    if 'replication' not in sys.modules:
+        return {}
+    from replication import follower_status
+    status = follower_status()
+    if status is None:
+        return {}
+    return {(unit,): status[f'lag_{unit}'] for unit in ('records', 'seconds') if status.get(f'lag_{unit}') is not None}
+
+REPLICATION_LAG = REGISTRY.register(Gauge(
+    'nutritrack_replication_lag', 'How far this follower is behind its primary',
+    ('unit',), callback=_replication_lag_samples))
+
+UPTIME = REGISTRY.register(Gauge(
+    'nutritrack_process_uptime_seconds', 'Seconds since the process started',
+    callback=lambda: {(): round(time.time() - PROCESS_START_TIME, 3)}))
+
+STARTUP_TIME = REGISTRY.register(Gauge(
+    'nutritrack_startup_seconds', 'Seconds from process start to ready and to the first served request',
+    ('phase',), callback=lambda: {(k[:-len('_seconds')],): v for k, v in STARTUP.items() if v is not None}))
+
+# ====================
+# Recording helpers
+# ====================
+
+def observe_storage(operation: str, seconds: float, nbytes: int) -> None:
+    """Record one storage load or save"""
+    STORAGE_LATENCY.observe(seconds, operation)
+    STORAGE_BYTES.inc(operation, amount=nbytes)
+
+def observe_compaction(trigger: str, result: str, seconds: float, reclaimed: int) -> None:
+    """Record one shard snapshot"""
+    COMPACTIONS.inc(trigger, result)
+    COMPACTION_LATENCY.observe(seconds, trigger)
+    COMPACTION_RECLAIMED.inc(amount=reclaimed)
+
+def observe_compression(encoding: str, original: int, compressed: int) -> None:
+    """Record one compressed response body"""
+    COMPRESSION_BYTES.inc(encoding, 'original', amount=original)
+    COMPRESSION_BYTES.inc(encoding, 'compressed', amount=compressed)
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record time spent in one prediction stage"""
+    PREDICTION_STAGE_LATENCY.observe(seconds, stage)
+
+def mark_ready() -> float:
+    """Record that the app finished loading; returns seconds since process start"""
+    if STARTUP["ready_seconds"] is None:
+        STARTUP["ready_seconds"] = round(time.time() - PROCESS_START_TIME, 4)
+    return STARTUP["ready_seconds"]
+
+def _reset_startup_after_fork() -> None:
+    # A pre-forked worker starts now, with the app already loaded
+    global PROCESS_START_TIME
+    PROCESS_START_TIME = time.time()
+    was_ready = STARTUP["ready_seconds"] is not None
+    STARTUP["ready_seconds"] = STARTUP["first_request_seconds"] = None
+    if was_ready:
+        mark_ready()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_startup_after_fork)
+
+def init_app(app) -> None:
+    """Register per-request timing hooks on a Flask app"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_LATENCY.observe(time.perf_counter() - start, route, request.method)
+            HTTP_REQUESTS.inc(route, request.method, str(response.status_code))
+        if STARTUP["first_request_seconds"] is None:
+            STARTUP["first_request_seconds"] = round(time.time() - PROCESS_START_TIME, 4)
+            print(f"[{os.getpid()}] time to first request: {STARTUP['first_request_seconds']:.3f}s", file=sys.stderr)
+        return response
+
+def render() -> str:
+    """Render every registered metric in Prometheus text exposition format"""
+    return REGISTRY.render()
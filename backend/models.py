@@ -1,15 +1,16 @@
-from database import load_entries, save_entries
+from database import shards
 from config import PROTEIN_GOAL
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 
-def get_entries_by_date(date_str):
-    return [e for e in load_entries() if e['date'] == date_str]
+def get_entries_by_date(day):
+    day = day.isoformat() if isinstance(day, date) else day
+    return shards.get().entries(day, day)
 
 def get_summary_today():
-    today = datetime.today().strftime('%Y-%m-%d')
+    today = date.today()
     meals = get_entries_by_date(today)
-    total_calories = sum(m['calories'] for m in meals)
-    total_protein = sum(m['protein'] for m in meals)
+    total_calories = sum(m.calories for m in meals)
+    total_protein = sum(m.protein for m in meals)
     met_goal = total_protein >= PROTEIN_GOAL
     return {
         "total_calories": total_calories,
@@ -19,17 +20,17 @@ def get_summary_today():
     }
 
 def get_weekly_summary():
-    today = datetime.today()
-    entries = load_entries()
+    today = date.today()
+    entries = shards.get().entries((today - timedelta(days=6)).isoformat(), today.isoformat())
     summary = []
     for i in range(7):
-        day = (today - timedelta(days=i)).strftime('%Y-%m-%d')
-        day_entries = [e for e in entries if e['date'] == day]
-        total_cal = sum(e['calories'] for e in day_entries)
-        total_prot = sum(e['protein'] for e in day_entries)
+        day = today - timedelta(days=i)
+        day_entries = [e for e in entries if e.date == day]
+        total_cal = sum(e.calories for e in day_entries)
+        total_prot = sum(e.protein for e in day_entries)
         met_goal = total_prot >= PROTEIN_GOAL
         summary.append({
-            "date": day,
+            "date": day.isoformat(),
             "calories": total_cal,
             "protein": total_prot,
             "met_goal": met_goal
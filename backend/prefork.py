@@ -0,0 +1,197 @@
+# backend/prefork.py
+"""Production launcher: a master process pre-forking N worker processes.
+
+The master imports the app and builds the predictor tables before forking,
+so workers share those pages copy-on-write, then binds the listening socket
+once and hands it to every worker. Workers serve requests with Werkzeug's
+threaded server. Storage stays consistent across workers: every shard
+operation holds an flock on the shard, and each worker re-reads the manifest
+when its (inode, mtime, size) stamp changes, which also moves the query cache
+onto the new data version.
+
+Signals (sent to the master):
+    TERM / INT   graceful shutdown: workers finish in-flight requests
+    HUP          graceful reload: re-exec the master (new code and config),
+                 keep the socket, start new workers, then retire the old ones
+
+Metrics (/api/metrics) are per worker process. Rate-limit buckets are shared:
+unless RATE_LIMIT_FILE names one, every worker maps the same per-port file in
+the temp directory, so a client's budget does not grow with the worker count.
+
+Run with:  python prefork.py [--workers N] [--host HOST] [--port PORT]
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+LISTEN_FD_ENV = 'NUTRITRACK_LISTEN_FD'
+RETIRE_PIDS_ENV = 'NUTRITRACK_RETIRE_PIDS'
+GRACEFUL_TIMEOUT = float(os.getenv('GRACEFUL_TIMEOUT', 30))  # seconds workers get to drain
+WORKERS = int(os.getenv('WORKERS', os.cpu_count() or 1))
+
+def preload():
+    """Import the app and build predictor tables in the master, before forking"""
+    from server import app, get_predictor, static_assets
+    get_predictor()
+    static_assets.build()
+    # Keep the garbage collector from touching (and so copying) the preloaded objects
+    gc.freeze()
+    return app
+
+def create_listener(host, port):
+    """Reuse the socket handed over by a reloading master, or bind a new one"""
+    inherited = os.environ.pop(LISTEN_FD_ENV, None)
+    if inherited is not None:
+        listener = socket.socket(fileno=int(inherited))
+    else:
+        listener = socket.create_server((host, port), backlog=2048, reuse_port=False)
+    listener.set_inheritable(True)
+    return listener
+
+def run_worker(app, listener):
+    """Body of a worker process; never returns"""
+    from werkzeug.serving import make_server
+    import replication
+
+    # Followers: every worker starts the puller, the first to take its lock runs it
+    replication.start_follower()
+
+    server = make_server(listener.getsockname()[0], listener.getsockname()[1], app,
+                         threaded=True, fd=listener.fileno())
+    # Let in-flight requests finish when shutting down
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever to return, so it has to run on another thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the master turns Ctrl-C into TERM
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    exit_code = 0
+    try:
+        server.serve_forever()
+        server.server_close()
+    except Exception as e:
+        print(f"[worker {os.getpid()}] {e}", file=sys.stderr)
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+class Master:
+    """Keeps WORKERS children alive and turns signals into shutdown or reload"""
+
+    def __init__(self, app, listener, workers, graceful_timeout=GRACEFUL_TIMEOUT):
+        self.app = app
+        self.listener = listener
+        self.worker_count = workers
+        self.graceful_timeout = graceful_timeout
+        self.workers = set()
+        self.signals = []
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(self.app, self.listener)
+        self.workers.add(pid)
+        return pid
+
+    def reap(self):
+        """Collect exited children; returns their pids"""
+        exited = []
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            self.workers.discard(pid)
+            exited.append(pid)
+        return exited
+
+    def terminate(self, pids):
+        """TERM the given children and wait for them, KILL whatever outlives the grace period"""
+        pids = set(pids)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pids.discard(pid)
+        deadline = time.monotonic() + self.graceful_timeout
+        while pids and time.monotonic() < deadline:
+            pids.difference_update(self.reap())
+            time.sleep(0.05)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.reap()
+
+    def reload(self):
+        """Re-exec the master with the same socket; the new master retires these workers"""
+        print(f"[master {os.getpid()}] reloading")
+        os.environ[LISTEN_FD_ENV] = str(self.listener.fileno())
+        os.environ[RETIRE_PIDS_ENV] = ','.join(str(pid) for pid in self.workers)
+        sys.stdout.flush()
+        os.execv(sys.executable, [sys.executable, os.path.abspath(sys.argv[0])] + sys.argv[1:])
+
+    def run(self):
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, lambda signum, frame: self.signals.append(signum))
+
+        for _ in range(self.worker_count):
+            self.spawn_worker()
+
+        # Workers of the master we replaced: retire them once ours are serving
+        retiring = [int(pid) for pid in os.environ.pop(RETIRE_PIDS_ENV, '').split(',') if pid]
+        if retiring:
+            self.terminate(retiring)
+
+        while True:
+            if self.signals:
+                signum = self.signals.pop(0)
+                if signum == signal.SIGHUP:
+                    self.reload()
+                print(f"[master {os.getpid()}] shutting down")
+                self.terminate(list(self.workers))
+                return
+            # Replace workers that died unexpectedly
+            for pid in self.reap():
+                print(f"[master {os.getpid()}] worker {pid} exited, restarting")
+            while len(self.workers) < self.worker_count:
+                self.spawn_worker()
+            time.sleep(0.2)
+
+def main(argv=None):
+    from config import HOST, PORT, DEBUG
+
+    parser = argparse.ArgumentParser(description="Run the NutriTrack API with pre-forked workers")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, 'fork'):
+        sys.exit("prefork.py needs os.fork(); use async_server.py on this platform")
+
+    listener = create_listener(args.host, args.port)
+    app = preload()
+    app.debug = DEBUG
+    if not app.config.get('RATE_LIMIT_FILE'):
+        app.config['RATE_LIMIT_FILE'] = os.path.join(
+            tempfile.gettempdir(), f'nutritrack-ratelimit-{args.port}.buckets')
+    print(f"[master {os.getpid()}] http://{args.host}:{args.port} with {args.workers} workers")
+    Master(app, listener, args.workers).run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+# backend/profiling.py
+"""Opt-in cProfile capture for slow requests"""
+import cProfile
+import hmac
+import os
+import pstats
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Defaults, overridable through the environment or app.config
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', 'False').lower() == 'true'      # profile every request
+PROFILE_HEADER_ENABLED = os.getenv('PROFILE_HEADER_ENABLED', 'False').lower() == 'true'  # honour X-Profile
+PROFILE_THRESHOLD_MS = float(os.getenv('PROFILE_THRESHOLD_MS', 200))          # keep only slower requests
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 50))                   # ring size
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')  # reading profiles needs it, unless in debug mode
+
+PROFILE_HEADER = 'X-Profile'
+TOKEN_HEADER = 'X-Profile-Token'
+PROFILE_SUFFIX = '.pstats'
+
+_ring_lock = threading.Lock()
+
+def _slug(route: str) -> str:
+    return re.sub(r'[^A-Za-z0-9.]+', '_', route.strip('/').replace('/', '.')) or 'root'
+
+def save_profile(profiler: cProfile.Profile, directory: str, max_files: int,
+                 method: str, route: str, duration_ms: float) -> str:
+    """Write a profile into the ring directory and drop the oldest beyond max_files"""
+    created_ms = int(time.time() * 1000)
+    profile_id = f"{created_ms}-{int(duration_ms)}-{method}-{_slug(route)}"
+
+    with _ring_lock:
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, profile_id + PROFILE_SUFFIX))
+
+        # Names start with a millisecond timestamp, so lexical order is age order
+        files = sorted(f for f in os.listdir(directory) if f.endswith(PROFILE_SUFFIX))
+        for old in files[:max(0, len(files) - max_files)]:
+            try:
+                os.remove(os.path.join(directory, old))
+            except OSError:
+                pass
+
+    return profile_id
+
+def top_functions(path: str, limit: int = 10, sort: str = 'cumulative') -> List[Dict]:
+    """Summarise the most expensive functions of a saved profile"""
+    stats = pstats.Stats(path).stats
+    key = 3 if sort == 'cumulative' else 2
+    ranked = sorted(stats.items(), key=lambda item: item[1][key], reverse=True)
+
+    result = []
+    for (filename, line, function), (_, ncalls, tottime, cumtime, _) in ranked[:limit]:
+        result.append({
+            "function": function,
+            "file": filename,
+            "line": line,
+            "ncalls": ncalls,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3)
+        })
+    return result
+
+def list_profiles(directory: str, limit: int = 10, sort: str = 'cumulative') -> List[Dict]:
+    """List saved profiles, newest first, with their top functions"""
+    if not os.path.isdir(directory):
+        return []
+
+    profiles = []
+    for filename in sorted(os.listdir(directory), reverse=True):
+        if not filename.endswith(PROFILE_SUFFIX):
+            continue
+        profile_id = filename[:-len(PROFILE_SUFFIX)]
+        path = os.path.join(directory, filename)
+        try:
+            created_ms, duration_ms, method, route = profile_id.split('-', 3)
+            functions = top_functions(path, limit, sort)
+            size = os.path.getsize(path)
+        except (ValueError, OSError, EOFError, TypeError):
+            continue
+        profiles.append({
+            "id": profile_id,
+            "method": method,
+            "route": route,
+            "duration_ms": int(duration_ms),
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(int(created_ms) / 1000)),
+            "size_bytes": size,
+            "top_functions": functions
+        })
+    return profiles
+
+def profile_path(directory: str, profile_id: str) -> Optional[str]:
+    """Resolve a profile id to its file, refusing anything outside the ring directory"""
+    if not re.fullmatch(r'[A-Za-z0-9._-]+', profile_id):
+        return None
+    path = os.path.join(directory, profile_id + PROFILE_SUFFIX)
+    return path if os.path.isfile(path) else None
+
+def can_read_profiles(app, token: Optional[str]) -> bool:
+    """Profiles expose paths and function names: served in debug mode, or with PROFILE_TOKEN"""
+    expected = app.config['PROFILE_TOKEN']
+    return app.debug or (bool(expected) and token is not None and hmac.compare_digest(token, expected))
+
+def init_app(app) -> None:
+    """Wrap request handling in cProfile when enabled for the process or the request"""
+    from flask import g, request
+
+    app.config.setdefault('PROFILE_ENABLED', PROFILE_ENABLED)
+    app.config.setdefault('PROFILE_HEADER_ENABLED', PROFILE_HEADER_ENABLED)
+    app.config.setdefault('PROFILE_THRESHOLD_MS', PROFILE_THRESHOLD_MS)
+    app.config.setdefault('PROFILE_DIR', PROFILE_DIR)
+    app.config.setdefault('PROFILE_MAX_FILES', PROFILE_MAX_FILES)
+    app.config.setdefault('PROFILE_TOKEN', PROFILE_TOKEN)
+
+    @app.before_request
+    def _start_profile():
+        wanted = app.config['PROFILE_ENABLED'] or (
+            app.config['PROFILE_HEADER_ENABLED'] and request.headers.get(PROFILE_HEADER) == '1')
+        if not wanted:
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active (one per process on Python 3.12+)
+            return
+        g.profiler = profiler
+        g.profile_start = time.perf_counter()
+
+    @app.after_request
+    def _finish_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        duration_ms = (time.perf_counter() - g.pop('profile_start')) * 1000
+
+        if duration_ms >= app.config['PROFILE_THRESHOLD_MS']:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            profile_id = save_profile(profiler, app.config['PROFILE_DIR'], app.config['PROFILE_MAX_FILES'],
+                                      request.method, route, duration_ms)
+            response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request is skipped when a handler raises, never leave the profiler running
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
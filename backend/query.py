@@ -0,0 +1,276 @@
+# backend/query.py
+"""Small group-by query engine over the entry store.
+
+A query groups entries by date, week, month, category or food and computes
+sum/avg/count/min/max of calories and protein. Date ranges are pushed down
+to the store, which only opens the monthly segments they overlap. Archived
+months answer sum/avg/count by date, week, month or category from their daily
+aggregates; min/max and food groups read their entries only with
+archived=true, and list the months left out otherwise. Results are cached per
+shard, query and data version.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from columns import NO_DAY, category_code, category_name
+
+GROUP_BY = ('date', 'week', 'month', 'category', 'food')
+AGGREGATES = ('sum', 'avg', 'count', 'min', 'max')
+FIELDS = ('calories', 'protein')
+TIME_GROUPS = ('date', 'week', 'month')
+ROW_AGGREGATES = ('min', 'max')  # need the entries themselves, not per-day totals
+
+DEFAULT_AGGREGATES = ('sum', 'count')
+MAX_LIMIT = 10000
+CACHE_SIZE = 256
+
+class QueryError(ValueError):
+    """Invalid query parameters"""
+
+def _split(value: Optional[str], default) -> Tuple[str, ...]:
+    if not value:
+        return tuple(default)
+    return tuple(dict.fromkeys(part.strip().lower() for part in value.split(',') if part.strip()))
+
+def _parse_date(value: Optional[str], name: str) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise QueryError(f'{name} must be a date (YYYY-MM-DD)')
+
+class Query:
+    """Normalized, hashable form of the query parameters"""
+
+    __slots__ = ('group_by', 'aggregates', 'fields', 'start', 'end', 'order', 'limit', 'archived')
+
+    def __init__(self, group_by='date', aggregates=DEFAULT_AGGREGATES, fields=FIELDS,
+                 start=None, end=None, order=None, limit=None, archived=False):
+        self.group_by = group_by
+        self.aggregates = aggregates
+        self.fields = fields
+        self.start = start
+        self.end = end
+        self.order = order
+        self.limit = limit
+        self.archived = archived
+
+    @classmethod
+    def from_args(cls, args) -> 'Query':
+        group_by = (args.get('group_by') or 'date').lower()
+        if group_by not in GROUP_BY:
+            raise QueryError(f'group_by must be one of: {", ".join(GROUP_BY)}')
+
+        aggregates = _split(args.get('aggregates'), DEFAULT_AGGREGATES)
+        unknown = [a for a in aggregates if a not in AGGREGATES]
+        if unknown:
+            raise QueryError(f'Unknown aggregate: {unknown[0]} (use {", ".join(AGGREGATES)})')
+
+        fields = _split(args.get('fields'), FIELDS)
+        unknown = [f for f in fields if f not in FIELDS]
+        if unknown:
+            raise QueryError(f'Unknown field: {unknown[0]} (use {", ".join(FIELDS)})')
+
+        start = _parse_date(args.get('start'), 'start')
+        end = _parse_date(args.get('end'), 'end')
+        if start and end and start > end:
+            raise QueryError('start must not be after end')
+
+        # order=<column> or order=-<column>; defaults to the group key
+        order = args.get('order') or None
+
+        limit = args.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise QueryError('limit must be an integer')
+            if limit < 1 or limit > MAX_LIMIT:
+                raise QueryError(f'limit must be between 1 and {MAX_LIMIT}')
+
+        archived = (args.get('archived') or '').lower() == 'true'
+
+        query = cls(group_by, aggregates, fields, start, end, order, limit, archived)
+        if order and order.lstrip('-') not in [group_by] + query.columns():
+            raise QueryError(f'Cannot order by {order.lstrip("-")}')
+        return query
+
+    def key(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def columns(self) -> List[str]:
+        names = ['count'] if 'count' in self.aggregates else []
+        names += [f'{field}_{agg}' for field in self.fields for agg in self.aggregates if agg != 'count']
+        return names
+
+def _time_keys(days, group_by: str):
+    """Integer group code per row for date/week/month, plus a label per code"""
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    codes = np.empty(len(unique_days), dtype=np.int64)
+    labels = {}
+    for i, ordinal in enumerate(unique_days.tolist()):
+        day = date.fromordinal(ordinal)
+        if group_by == 'date':
+            code, label = ordinal, day.isoformat()
+        elif group_by == 'week':
+            # ISO week, labelled by its Monday so keys sort chronologically
+            code = ordinal - day.weekday()
+            label = date.fromordinal(code).isoformat()
+        else:
+            code, label = day.year * 12 + day.month - 1, f'{day.year:04d}-{day.month:02d}'
+        codes[i] = code
+        labels[code] = label
+    return codes[inverse], labels
+
+def _group_keys(query: Query, days, categories, foods):
+    """Integer group code per row and {code: label}; codes sort in label order"""
+    if query.group_by in TIME_GROUPS:
+        return _time_keys(days, query.group_by)
+    if query.group_by == 'category':
+        return categories.astype(np.int64), {code: category_name(code) for code in np.unique(categories).tolist()}
+    # Food names are interned, so normalize each distinct name once
+    normalized = {}
+    for name in set(foods.tolist()):
+        normalized[name] = name.lower().strip()
+    names = sorted(set(normalized.values()))
+    code_of = {name: code for code, name in enumerate(names)}
+    codes = np.array([code_of[normalized[name]] for name in foods.tolist()], dtype=np.int64)
+    return codes, dict(enumerate(names))
+
+def execute(store, query: Query) -> Dict:
+    """Run a query against one shard"""
+    snapshot = store.column_snapshot(query.start, query.end, foods=query.group_by == 'food',
+                                     archived=query.archived)
+    excluded = []
+    archived = []
+    if not query.archived:
+        if query.group_by == 'food' or any(agg in ROW_AGGREGATES for agg in query.aggregates):
+            excluded = store.archived_months(query.start, query.end)
+        else:
+            archived = store.archived_totals(query.start, query.end)
+
+    if snapshot:
+        days = np.concatenate([np.frombuffer(part[0], dtype=np.int32) for part in snapshot])
+        values = {
+            'calories': np.concatenate([np.frombuffer(part[1], dtype=np.int32) for part in snapshot]).astype(np.int64),
+            'protein': np.concatenate([np.frombuffer(part[2], dtype=np.int32) for part in snapshot]).astype(np.int64)
+        }
+        categories = np.concatenate([np.frombuffer(part[3], dtype=np.uint8) for part in snapshot])
+        foods = np.array([name for part in snapshot for name in part[4]], dtype=object) \
+            if query.group_by == 'food' else None
+    else:
+        days = np.zeros(0, dtype=np.int32)
+        values = {field: np.zeros(0, dtype=np.int64) for field in FIELDS}
+        categories = np.zeros(0, dtype=np.uint8)
+        foods = np.zeros(0, dtype=object)
+    # Entries per row: 1, or the number of meals an archived (day, category) total covers
+    weights = np.ones(len(days), dtype=np.int64)
+    if archived:
+        totals = np.array([(day, category_code(category), cal, prot, count)
+                           for day, category, cal, prot, count in archived], dtype=np.int64)
+        days = np.concatenate([days, totals[:, 0]])
+        categories = np.concatenate([categories, totals[:, 1].astype(np.uint8)])
+        values = {field: np.concatenate([values[field], totals[:, i]])
+                  for i, field in ((2, 'calories'), (3, 'protein'))}
+        weights = np.concatenate([weights, totals[:, 4]])
+
+    # Segments are whole months, trim to the exact range; undated rows never match a range or time group
+    mask = np.ones(len(days), dtype=bool)
+    if query.start or query.end or query.group_by in TIME_GROUPS:
+        mask &= days != NO_DAY
+    if query.start:
+        mask &= days >= date.fromisoformat(query.start).toordinal()
+    if query.end:
+        mask &= days <= date.fromisoformat(query.end).toordinal()
+    if not mask.all():
+        days, categories, weights = days[mask], categories[mask], weights[mask]
+        values = {field: column[mask] for field, column in values.items()}
+        foods = foods[mask] if foods is not None else None
+
+    keys, labels = _group_keys(query, days, categories, foods)
+    group_codes, groups = np.unique(keys, return_inverse=True)
+    size = len(group_codes)
+    counts = np.bincount(groups, weights=weights, minlength=size).astype(np.int64)
+
+    results = {}
+    if 'count' in query.aggregates:
+        results['count'] = counts
+    for field in query.fields:
+        column = values[field]
+        sums = np.bincount(groups, weights=column, minlength=size)
+        for agg in query.aggregates:
+            if agg == 'sum':
+                results[f'{field}_sum'] = sums.astype(np.int64)
+            elif agg == 'avg':
+                results[f'{field}_avg'] = np.round(sums / np.maximum(counts, 1), 2)
+            elif agg == 'min':
+                minimum = np.full(size, np.iinfo(np.int64).max)
+                np.minimum.at(minimum, groups, column)
+                results[f'{field}_min'] = minimum
+            elif agg == 'max':
+                maximum = np.full(size, np.iinfo(np.int64).min)
+                np.maximum.at(maximum, groups, column)
+                results[f'{field}_max'] = maximum
+
+    names = query.columns()
+    rows = []
+    for i, code in enumerate(group_codes.tolist()):
+        row = {query.group_by: labels[code]}
+        for name in names:
+            row[name] = results[name][i].item()
+        rows.append(row)
+
+    if query.order:
+        column = query.order.lstrip('-')
+        rows.sort(key=lambda row: row[column], reverse=query.order.startswith('-'))
+    if query.limit:
+        rows = rows[:query.limit]
+
+    return {
+        "group_by": query.group_by,
+        "start": query.start,
+        "end": query.end,
+        "columns": [query.group_by] + names,
+        "rows": rows,
+        "row_count": len(rows),
+        "scanned": int(weights.sum()),
+        # Archived months in the range this query could not use; pass archived=true to read them
+        "archived_excluded": excluded
+    }
+
+# ====================
+# Result cache
+# ====================
+
+_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0}
+
+def run(store, query: Query) -> Dict:
+    """execute() with results cached per shard, query and data version"""
+    # Months move into the archive as days pass, without a new data version
+    key = (store.directory, store.version(), store.archive_boundary(), query.key())
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+            _cache_stats["hits"] += 1
+            return result
+        _cache_stats["misses"] += 1
+
+    result = execute(store, query)
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+def cache_info() -> Dict:
+    with _cache_lock:
+        return dict(_cache_stats, size=len(_cache), max_size=CACHE_SIZE)
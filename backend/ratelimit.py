@@ -0,0 +1,198 @@
+# backend/ratelimit.py
+"""Token-bucket rate limiting keyed by API key or client IP (opt-in).
+
+Each client has one bucket per route class: "expensive" routes (prediction,
+export, queries) get a smaller budget than "cheap" ones. A bucket holds up to
+a minute's worth of tokens and refills continuously, so checking a request is
+O(1): one lookup, one refill computation, one write.
+
+Buckets live in process memory by default. With RATE_LIMIT_FILE set they are
+kept in a memory-mapped file of fixed slots instead, locked per slot, so every
+pre-forked worker draws from the same buckets.
+
+Behind reverse proxies every request comes from a proxy's address; set
+RATE_LIMIT_TRUSTED_PROXIES to the number of proxies in front of the server to
+key on the client address they append to X-Forwarded-For instead.
+"""
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no shared buckets
+    fcntl = None
+
+from config import RATE_LIMIT, RATE_LIMIT_ENABLED, RATE_LIMIT_EXPENSIVE, RATE_LIMIT_FILE, RATE_LIMIT_TRUSTED_PROXIES
+
+SHARED_SLOTS = 65536
+
+API_KEY_HEADER = 'X-API-Key'
+
+# Route classes, by Flask rule
+EXPENSIVE_ROUTES = {
+    '/api/ai/predict',
+    '/api/export',
+    '/api/query',
+    '/api/debug/profiles',
+    '/api/debug/profiles/<string:profile_id>',
+}
+EXEMPT_ROUTES = {'/api/health', '/api/metrics', '/api/replication/pull'}
+
+MAX_MEMORY_KEYS = 100000
+
+def client_address(remote_addr: Optional[str], forwarded_for: Optional[str], trusted_proxies: int) -> Optional[str]:
+    """Client IP: the address trusted_proxies hops back in X-Forwarded-For, since
+    entries further left are whatever the client sent"""
+    hops = [hop.strip() for hop in (forwarded_for or '').split(',') if hop.strip()]
+    if trusted_proxies <= 0 or not hops:
+        return remote_addr
+    return hops[-min(trusted_proxies, len(hops))]
+
+def client_key(api_key: Optional[str], remote_addr: Optional[str]) -> str:
+    """Identify the client; API keys are hashed so they never sit in memory or on disk"""
+    if api_key:
+        return 'key:' + hashlib.blake2b(api_key.encode('utf-8'), digest_size=16).hexdigest()
+    return 'ip:' + (remote_addr or 'unknown')
+
+def refill(tokens: float, updated: float, now: float, rate: float, capacity: float) -> Tuple[bool, float, float]:
+    """Apply one request to a bucket; returns (allowed, tokens left, seconds until a token)"""
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / rate
+
+class MemoryBuckets:
+    """Per-process buckets"""
+
+    def __init__(self, max_keys: int = MAX_MEMORY_KEYS):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: float, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._sweep(now, rate, capacity)
+                bucket = self._buckets[key] = [capacity, now]
+            allowed, bucket[0], retry_after = refill(bucket[0], bucket[1], now, rate, capacity)
+            bucket[1] = now
+            return allowed, retry_after
+
+    def _sweep(self, now, rate, capacity):
+        # A bucket that has refilled completely is the same as no bucket
+        full_after = capacity / rate
+        for key in [k for k, (_, updated) in self._buckets.items() if now - updated >= full_after]:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
+
+class SharedBuckets:
+    """Buckets in a memory-mapped file shared by every process that opens it.
+
+    The file is a table of fixed-size slots (key hash, tokens, last update)
+    addressed by the key's hash. Each access locks just its slot, with a
+    thread lock stripe in front because fcntl locks are per process. Two
+    keys hashing to the same slot reset each other's bucket, which only
+    ever errs towards allowing a request.
+    """
+
+    SLOT = struct.Struct('<Qdd')
+    STRIPES = 64
+
+    def __init__(self, path: str, slots: int = SHARED_SLOTS):
+        self.path = path
+        self.slots = slots
+        size = slots * self.SLOT.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        self._file = open(path, 'rb+')
+        self._stripes = [threading.Lock() for _ in range(self.STRIPES)]
+
+    def take(self, key: str, rate: float, capacity: float, now: float) -> Tuple[bool, float]:
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+        slot = key_hash % self.slots
+        offset = slot * self.SLOT.size
+        with self._stripes[slot % self.STRIPES]:
+            fcntl.lockf(self._file, fcntl.LOCK_EX, self.SLOT.size, offset)
+            try:
+                stored_hash, tokens, updated = self.SLOT.unpack_from(self._map, offset)
+                if stored_hash != key_hash:
+                    tokens, updated = capacity, now
+                allowed, tokens, retry_after = refill(tokens, updated, now, rate, capacity)
+                self.SLOT.pack_into(self._map, offset, key_hash, tokens, now)
+            finally:
+                fcntl.lockf(self._file, fcntl.LOCK_UN, self.SLOT.size, offset)
+        return allowed, retry_after
+
+def create_buckets(path: Optional[str]):
+    if path and fcntl is not None:
+        return SharedBuckets(path)
+    return MemoryBuckets()
+
+def init_app(app) -> None:
+    """Enforce RATE_LIMIT (cheap routes) and RATE_LIMIT_EXPENSIVE per client, per minute"""
+    from flask import jsonify, request
+    from metrics import RATE_LIMITED
+
+    app.config.setdefault('RATE_LIMIT_ENABLED', RATE_LIMIT_ENABLED)
+    app.config.setdefault('RATE_LIMIT', RATE_LIMIT)
+    app.config.setdefault('RATE_LIMIT_EXPENSIVE', RATE_LIMIT_EXPENSIVE)
+    app.config.setdefault('RATE_LIMIT_FILE', RATE_LIMIT_FILE)
+    app.config.setdefault('RATE_LIMIT_TRUSTED_PROXIES', RATE_LIMIT_TRUSTED_PROXIES)
+
+    state = {"buckets": None, "path": None}
+
+    def buckets():
+        # Created on first use, so a launcher can point RATE_LIMIT_FILE at a shared file first
+        path = app.config['RATE_LIMIT_FILE']
+        if state["buckets"] is None or state["path"] != path:
+            state["buckets"] = create_buckets(path)
+            state["path"] = path
+        return state["buckets"]
+
+    @app.before_request
+    def _rate_limit():
+        if not app.config['RATE_LIMIT_ENABLED'] or not request.path.startswith('/api/'):
+            return None
+        if request.method == 'OPTIONS':  # CORS preflight
+            return None
+        rule = request.url_rule.rule if request.url_rule else None
+        if rule in EXEMPT_ROUTES:
+            return None
+
+        route_class = 'expensive' if rule in EXPENSIVE_ROUTES else 'cheap'
+        per_minute = app.config['RATE_LIMIT_EXPENSIVE' if route_class == 'expensive' else 'RATE_LIMIT']
+        if per_minute <= 0:
+            return None
+
+        address = client_address(request.remote_addr, request.headers.get('X-Forwarded-For'),
+                                 app.config['RATE_LIMIT_TRUSTED_PROXIES'])
+        key = client_key(request.headers.get(API_KEY_HEADER), address)
+        allowed, retry_after = buckets().take(f'{route_class}:{key}', per_minute / 60.0,
+                                              float(per_minute), time.time())
+        if allowed:
+            return None
+
+        RATE_LIMITED.inc(route_class)
+        seconds = max(1, math.ceil(retry_after))
+        response = jsonify({
+            "error": "Rate limit exceeded",
+            "limit_per_minute": per_minute,
+            "retry_after": seconds
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = str(seconds)
+        return response
@@ -0,0 +1,284 @@
+# backend/replication.py
+"""Log shipping from a primary to read-only followers.
+
+A follower (REPLICATE_FROM set to the primary's base URL) long-polls
+POST /api/replication/pull with the log position of each of its shards. The
+primary answers as soon as any shard has records past those positions (or
+after REPLICATION_WAIT seconds with nothing): the missing log records, or a
+full copy of the shard when its log no longer reaches back that far or the
+follower has never copied it. The follower appends the records to its own
+shard logs with the primary's sequence numbers, so its shards go through the
+same replay, compaction and response caching, and reports its new positions
+with the next pull. The primary keeps them in <shard>/replicas.json.
+
+Followers serve the read endpoints and answer writes with 403; add followers
+to spread read traffic over more processes or machines. Both sides report
+replication lag in /api/health. A write on the primary is acknowledged once
+it is in the primary's log; with REPLICATION_SYNC_TIMEOUT > 0 it also waits
+(at most that long) until a pulling follower has it, so promoting that
+follower (restarting it without REPLICATE_FROM) loses no acknowledged write.
+
+One process per data directory pulls (an flock elects it; the others take
+over when it exits), and every worker process reads its status from
+<DATA_DIR>/.replication.json.
+"""
+import gzip
+import hmac
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process pulls
+    fcntl = None
+
+import database
+import jsoncodec
+import metrics
+from config import REPLICA_ID, REPLICATE_FROM, REPLICATION_BATCH, REPLICATION_TOKEN, REPLICATION_WAIT
+
+TOKEN_HEADER = 'X-Replication-Token'
+PULL_PATH = '/api/replication/pull'
+MAX_WAIT = 60  # longest a pull may wait for new writes
+POLL_INTERVAL = 0.02  # how often a waiting pull looks for writes of other processes
+RETRY_DELAY = 1.0  # seconds between attempts while the primary is unreachable
+ACK_REFRESH = database.REPLICA_STALE / 3  # rewrite an unchanged follower position this often
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+READ_ONLY_POSTS = {'/api/ai/predict', PULL_PATH}  # POST routes that write nothing
+STATUS_FILE = '.replication.json'
+
+# ---- primary ----
+
+def authorized(token, expected=REPLICATION_TOKEN):
+    """Pulls need the shared REPLICATION_TOKEN; without one configured replication is off"""
+    return bool(expected) and token is not None and hmac.compare_digest(token, expected)
+
+def pull(shards, replica, positions, wait=0, limit=REPLICATION_BATCH):
+    """Changes follower replica is missing, given its log position of each shard (None when
+    it has no copy it can continue). Waits up to wait seconds while there are none.
+
+    Returns {user: {"seq": primary position, "records": [...]}} for shards with new records,
+    and {user: {"seq", "snapshot": {...}}} for shards the follower has to copy in full."""
+    known = set(shards.user_ids())
+    for user_id, seq in positions.items():
+        if seq is not None and user_id in known:
+            _note_replica(shards, user_id, replica, seq)
+    deadline = time.monotonic() + min(max(wait, 0), MAX_WAIT)
+    while True:
+        token = shards.change_token()
+        changes = {}
+        for user_id in shards.user_ids():
+            seq = positions.get(user_id)
+            # Shards the follower is level with are skipped without being opened
+            if seq is not None and seq == shards.log_position(user_id):
+                continue
+            change = _changes(shards.get(user_id), seq, limit)
+            if change is not None:
+                changes[user_id] = change
+        remaining = deadline - time.monotonic()
+        if changes or remaining <= 0:
+            return changes
+        shards.wait_for_change(token, remaining, POLL_INTERVAL)
+
+_acked = {}  # (shard directory, follower) -> (seq, time) last written to replicas.json
+
+def _note_replica(shards, user_id, replica, seq):
+    """Record a follower's position, rewriting replicas.json only when it moved (or to keep
+    it from looking stale)"""
+    key = (shards.path_for(user_id), replica)
+    now = time.time()
+    acked = _acked.get(key)
+    if acked and acked[0] == seq and now - acked[1] < ACK_REFRESH:
+        return
+    shards.get(user_id).note_replica(replica, seq)
+    _acked[key] = (seq, now)
+
+def _changes(store, seq, limit):
+    position, _ = store.replication_state()
+    if seq == position:
+        return None
+    records = store.log_since(seq, limit) if seq is not None else None
+    if records is None:
+        snapshot = store.snapshot()
+        metrics.REPLICATION_SNAPSHOTS.inc('sent')
+        return {"seq": snapshot['seq'], "snapshot": snapshot}
+    metrics.REPLICATION_RECORDS.inc('sent', amount=len(records))
+    return {"seq": max(position, records[-1]['seq']) if records else position, "records": records}
+
+def primary_status(store):
+    """Followers of store's shard: the position each reported, and how far behind that is"""
+    position, _ = store.replication_state()
+    now = time.time()
+    return {
+        "role": "primary",
+        "seq": position,
+        "replicas": {
+            replica: {
+                "seq": ack['seq'],
+                "lag_records": max(0, position - ack['seq']),
+                "last_seen_seconds": round(now - ack['time'], 3)
+            }
+            for replica, ack in store.replicas().items()
+        }
+    }
+
+# ---- follower ----
+
+class Follower:
+    """Pulls the primary's shard logs into the local shards"""
+
+    def __init__(self, primary, shards, replica_id=REPLICA_ID, token=REPLICATION_TOKEN, wait=REPLICATION_WAIT):
+        self.primary = primary
+        self.shards = shards
+        self.replica_id = replica_id
+        self.token = token
+        self.wait = wait
+        self.status_path = os.path.join(shards.data_dir, STATUS_FILE)
+        self.status = {"primary": primary, "replica_id": replica_id, "lag_records": None,
+                       "caught_up_at": None, "contact_at": None, "error": None}
+        self._resync = set()  # shards whose log did not continue, copied in full on the next pull
+
+    def positions(self):
+        positions = {}
+        for user_id in self.shards.user_ids():
+            seq, source = self.shards.get(user_id).replication_state()
+            # A shard of our own, or copied from another primary, cannot be continued
+            positions[user_id] = seq if source == self.primary and user_id not in self._resync else None
+        return positions
+
+    def pull_once(self):
+        """One pull, applied; returns how many records the follower is still behind"""
+        response = self._request({"replica": self.replica_id, "positions": self.positions(), "wait": self.wait})
+        behind = 0
+        for user_id, change in response['shards'].items():
+            store = self.shards.get(user_id)
+            if 'snapshot' in change:
+                store.install_snapshot(change['snapshot'], self.primary)
+                self._resync.discard(user_id)
+                metrics.REPLICATION_SNAPSHOTS.inc('installed')
+            else:
+                try:
+                    store.apply_replicated(change['records'])
+                except database.ReplicationGap as e:
+                    print(f"[{os.getpid()}] {e}; copying the shard again", file=sys.stderr)
+                    self._resync.add(user_id)
+                metrics.REPLICATION_RECORDS.inc('applied', amount=len(change['records']))
+            behind += max(0, change['seq'] - store.replication_state()[0])
+        now = time.time()
+        self.status.update(lag_records=behind, contact_at=now, error=None)
+        if behind == 0:
+            self.status['caught_up_at'] = now
+        self._save_status()
+        return behind
+
+    def run(self):
+        """Pull forever; started on a daemon thread"""
+        self._elect()
+        while True:
+            try:
+                self.pull_once()
+            except Exception as e:
+                if self.status['error'] != str(e):
+                    print(f"[{os.getpid()}] replication from {self.primary} failed: {e}", file=sys.stderr)
+                self.status['error'] = str(e)
+                self._save_status()
+                time.sleep(RETRY_DELAY)
+
+    def _elect(self):
+        """Block until this is the one process of the data directory that pulls"""
+        if fcntl is None:
+            return
+        os.makedirs(self.shards.data_dir, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(self.shards.data_dir, '.replication.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+
+    def _request(self, payload):
+        request = urllib.request.Request(self.primary + PULL_PATH, data=jsoncodec.dumps(payload), method='POST', headers={
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip',
+            TOKEN_HEADER: self.token
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=self.wait + 30) as response:
+                raw = response.read()
+                if response.headers.get('Content-Encoding') == 'gzip':
+                    raw = gzip.decompress(raw)
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f'primary answered {e.code}: {e.read()[:200].decode("utf-8", "replace")}') from None
+        return jsoncodec.loads(raw)
+
+    def _save_status(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.shards.data_dir, prefix='.tmp-', suffix='.json')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(jsoncodec.dumps(self.status))
+        os.replace(tmp_path, self.status_path)
+
+_started_pid = None
+_start_lock = threading.Lock()
+
+def start_follower(primary=REPLICATE_FROM):
+    """Start pulling on a daemon thread, once per process (forked workers start their own;
+    only one of them pulls at a time)"""
+    global _started_pid
+    if not primary:
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+        follower = Follower(primary, database.shards)
+        threading.Thread(target=follower.run, name='replication', daemon=True).start()
+
+def follower_status(primary=REPLICATE_FROM, wait=REPLICATION_WAIT):
+    """Lag of this follower, read from the status file the pulling process writes; None on a primary"""
+    if not primary:
+        return None
+    try:
+        with open(os.path.join(database.shards.data_dir, STATUS_FILE), 'rb') as f:
+            status = jsoncodec.loads(f.read())
+    except (OSError, ValueError):
+        status = {}
+    if status.get('primary') != primary:
+        status = {"error": "not started"}
+    now = time.time()
+    contact_at, caught_up_at = status.get('contact_at'), status.get('caught_up_at')
+    # An idle primary answers a pull after wait seconds, so a recent answer means connected
+    connected = contact_at is not None and now - contact_at < wait + RETRY_DELAY + 1 and not status.get('error')
+    if connected and status.get('lag_records') == 0:
+        lag_seconds = 0.0
+    else:
+        lag_seconds = round(now - caught_up_at, 3) if caught_up_at is not None else None
+    return {
+        "role": "follower",
+        "primary": primary,
+        "replica_id": status.get('replica_id'),
+        "connected": connected,
+        "lag_records": status.get('lag_records'),
+        "lag_seconds": lag_seconds,
+        "last_contact_seconds": round(now - contact_at, 3) if contact_at is not None else None,
+        "error": status.get('error')
+    }
+
+def status(store):
+    """Replication section of /api/health"""
+    return follower_status() or primary_status(store)
+
+def init_app(app):
+    """On a follower: answer writes with 403, and pull from the primary"""
+    from flask import jsonify, request
+
+    @app.before_request
+    def _read_only():
+        if not REPLICATE_FROM:
+            return None
+        # Launchers start pulling up front; this covers any other way of serving the app
+        start_follower()
+        if (request.path.startswith('/api/') and request.method not in READ_METHODS
+                and request.path not in READ_ONLY_POSTS):
+            return jsonify({"error": f"Read-only replica; send writes to {REPLICATE_FROM}"}), 403
+        return None
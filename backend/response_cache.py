@@ -0,0 +1,134 @@
+# backend/response_cache.py
+"""Cache of rendered JSON responses for read endpoints that poll.
+
+Each cached response remembers the shard's data version it was rendered at
+and the date range it read. A lookup at a newer version asks the shard which
+dates were written since then (EntryStore.changes_since); if none fall in
+the response's range it is still current and is served as is, so logging
+today's meal leaves cached ranges of earlier weeks untouched. Entries also
+expire after CACHE_TIMEOUT seconds and the least recently used are evicted
+beyond the size cap.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import CACHE_TIMEOUT, RESPONSE_CACHE_SIZE
+from singleflight import shared_response
+
+def overlaps(start: Optional[str], end: Optional[str], first: Optional[str], last: Optional[str]) -> bool:
+    """Whether a write to first..last (None: any date) touches the range start..end (None: open)"""
+    if first is None or last is None:
+        return True
+    if start is not None and last < start:
+        return False
+    if end is not None and first > end:
+        return False
+    return True
+
+class CachedResponse:
+    __slots__ = ('body', 'mimetype', 'version', 'start', 'end', 'expires')
+
+    def __init__(self, body, mimetype, version, start, end, expires):
+        self.body = body
+        self.mimetype = mimetype
+        self.version = version
+        self.start = start
+        self.end = end
+        self.expires = expires
+
+class ResponseCache:
+    """LRU of response bodies keyed by shard, route and arguments"""
+
+    def __init__(self, timeout: float = CACHE_TIMEOUT, max_size: int = RESPONSE_CACHE_SIZE):
+        self.timeout = timeout
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "revalidated": 0, "misses": 0}
+
+    def lookup(self, store, key, version) -> Optional[CachedResponse]:
+        """The cached response for key if it is still current at version"""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached.expires <= time.monotonic():
+                self._entries.pop(key, None)
+                self._stats["misses"] += 1
+                return None
+            if cached.version == version:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return cached
+
+        changes = store.changes_since(cached.version)
+        current = changes is not None and not any(
+            overlaps(cached.start, cached.end, first, last) for first, last in changes)
+        with self._lock:
+            if not current:
+                if self._entries.get(key) is cached:
+                    del self._entries[key]
+                self._stats["misses"] += 1
+                return None
+            # Later lookups at this version skip the change log
+            cached.version = max(cached.version, version)
+            self._stats["revalidated"] += 1
+            return cached
+
+    def store(self, key, body: bytes, mimetype: str, version, start, end) -> None:
+        cached = CachedResponse(body, mimetype, version, start, end, time.monotonic() + self.timeout)
+        with self._lock:
+            self._entries[key] = cached
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), max_size=self.max_size)
+
+responses = ResponseCache()
+
+def cached(app, get_store, date_range):
+    """Decorator serving a GET view from the response cache.
+
+    date_range(store) returns the (start, end) dates the view reads (None for
+    an open end); it may raise ValueError, in which case the view runs
+    uncached to report the error. Concurrent misses for the same key render
+    once. Only 200 responses are stored. Disabled when
+    app.config['RESPONSE_CACHE_ENABLED'] is false.
+    """
+    from functools import wraps
+    from flask import request
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not app.config.get('RESPONSE_CACHE_ENABLED', True):
+                return view(*args, **kwargs)
+            try:
+                store = get_store()
+                start, end = date_range(store)
+            except ValueError:
+                return view(*args, **kwargs)
+
+            key = (store.directory, request.path, tuple(sorted(request.args.items(multi=True))), start, end)
+            # Read the version before rendering: a concurrent write then makes the entry look older, never newer
+            version = store.version()
+            hit = responses.lookup(store, key, version)
+            if hit is not None:
+                response = app.response_class(hit.body, mimetype=hit.mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = shared_response(app, ('cached', key, version), lambda: view(*args, **kwargs))
+            if response.status_code == 200:
+                responses.store(key, response.get_data(), response.mimetype, version, start, end)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -1,62 +1,142 @@
 # backend/server.py - Corrected Version
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, g, jsonify, request, send_from_directory, has_request_context
 from flask_cors import CORS
-import json
+import functools
 import os
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta
 
+import analytics
+import assets
+import auth
+import compression
+import database
+import jsoncodec
+import metrics
+from config import DATA_FILE, DATA_DIR, HOST, PORT, DEBUG, PRELOAD_PREDICTOR
+from entry import Entry, EntryError
+import profiling
+import query
+import ratelimit
+import replication
+import response_cache
+from singleflight import shared_response
+
 # Initialize Flask app
 app = Flask(__name__)
+jsoncodec.init_app(app)
 CORS(app)
+metrics.init_app(app)
+profiling.init_app(app)
+ratelimit.init_app(app)
+compression.init_app(app)
+replication.init_app(app)
+auth.init_app(app)
 
 # Configuration
-DATA_FILE = 'data.json'
-PROTEIN_GOAL = 140
 FRONTEND_DIR = '../frontend'
 
 # Helper functions
-def load_entries():
-    """Load all entries from data file"""
-    try:
-        if not os.path.exists(DATA_FILE):
-            return []
-        
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            entries = data.get('entries', [])
-            
-            # Ensure each entry has an ID
-            for entry in entries:
-                if 'id' not in entry:
-                    entry['id'] = str(uuid.uuid4())
-            
-            return entries
-    except:
-        return []
+def current_user_id():
+    """User whose shard this request reads and writes, resolved from its API key by auth.py"""
+    if not has_request_context():
+        return database.DEFAULT_USER
+    return g.get('user_id', database.DEFAULT_USER)
+
+def current_store():
+    """Shard of the current user"""
+    return database.shards.get(current_user_id())
+
+ARCHIVED_HEADER = 'X-Archived-Excluded'
+
+def include_archived(default=False):
+    """Whether the request wants the entries of archived months (?archived=true|false)"""
+    if not has_request_context() or 'archived' not in request.args:
+        return default
+    return request.args['archived'].lower() == 'true'
+
+def load_entries(archived=False):
+    """Load all entries of the current user (archived months only when asked for)"""
+    return current_store().load(archived=include_archived(archived))
 
 def save_entries(entries):
-    """Save entries to data file"""
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump({"entries": entries}, f, ensure_ascii=False, indent=4)
+    """Replace all entries of the current user"""
+    current_store().save(entries)
+
+_predictor = None
+_predictor_lock = threading.Lock()
+
+def get_predictor():
+    """Import and warm the predictor once, on first use (raises ImportError when it is missing)"""
+    global _predictor
+    if _predictor is None:
+        with _predictor_lock:
+            if _predictor is None:
+                from ai_predictor import predictor
+                predictor.get_automaton()
+                _predictor = predictor
+    return _predictor
+
+def run_predictor(method, *args):
+    """Call a predictor method, on app.config['PREDICTOR_EXECUTOR'] when one is set
+    (the asyncio server installs a process pool there to keep CPU work off the GIL)"""
+    executor = app.config.get('PREDICTOR_EXECUTOR')
+    if executor is None:
+        return getattr(get_predictor(), method)(*args)
+    from ai_predictor import call_predictor
+    return executor.submit(call_predictor, method, *args).result()
+
+def today_range(days=1):
+    """(first, last) date of the last `days` days, for the response cache"""
+    today = datetime.now()
+    return (today - timedelta(days=days - 1)).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')
+
+def analytics_range(default_days=analytics.DEFAULT_TREND_DAYS, window=None):
+    """Date range an analytics view reads, as strings for the response cache"""
+    def date_range(store):
+        start, end = analytics.parse_range(request.args, store, default_days=default_days)
+        if window:
+            start, end = window(start, end)
+        return start.isoformat(), end.isoformat()
+    return date_range
+
+def cached(date_range):
+    """Serve a view from the response cache, revalidated against writes to date_range(store)"""
+    return response_cache.cached(app, current_store, date_range)
+
+def coalesced(view):
+    """Let identical concurrent requests of the same data version share one response"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        store = current_store()
+        key = (store.directory, request.path, tuple(sorted(request.args.items(multi=True))), store.version())
+        return shared_response(app, key, lambda: view(*args, **kwargs))
+    return wrapper
+
+def get_protein_goal():
+    """Protein goal of the current user"""
+    return current_store().get_settings()['protein_goal']
 
 def get_entries_by_date(date_str):
-    """Get entries for a specific date"""
-    return [e for e in load_entries() if e.get('date') == date_str]
+    """Get entries for a specific date (archived or not: the date was asked for)"""
+    return current_store().load_range(date_str, date_str, archived=True)
 
 def get_summary_today():
     """Get today's summary"""
     today = datetime.now().strftime('%Y-%m-%d')  # Use current date
-    meals = get_entries_by_date(today)
+    totals = current_store().daily_totals(today, today).get(today, {})
     
-    total_calories = sum(m.get('calories', 0) for m in meals)
-    total_protein = sum(m.get('protein', 0) for m in meals)
-    met_goal = total_protein >= PROTEIN_GOAL
+    total_calories = totals.get('calories', 0)
+    total_protein = totals.get('protein', 0)
+    protein_goal = get_protein_goal()
+    met_goal = total_protein >= protein_goal
     
     return {
         "total_calories": total_calories,
         "total_protein": total_protein,
-        "protein_goal": PROTEIN_GOAL,
+        "protein_goal": protein_goal,
         "met_protein_goal": met_goal,
         "date": today
     }
@@ -64,84 +144,54 @@ def get_summary_today():
 def get_weekly_summary():
     """Get weekly summary (last 7 days)"""
     today = datetime.now()  # Use current date
-    entries = load_entries()
+    # Only the segments covering the last 7 days are opened, and only their columns scanned
+    totals = current_store().daily_totals(
+        (today - timedelta(days=6)).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d'))
+    protein_goal = get_protein_goal()
     
     summary = []
     for i in range(7):
         day = (today - timedelta(days=i)).strftime('%Y-%m-%d')
-        day_entries = [e for e in entries if e.get('date') == day]
+        day_totals = totals.get(day, {})
         
-        total_cal = sum(e.get('calories', 0) for e in day_entries)
-        total_prot = sum(e.get('protein', 0) for e in day_entries)
-        met_goal = total_prot >= PROTEIN_GOAL
+        total_cal = day_totals.get('calories', 0)
+        total_prot = day_totals.get('protein', 0)
+        met_goal = total_prot >= protein_goal
         
         summary.append({
             "date": day,
             "calories": total_cal,
             "protein": total_prot,
             "met_goal": met_goal,
-            "meal_count": len(day_entries)
+            "meal_count": day_totals.get('count', 0)
         })
     
     return list(reversed(summary))
 
-def validate_entry(data):
-    """Validate meal entry data"""
-    errors = []
-    
-    required_fields = ['food', 'calories', 'protein', 'category', 'date']
-    for field in required_fields:
-        if field not in data:
-            errors.append(f'Missing field: {field}')
-        elif isinstance(data[field], str) and not data[field].strip():
-            errors.append(f'Empty field: {field}')
-    
-    # Validate numeric values
-    if 'calories' in data:
-        try:
-            calories = int(data['calories'])
-            if calories < 0 or calories > 10000:
-                errors.append('Calories must be between 0 and 10000')
-        except (ValueError, TypeError):
-            errors.append('Calories must be a valid number')
-    
-    if 'protein' in data:
-        try:
-            protein = int(data['protein'])
-            if protein < 0 or protein > 500:
-                errors.append('Protein must be between 0 and 500g')
-        except (ValueError, TypeError):
-            errors.append('Protein must be a valid number')
-    
-    # Validate date format (allow any valid date)
-    if 'date' in data:
-        try:
-            datetime.strptime(data['date'], '%Y-%m-%d')
-        except ValueError:
-            errors.append('Invalid date format (use YYYY-MM-DD)')
-    
-    # Validate category
-    valid_categories = ['Breakfast', 'Lunch', 'Dinner', 'Snack']
-    if 'category' in data and data['category'] not in valid_categories:
-        errors.append(f'Category must be one of: {", ".join(valid_categories)}')
-    
-    return errors
-
 # ====================
 # API Routes
 # ====================
 
 @app.route('/api/entries', methods=['GET'])
+@coalesced
 def get_entries():
     """Get all entries or filter by date"""
     try:
         date = request.args.get('date')
-        entries = load_entries()
         
+        excluded = []
         if date:
-            entries = [e for e in entries if e.get('date') == date]
+            entries = get_entries_by_date(date)
+        else:
+            entries = load_entries()
+            if not include_archived():
+                excluded = current_store().archived_months()
         
-        return jsonify(entries)  # Return array directly
+        response = jsonify(entries)  # Return array directly
+        if excluded:
+            # Months left out of the list; ?archived=true includes them
+            response.headers[ARCHIVED_HEADER] = ','.join(excluded)
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -154,28 +204,21 @@ def add_entry():
         if not data:
             return jsonify({"error": "No data provided"}), 400
         
-        # Validate data
-        validation_errors = validate_entry(data)
-        if validation_errors:
+        # Validate and normalize data, with a new unique ID
+        try:
+            entry = Entry.parse(data, entry_id=str(uuid.uuid4()))
+        except EntryError as e:
             return jsonify({
                 "error": "Validation failed",
-                "details": validation_errors
+                "details": e.errors
             }), 400
         
-        # Add unique ID
-        entry_id = str(uuid.uuid4())
-        data['id'] = entry_id
-        
-        # Load existing entries
-        entries = load_entries()
-        entries.append(data)
-        
-        # Save entries
-        save_entries(entries)
+        # Append to the current user's shard
+        current_store().add(entry)
         
         return jsonify({
             "message": "Entry added successfully",
-            "id": entry_id
+            "id": entry.id
         }), 201
             
     except Exception as e:
@@ -190,28 +233,16 @@ def update_entry(entry_id):
         if not data:
             return jsonify({"error": "No data provided"}), 400
         
-        # Validate data
-        validation_errors = validate_entry(data)
-        if validation_errors:
+        # Validate and normalize data, preserving the ID
+        try:
+            entry = Entry.parse(data, entry_id=entry_id)
+        except EntryError as e:
             return jsonify({
                 "error": "Validation failed",
-                "details": validation_errors
+                "details": e.errors
             }), 400
         
-        # Load existing entries
-        entries = load_entries()
-        
-        # Find entry by ID
-        entry_index = next((i for i, e in enumerate(entries) if e.get('id') == entry_id), -1)
-        
-        if entry_index >= 0:
-            # Preserve ID
-            data['id'] = entry_id
-            entries[entry_index] = data
-            
-            # Save entries
-            save_entries(entries)
-            
+        if current_store().update(entry_id, entry):
             return jsonify({
                 "message": "Entry updated successfully"
             })
@@ -227,15 +258,7 @@ def update_entry(entry_id):
 def delete_entry(entry_id):
     """Delete a meal entry"""
     try:
-        # Load existing entries
-        entries = load_entries()
-        
-        # Filter out the entry with matching ID
-        filtered_entries = [e for e in entries if e.get('id') != entry_id]
-        
-        if len(filtered_entries) < len(entries):
-            # Save filtered entries
-            save_entries(filtered_entries)
+        if current_store().delete(entry_id):
             return jsonify({
                 "message": "Entry deleted successfully"
             })
@@ -247,7 +270,37 @@ def delete_entry(entry_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/goals', methods=['GET'])
+def get_goals():
+    """Get the current user's goals"""
+    try:
+        return jsonify(current_store().get_settings())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/goals', methods=['PUT'])
+def update_goals():
+    """Update the current user's goals"""
+    try:
+        data = request.get_json()
+        
+        if not data or 'protein_goal' not in data:
+            return jsonify({"error": "protein_goal is required"}), 400
+        
+        try:
+            protein_goal = int(data['protein_goal'])
+        except (ValueError, TypeError):
+            return jsonify({"error": "Protein goal must be a valid number"}), 400
+        
+        if protein_goal < 0 or protein_goal > 500:
+            return jsonify({"error": "Protein goal must be between 0 and 500g"}), 400
+        
+        return jsonify(current_store().update_settings(protein_goal=protein_goal))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/summary/today', methods=['GET'])
+@cached(lambda store: today_range())
 def summary_today():
     """Get today's summary"""
     try:
@@ -257,6 +310,7 @@ def summary_today():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/summary/week', methods=['GET'])
+@cached(lambda store: today_range(7))
 def summary_week():
     """Get weekly summary"""
     try:
@@ -266,16 +320,11 @@ def summary_week():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/analytics/common-foods', methods=['GET'])
+@cached(lambda store: (None, None))
 def common_foods():
     """Get most commonly logged foods"""
     try:
-        entries = load_entries()
-        
-        food_counts = {}
-        for entry in entries:
-            food_name = entry.get('food', '').lower().strip()
-            if food_name:
-                food_counts[food_name] = food_counts.get(food_name, 0) + 1
+        food_counts = current_store().food_counts()
         
         # Sort by frequency
         sorted_foods = sorted(food_counts.items(), key=lambda x: x[1], reverse=True)
@@ -286,16 +335,81 @@ def common_foods():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/analytics/trends', methods=['GET'])
+@cached(analytics_range(window=analytics.trends_window))
+def analytics_trends():
+    """Daily totals with 7- and 30-day rolling averages (?start=&end=, default last 90 days)"""
+    try:
+        store = current_store()
+        start, end = analytics.parse_range(request.args, store)
+        return jsonify(analytics.trends(store, start, end))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/analytics/streaks', methods=['GET'])
+@cached(analytics_range(default_days=None))
+def analytics_streaks():
+    """Protein goal streaks (?start=&end=, default whole history)"""
+    try:
+        store = current_store()
+        start, end = analytics.parse_range(request.args, store, default_days=None)
+        return jsonify(analytics.streaks(store, start, end, get_protein_goal()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/analytics/weekdays', methods=['GET'])
+@cached(analytics_range())
+def analytics_weekdays():
+    """Average intake per weekday and weekday vs weekend"""
+    try:
+        store = current_store()
+        start, end = analytics.parse_range(request.args, store)
+        return jsonify(analytics.weekday_breakdown(store, start, end))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/analytics/categories', methods=['GET'])
+@cached(analytics_range())
+def analytics_categories():
+    """Calorie share per meal category"""
+    try:
+        store = current_store()
+        start, end = analytics.parse_range(request.args, store)
+        return jsonify(analytics.category_share(store, start, end))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/query', methods=['GET'])
+def run_query():
+    """Group entries by date/week/month/category/food and aggregate calories and protein"""
+    try:
+        q = query.Query.from_args(request.args)
+        return jsonify(query.run(current_store(), q))
+    except query.QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/export', methods=['GET'])
+@coalesced
 def export_data():
-    """Export all data as JSON"""
+    """Export all data as JSON (with archived months unless ?archived=false)"""
     try:
-        entries = load_entries()
+        entries = load_entries(archived=True)
         
         export_data = {
             "entries": entries,
             "export_date": datetime.now().isoformat(),
-            "total_entries": len(entries)
+            "total_entries": len(entries),
+            "archived_excluded": [] if include_archived(True) else current_store().archived_months()
         }
         
         return jsonify(export_data)
@@ -306,13 +420,18 @@ def export_data():
 def health_check():
     """Health check endpoint"""
     try:
-        entries = load_entries()
+        # Counts come from the manifest, no segment is opened; a user without a shard gets none
+        exists = database.shards.exists(current_user_id())
+        entries_count = current_store().count() if exists else 0
         
         health_data = {
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
             "ai_enabled": True,
-            "entries_count": len(entries)
+            "entries_count": entries_count,
+            "open_shards": database.shards.open_count(),
+            "startup": metrics.STARTUP,
+            "replication": replication.status(current_store() if exists else database.shards.get())
         }
         
         return jsonify(health_data)
@@ -323,6 +442,58 @@ def health_check():
             "timestamp": datetime.now().isoformat()
         }), 500
 
+@app.route('/api/replication/pull', methods=['POST'])
+def replication_pull():
+    """Log records (or full shard copies) a follower is missing; waits for new writes"""
+    try:
+        if not replication.authorized(request.headers.get(replication.TOKEN_HEADER)):
+            return jsonify({"error": "Replication is not enabled for this client"}), 403
+        body = request.get_json(silent=True) or {}
+        positions = body.get('positions') or {}
+        if not isinstance(positions, dict) or not all(
+                seq is None or (isinstance(seq, int) and not isinstance(seq, bool)) for seq in positions.values()):
+            return jsonify({"error": "positions must map user IDs to log positions"}), 400
+        replica = str(body.get('replica') or request.remote_addr)
+        wait = float(body.get('wait', 0))
+        return jsonify({"shards": replication.pull(database.shards, replica, positions, wait)})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose metrics in Prometheus text format"""
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/api/debug/profiles', methods=['GET'])
+def list_profiles():
+    """List saved slow-request profiles with their top functions"""
+    if not profiling.can_read_profiles(app, request.headers.get(profiling.TOKEN_HEADER)):
+        return jsonify({"error": f"Profiles need debug mode or the {profiling.TOKEN_HEADER} header"}), 403
+    try:
+        limit = int(request.args.get('limit', 10))
+        sort = request.args.get('sort', 'cumulative')
+        profiles = profiling.list_profiles(app.config['PROFILE_DIR'], limit, sort)
+        
+        return jsonify({
+            "enabled": app.config['PROFILE_ENABLED'],
+            "threshold_ms": app.config['PROFILE_THRESHOLD_MS'],
+            "profiles": profiles
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/debug/profiles/<string:profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """Download a raw .pstats file"""
+    if not profiling.can_read_profiles(app, request.headers.get(profiling.TOKEN_HEADER)):
+        return jsonify({"error": f"Profiles need debug mode or the {profiling.TOKEN_HEADER} header"}), 403
+    path = profiling.profile_path(app.config['PROFILE_DIR'], profile_id)
+    if not path:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_from_directory(os.path.dirname(path), os.path.basename(path), as_attachment=True)
+
 # ====================
 # AI Routes
 # ====================
@@ -335,22 +506,44 @@ def ai_predict():
             data = request.get_json()
         else:  # GET request
             food = request.args.get('food', '')
-            data = {'food': food}
+            data = {'food': food, 'mode': request.args.get('mode', 'single')}
         
         food_description = data.get('food', '').strip()
         
         if not food_description:
             return jsonify({"error": "Food description is required"}), 400
         
-        # Try to import AI predictor
+        # Try to load the AI predictor
         try:
-            from ai_predictor import predictor
+            get_predictor()
+            
+            # Meal mode: split "200g chicken with rice and broccoli" into components
+            if data.get('mode') == 'meal':
+                stage_start = time.perf_counter()
+                meal = run_predictor('decompose_meal', food_description, data.get('category'))
+                metrics.observe_stage("decompose_meal", time.perf_counter() - stage_start)
+                prediction = dict(meal['totals'])
+                prediction.update({
+                    "food_name": meal['food_name'],
+                    "original_name": meal['original_name'],
+                    "confidence": meal['confidence'],
+                    "source": meal['source']
+                })
+                
+                return jsonify({
+                    "prediction": prediction,
+                    "components": meal['components'],
+                    "similar_foods": [],
+                    "success": True
+                })
             
             # Get prediction
-            prediction = predictor.predict_nutrients(food_description)
+            prediction = run_predictor('predict_nutrients_cached', food_description)
             
             # Get similar foods for suggestions
-            similar_foods = predictor.get_similar_foods(food_description)
+            stage_start = time.perf_counter()
+            similar_foods = run_predictor('get_similar_foods', food_description)
+            metrics.observe_stage("similar_foods", time.perf_counter() - stage_start)
             
             return jsonify({
                 "prediction": prediction,
@@ -387,7 +580,7 @@ def ai_predict():
 def ai_status():
     """Check if AI is enabled"""
     try:
-        from ai_predictor import predictor
+        predictor = get_predictor()
         return jsonify({
             "enabled": True,
             "foods_in_database": len(predictor.FOOD_DATABASE)
@@ -402,21 +595,28 @@ def ai_status():
 # Serve Frontend
 # ====================
 
+# Files are read, hashed and compressed once; see assets.py
+static_assets = assets.AssetTable(os.path.join(app.root_path, FRONTEND_DIR))
+
 @app.route('/')
 def index():
     """Serve main frontend page"""
     try:
-        return send_from_directory(FRONTEND_DIR, 'index.html')
+        response = assets.serve(app, static_assets, 'index.html')
+        if response is None:
+            return "Error loading frontend: index.html not found", 500
+        return response
     except Exception as e:
         return f"Error loading frontend: {str(e)}", 500
 
 @app.route('/<path:path>')
 def static_proxy(path):
-    """Serve static files"""
+    """Serve static files (plain or content-hashed names)"""
     try:
-        return send_from_directory(FRONTEND_DIR, path)
-    except:
-        return "File not found", 404
+        response = assets.serve(app, static_assets, path)
+    except Exception:
+        response = None
+    return response if response is not None else ("File not found", 404)
 
 # ====================
 # Error Handlers
@@ -441,38 +641,49 @@ def internal_error(error):
 # Startup
 # ====================
 
+if PRELOAD_PREDICTOR:
+    try:
+        get_predictor()
+    except ImportError:
+        pass
+metrics.mark_ready()
+
 if __name__ == '__main__':
-    # Ensure data file exists
-    if not os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump({"entries": []}, f, ensure_ascii=False, indent=4)
-    
     print("=" * 60)
     print("NutriTrack AI - Calorie & Protein Tracker")
     print("=" * 60)
     print(f"Frontend directory: {FRONTEND_DIR}")
     print(f"Data file: {DATA_FILE}")
+    print(f"User shards: {DATA_DIR}")
     
     # Check AI availability
     try:
-        from ai_predictor import predictor
+        predictor = get_predictor()
         print(f"✅ AI features: Enabled ({len(predictor.FOOD_DATABASE)} foods in database)")
     except ImportError:
         print("⚠️  AI features: Disabled (ai_predictor.py not found)")
     
-    print(f"🌐 Server: http://localhost:5000")
-    print(f"📊 Protein goal: {PROTEIN_GOAL}g")
+    print(f"🌐 Server: http://{HOST}:{PORT}")
+    print(f"📊 Protein goal: {database.shards.get().get_settings()['protein_goal']}g")
     print("=" * 60)
     print("Available API endpoints:")
     print("  /api/health          - Health check")
     print("  /api/entries         - Manage meal entries")
+    print("  /api/goals           - Per-user goals")
     print("  /api/summary/today   - Today's summary")
     print("  /api/summary/week    - Weekly summary")
+    print("  /api/analytics/*     - Trends, streaks, weekdays, categories")
+    print("  /api/query           - Group-by queries over entries")
     print("  /api/ai/predict      - AI nutrient prediction")
     print("  /api/export          - Export data")
+    print("  /api/metrics         - Prometheus metrics")
+    print("  /api/replication/pull - Log shipping to followers")
+    print("  /api/debug/profiles  - Slow request profiles")
     print("=" * 60)
     
     try:
-        app.run(debug=True, port=5000)
+        replication.start_follower()
+        # Development server; use prefork.py or async_server.py in production
+        app.run(host=HOST, port=PORT, debug=DEBUG)
     except Exception as e:
         print(f"Failed to start server: {e}")
\ No newline at end of file
@@ -0,0 +1,73 @@
+# backend/singleflight.py
+"""Coalescing of identical concurrent requests (single flight).
+
+When several clients poll the same endpoint at the same moment, the first
+request for a key computes the response and the others wait for it and
+reuse its body, instead of each loading and serializing the same entries.
+Keys include the shard's data version, so a request that starts after a
+write never receives a result computed before it. Coalescing is per
+process; pre-forked workers each run their own flights.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import metrics
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its outcome"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """fn() or the result of the identical call already running; returns (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            metrics.SINGLEFLIGHT.inc('shared')
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        metrics.SINGLEFLIGHT.inc('leader')
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+flights = SingleFlight()
+
+def shared_response(app, key: Hashable, render: Callable[[], Any]):
+    """Response of render() (any Flask view return value), computed once per key
+    across concurrent callers; each caller gets its own Response object because
+    after_request hooks modify it"""
+    def run():
+        response = app.make_response(render())
+        return response.get_data(), response.status_code, list(response.headers.items())
+
+    (body, status, headers), _ = flights.do(key, run)
+    return app.response_class(body, status=status, headers=headers)
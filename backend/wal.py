@@ -0,0 +1,228 @@
+# backend/wal.py
+"""Append-only mutation log of a shard, and group commit of appends.
+
+Writes to a shard are appended to <shard>/log.jsonl, one JSON record per
+line, instead of rewriting segment files. The segment files and manifest are
+a snapshot; the log is replayed on top of it when the shard is opened, and a
+new snapshot drops the records it covers.
+
+How far an append is pushed to disk before a write is acknowledged depends on
+the durability mode:
+
+    fsync   every write is fsynced on its own
+    group   a write arriving while another append is being synced waits for
+            it, and then goes out with every other write that queued up
+            meanwhile (up to GROUP_COMMIT_MAX) in one append and one fsync;
+            each write is acknowledged once its batch is durable
+    none    appended without fsync, the OS writes it back eventually
+"""
+import os
+import threading
+import time
+
+import jsoncodec
+import metrics
+
+DURABILITY_MODES = ('fsync', 'group', 'none')
+
+def fsync_directory(path):
+    """Make a create, rename or unlink in directory durable"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:  # platforms where directories cannot be opened
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _parse_records(data):
+    """Complete records at the start of data, and the length they take up"""
+    records = []
+    pos = 0
+    while True:
+        end = data.find(b'\n', pos)
+        if end < 0:
+            break
+        try:
+            records.append(jsoncodec.loads(data[pos:end]))
+        except ValueError:
+            break
+        pos = end + 1
+    return records, pos
+
+class MutationLog:
+    """JSON-lines log file; offset is the end of the last complete record read or written"""
+
+    def __init__(self, path, sync=True):
+        self.path = path
+        self.sync = sync
+        self.offset = 0
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def read_new(self):
+        """Complete records past offset (appended by other processes, or all of them
+        after a reopen). A torn last line from a crash is left for append() to cut off."""
+        if self.size() <= self.offset:
+            return []
+        start = time.perf_counter()
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        records, pos = _parse_records(data)
+        self.offset += pos
+        metrics.observe_storage('replay', time.perf_counter() - start, pos)
+        return records
+
+    def read_all(self):
+        """Every record up to offset, leaving offset alone (for shipping the log to followers)"""
+        if not self.offset:
+            return []
+        with open(self.path, 'rb') as f:
+            data = f.read(self.offset)
+        return _parse_records(data)[0]
+
+    def append(self, records):
+        """Write records with one write() and, when syncing, one fsync()"""
+        data = b''.join(jsoncodec.dumps(record) + b'\n' for record in records)
+        start = time.perf_counter()
+        created = not os.path.exists(self.path)
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size > self.offset:
+                # Garbage past the last complete record: a torn write left by a crash
+                os.ftruncate(fd, self.offset)
+            os.lseek(fd, self.offset, os.SEEK_SET)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                if self.sync:
+                    synced = time.perf_counter()
+                    os.fsync(fd)
+                    metrics.observe_storage('fsync', time.perf_counter() - synced, 0)
+            except BaseException:
+                # Leave no partial batch behind for a later replay to pick up
+                os.ftruncate(fd, self.offset)
+                raise
+        finally:
+            os.close(fd)
+        if created and self.sync:
+            fsync_directory(os.path.dirname(self.path) or '.')
+        self.offset += len(data)
+        metrics.observe_storage('append', time.perf_counter() - start, len(data))
+
+    def drop_before(self, offset):
+        """Drop the records before offset, now part of a snapshot, keeping any appended after it"""
+        if offset <= 0:
+            return
+        if offset >= self.offset:
+            self.reset()
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            tail = f.read(self.offset - offset)
+        directory = os.path.dirname(self.path) or '.'
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(tail)
+            if self.sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        if self.sync:
+            fsync_directory(directory)
+        self.offset = len(tail)
+
+    def reset(self):
+        """Empty the log once its records are part of a snapshot"""
+        try:
+            fd = os.open(self.path, os.O_WRONLY)
+        except FileNotFoundError:
+            self.offset = 0
+            return
+        try:
+            os.ftruncate(fd, 0)
+            if self.sync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.offset = 0
+
+class _Waiter:
+    __slots__ = ('mutation', 'result', 'error', 'done')
+
+    def __init__(self, mutation):
+        self.mutation = mutation
+        self.result = None
+        self.error = None
+        self.done = False
+
+class GroupCommitter:
+    """Batches mutations submitted by concurrent threads.
+
+    A thread arriving while no commit is in flight leads a batch and hands
+    everything queued (up to max_batch mutations) to commit(mutations) ->
+    results at once, so a lone writer never waits. Threads arriving during a
+    commit queue up, and one of them leads the next batch when it returns.
+    With window > 0 a leader that finds other writes queued waits up to window
+    seconds for more to join. Every submitter returns only after the commit of
+    its batch returned.
+    """
+
+    def __init__(self, commit, window, max_batch):
+        self.commit = commit
+        self.window = window
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._queue = []
+        self._leading = False
+
+    def submit(self, mutation):
+        waiter = _Waiter(mutation)
+        with self._cond:
+            self._queue.append(waiter)
+            if len(self._queue) >= self.max_batch:
+                self._cond.notify_all()
+            while not waiter.done:
+                if self._leading:
+                    self._cond.wait()
+                    continue
+                self._leading = True
+                if self.window > 0 and len(self._queue) > 1:
+                    deadline = time.monotonic() + self.window
+                    while len(self._queue) < self.max_batch:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+                self._cond.release()
+                try:
+                    self._run(batch)
+                finally:
+                    self._cond.acquire()
+                    self._leading = False
+                    self._cond.notify_all()
+        if waiter.error is not None:
+            raise waiter.error
+        return waiter.result
+
+    def _run(self, batch):
+        metrics.COMMIT_BATCH.observe(len(batch))
+        try:
+            results = self.commit([waiter.mutation for waiter in batch])
+            for waiter, result in zip(batch, results):
+                waiter.result = result
+        except BaseException as e:
+            for waiter in batch:
+                waiter.error = e
+        for waiter in batch:
+            waiter.done = True
@@ -0,0 +1,368 @@
+# benchmark.py
+"""Offline benchmark suite for NutriTrack storage, API routes and the AI predictor.
+
+Runs entirely in-process through Flask's test client against a synthetic
+history, so no server needs to be running.
+
+    python benchmark.py                          # 10k, 100k and 1M entries
+    python benchmark.py --sizes 10000 --output bench.json
+    python benchmark.py --sizes 10000 --compare bench.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+import database  # noqa: E402
+import jsoncodec  # noqa: E402
+import jsonstream  # noqa: E402
+import server  # noqa: E402
+import wal  # noqa: E402
+from ai_predictor import predictor  # noqa: E402
+from entry import Entry  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+CATEGORY_WEIGHTS = {"Breakfast": 0.25, "Lunch": 0.3, "Dinner": 0.3, "Snack": 0.15}
+
+FREE_TEXT_FOODS = [
+    "sườn rim mặn", "grandma's lasagna", "protein bar", "leftover curry",
+    "chicken wing 100g", "green smoothie", "canh chua", "bánh cuốn"
+]
+
+PREDICT_DESCRIPTIONS = [
+    "200g chicken breast",
+    "grilled salmon 150g",
+    "1 cup rice",
+    "2 slices bread",
+    "large bowl pho bo",
+    "fried chicken",
+    "3 lạng thịt bò",
+    "200g chicken breast with rice and broccoli",
+    "chicken 200g, rice 150g, 2 eggs",
+    "mystery stew"
+]
+
+# ====================
+# Synthetic data
+# ====================
+
+def generate_entries(count, seed=42, entries_per_day=4, max_days=3650):
+    """Generate a realistic meal history ending today (at most max_days long)"""
+    rng = random.Random(seed)
+    foods = list(predictor.FOOD_DATABASE.keys()) + FREE_TEXT_FOODS
+    categories = list(CATEGORY_WEIGHTS)
+    weights = list(CATEGORY_WEIGHTS.values())
+
+    days = max(1, min(count // entries_per_day, max_days))
+    today = date.today()
+
+    entries = []
+    for i in range(count):
+        day = today - timedelta(days=days - 1 - (i * days // count))
+        calories = max(10, int(rng.gauss(450, 180)))
+        entries.append({
+            "food": rng.choice(foods),
+            "calories": min(calories, 3000),
+            "protein": max(0, int(calories * rng.uniform(0.02, 0.12))),
+            "category": rng.choices(categories, weights)[0],
+            "date": day.strftime('%Y-%m-%d'),
+            "id": str(uuid.UUID(int=rng.getrandbits(128)))
+        })
+    return entries
+
+# ====================
+# Timing helpers
+# ====================
+
+def time_call(func, repeat):
+    """Run func repeat times and return timing statistics in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.mean(samples), 3),
+        "max_ms": round(max(samples), 3)
+    }
+
+def repeats_for(size, repeat):
+    """Scale the repeat count down for large histories so a run stays bounded"""
+    if not size or size <= 10_000:
+        return repeat
+    return max(1, repeat // (size // 10_000))
+
+def record(results, group, name, size, func, repeat):
+    stats = time_call(func, repeat)
+    stats.update({"group": group, "name": name, "size": size})
+    results.append(stats)
+    print(f"  {group:10} {name:40} {str(size or '-'):>9}  median {stats['median_ms']:>10.3f} ms")
+    return stats
+
+def expect_status(response, status):
+    if response.status_code != status:
+        raise RuntimeError(f"Unexpected status {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+# ====================
+# Benchmarks
+# ====================
+
+def bench_storage(results, entries, repeat):
+    size = len(entries)
+    store = database.shards.get()
+
+    def cold_load():
+        store.invalidate()
+        return store.load()
+
+    record(results, "storage", "save_entries", size, lambda: server.save_entries(entries), repeat)
+    record(results, "storage", "load_entries", size, cold_load, repeat)
+    record(results, "storage", "load_entries (warm)", size, server.load_entries, repeat)
+
+    today = date.today()
+    week_ago = (today - timedelta(days=6)).strftime('%Y-%m-%d')
+
+    def cold_week():
+        store.invalidate()
+        return store.load_range(week_ago, today.strftime('%Y-%m-%d'))
+
+    record(results, "storage", "load_range (last 7 days)", size, cold_week, repeat)
+    # Column scans over the warm shard, no dicts are built
+    store.load()
+    record(results, "storage", "daily_totals (all days)", size, lambda: store.daily_totals(None, None), repeat)
+    record(results, "storage", "food_counts", size, store.food_counts, repeat)
+
+def bench_routes(results, entries, repeat):
+    size = len(entries)
+    server.app.config['RATE_LIMIT_ENABLED'] = False
+    client = server.app.test_client()
+    today = date.today().strftime('%Y-%m-%d')
+    sample_date = entries[len(entries) // 2]["date"] if entries else today
+    year_ago = (date.today() - timedelta(days=364)).strftime('%Y-%m-%d')
+
+    read_routes = [
+        ("GET /api/entries", "/api/entries"),
+        ("GET /api/entries?date", f"/api/entries?date={sample_date}"),
+        ("GET /api/summary/today", "/api/summary/today"),
+        ("GET /api/summary/week", "/api/summary/week"),
+        ("GET /api/goals", "/api/goals"),
+        ("GET /api/analytics/common-foods", "/api/analytics/common-foods"),
+        ("GET /api/analytics/trends (1y)", f"/api/analytics/trends?start={year_ago}"),
+        ("GET /api/analytics/streaks", "/api/analytics/streaks"),
+        ("GET /api/analytics/weekdays", "/api/analytics/weekdays"),
+        ("GET /api/analytics/categories (all)", "/api/analytics/categories?start=2000-01-01"),
+        ("GET /api/query (month)", "/api/query?group_by=month&aggregates=sum,avg,min,max,count"),
+        ("GET /api/query (food, 1y)", f"/api/query?group_by=food&start={year_ago}&order=-count&limit=10"),
+        ("GET /api/export", "/api/export"),
+        ("GET /api/health", "/api/health"),
+        ("GET /api/ai/status", "/api/ai/status"),
+        ("GET /api/ai/predict", "/api/ai/predict?food=200g+chicken+breast"),
+        ("GET /", "/"),
+        ("GET /script.js", "/script.js"),
+    ]
+    # Uncached: every request computes its response
+    server.app.config['RESPONSE_CACHE_ENABLED'] = False
+    for name, url in read_routes:
+        record(results, "routes", name, size, lambda url=url: expect_status(client.get(url), 200), repeat)
+    server.app.config['RESPONSE_CACHE_ENABLED'] = True
+
+    cached_routes = [
+        ("GET /api/summary/week (cached)", "/api/summary/week"),
+        ("GET /api/analytics/common-foods (cached)", "/api/analytics/common-foods"),
+        ("GET /api/analytics/trends (1y, cached)", f"/api/analytics/trends?start={year_ago}"),
+        ("GET /api/goals (cached)", "/api/goals"),
+    ]
+    for name, url in cached_routes:
+        record(results, "routes", name, size, lambda url=url: expect_status(client.get(url), 200), repeat)
+
+    # Negotiated compression of the large JSON payloads
+    for name, url in (("GET /api/entries (gzip)", "/api/entries"), ("GET /api/export (gzip)", "/api/export")):
+        record(results, "routes", name, size, lambda url=url: expect_status(
+            client.get(url, headers={'Accept-Encoding': 'gzip'}), 200), repeat)
+
+    # Fingerprinted asset as the page references it, precompressed
+    hashed_js, _ = server.static_assets.lookup('script.js')
+    record(results, "routes", "GET /script.<hash>.js (gzip)", size, lambda: expect_status(
+        client.get('/' + hashed_js.hashed_path, headers={'Accept-Encoding': 'gzip'}), 200), repeat)
+
+    meal = {"food": "Benchmark Meal", "calories": 420, "protein": 30, "category": "Lunch", "date": today}
+    created = []
+
+    def post():
+        response = expect_status(client.post('/api/entries', json=meal), 201)
+        created.append(response.get_json()["id"])
+
+    def put():
+        expect_status(client.put(f'/api/entries/{created[-1]}', json=dict(meal, calories=450)), 200)
+
+    def delete():
+        expect_status(client.delete(f'/api/entries/{created.pop()}'), 200)
+
+    writes = repeats_for(size, repeat)
+    record(results, "routes", "POST /api/entries", size, post, writes)
+    # PUT rewrites the same entry; DELETE then removes everything POST added
+    record(results, "routes", "PUT /api/entries/<id>", size, put, writes)
+    record(results, "routes", "DELETE /api/entries/<id>", size, delete, writes)
+
+    record(results, "routes", "POST /api/ai/predict", size,
+           lambda: expect_status(client.post('/api/ai/predict', json={"food": "grilled salmon 150g"}), 200), repeat)
+    record(results, "routes", "POST /api/ai/predict (meal)", size,
+           lambda: expect_status(client.post('/api/ai/predict', json={
+               "food": "200g chicken breast with rice and broccoli", "mode": "meal"}), 200), repeat)
+
+def bench_codecs(results, entries, repeat):
+    """Every available JSON codec on the whole history as one document"""
+    size = len(entries)
+    document = {"entries": entries}
+    for name, codec in jsoncodec.CODECS.items():
+        raw = codec.dumps(document)
+        record(results, "codec", f"{name} dumps", size, lambda codec=codec: codec.dumps(document), repeat)
+        record(results, "codec", f"{name} dumps (pretty)", size,
+               lambda codec=codec: codec.dumps(document, pretty=True), repeat)
+        record(results, "codec", f"{name} loads", size, lambda codec=codec, raw=raw: codec.loads(raw), repeat)
+
+    # Streaming read of the same document from disk, one entry at a time
+    with tempfile.NamedTemporaryFile('wb', suffix='.json', delete=False) as f:
+        f.write(jsoncodec.CODECS['json'].dumps(document))
+    try:
+        record(results, "codec", "jsonstream iter_entries", size,
+               lambda: sum(1 for _ in jsonstream.iter_entries(f.name)), repeat)
+    finally:
+        os.unlink(f.name)
+
+def bench_durability(results, repeat, shapes=((1, 100), (8, 25))):
+    """Serial and concurrent adds to a fresh shard in each durability mode"""
+    meal = {"food": "Benchmark Meal", "calories": 420, "protein": 30, "category": "Lunch",
+            "date": date.today().isoformat()}
+    for (threads, writes), mode in itertools.product(shapes, wal.DURABILITY_MODES):
+        workdir = tempfile.mkdtemp(prefix='nutritrack-durability-')
+        store = database.EntryStore(os.path.join(workdir, 'user'), durability=mode)
+
+        def add_concurrently():
+            def writer():
+                for _ in range(writes):
+                    store.add(Entry.parse(meal, entry_id=str(uuid.uuid4())))
+            workers = [threading.Thread(target=writer) for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        try:
+            record(results, "durability", f"{mode}: {threads} threads x {writes} adds", None, add_concurrently, repeat)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def bench_predictor(results, repeat):
+    names = [predictor.extract_food_name(d) for d in PREDICT_DESCRIPTIONS]
+
+    def over_all(func, items):
+        return lambda: [func(item) for item in items]
+
+    record(results, "predictor", "extract_weight", None, over_all(predictor.extract_weight, PREDICT_DESCRIPTIONS), repeat)
+    record(results, "predictor", "find_best_match", None, over_all(predictor.find_best_match, names), repeat)
+    record(results, "predictor", "predict_nutrients", None, over_all(predictor.predict_nutrients, PREDICT_DESCRIPTIONS), repeat)
+    record(results, "predictor", "get_similar_foods", None, over_all(predictor.get_similar_foods, PREDICT_DESCRIPTIONS), repeat)
+    record(results, "predictor", "decompose_meal", None, over_all(predictor.decompose_meal, PREDICT_DESCRIPTIONS), repeat)
+
+# ====================
+# Reporting
+# ====================
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline_path):
+    """Print median ratios against a previous run"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r["group"], r["name"], r["size"]): r for r in baseline["results"]}
+
+    print("\n" + "=" * 80)
+    print(f"Comparison against {baseline_path} (commit {baseline['meta'].get('commit')})")
+    print("=" * 80)
+    for r in results:
+        old = previous.get((r["group"], r["name"], r["size"]))
+        if not old or not old["median_ms"]:
+            continue
+        ratio = r["median_ms"] / old["median_ms"]
+        print(f"  {r['group']:10} {r['name']:40} {str(r['size'] or '-'):>9}  x{ratio:6.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="NutriTrack benchmark suite")
+    parser.add_argument('--sizes', default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma-separated history sizes (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=5, help="repetitions per measurement")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--compare', help="previous JSON results to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    workdir = tempfile.mkdtemp(prefix='nutritrack-bench-')
+    database.init_storage(data_file=os.path.join(workdir, 'data.json'), data_dir=os.path.join(workdir, 'users'))
+
+    results = []
+    try:
+        print("Predictor")
+        bench_predictor(results, args.repeat)
+        print("Durability")
+        bench_durability(results, args.repeat)
+
+        for size in sizes:
+            print(f"\nHistory of {size} entries")
+            entries = generate_entries(size, seed=args.seed)
+            bench_codecs(results, entries, repeats_for(size, args.repeat))
+            bench_storage(results, entries, repeats_for(size, args.repeat))
+            bench_routes(results, entries, repeats_for(size, args.repeat))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "repeat": args.repeat,
+            "seed": args.seed
+        },
+        "results": results
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    else:
+        print(json.dumps(report))
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+# loadtest.py
+"""Local load-testing harness for NutriTrack.
+
+Starts the backend in a separate process on a scratch data file, drives it
+with concurrent virtual users that imitate the frontend (the refreshAllData
+polling cycle plus adds, edits, deletes and AI predictions), and reports
+throughput, per-endpoint latency percentiles, error rates and lost updates.
+
+    python loadtest.py --concurrency 20 --duration 30
+    python prefork.py   # in backend/, then:
+    python loadtest.py --url http://localhost:5000 --data-dir backend/users
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from urllib.parse import urlsplit
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(ROOT_DIR, 'backend')
+
+# Mirrors refreshAllData() in frontend/script.js
+REFRESH_CYCLE = [
+    ("GET", "/api/summary/today", "/api/summary/today"),
+    ("GET", "/api/summary/week", "/api/summary/week"),
+    ("GET", "/api/entries?date={today}", "/api/entries?date"),
+    ("GET", "/api/entries", "/api/entries"),
+    ("GET", "/api/entries", "/api/entries"),
+    ("GET", "/api/analytics/common-foods", "/api/analytics/common-foods"),
+]
+
+# Relative weight of each user action
+ACTION_WEIGHTS = {
+    "refresh": 70,
+    "create": 10,
+    "update": 7,
+    "delete": 5,
+    "predict": 8,
+}
+
+PREDICT_FOODS = [
+    "200g chicken breast", "grilled salmon 150g", "1 cup rice", "large bowl pho bo",
+    "200g chicken breast with rice and broccoli", "2 slices bread"
+]
+
+SERVER_BOOTSTRAP = """
+import sys
+sys.path.insert(0, {backend!r})
+import server
+from werkzeug.serving import run_simple
+run_simple('127.0.0.1', {port}, server.app, threaded=True)
+"""
+
+# ====================
+# Server management
+# ====================
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def seed_data_file(path, count):
+    """Write a scratch data file, optionally pre-populated with synthetic history"""
+    entries = []
+    if count:
+        sys.path.insert(0, ROOT_DIR)
+        from benchmark import generate_entries
+        entries = generate_entries(count)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"entries": entries}, f, ensure_ascii=False)
+
+def start_server(data_file, data_dir, port):
+    code = SERVER_BOOTSTRAP.format(backend=BACKEND_DIR, port=port)
+    # Virtual users share one address, the limiter would throttle the whole run
+    env = dict(os.environ, DATA_FILE=data_file, DATA_DIR=data_dir, RATE_LIMIT_ENABLED='false')
+    process = subprocess.Popen([sys.executable, '-c', code], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request("GET", "/api/health")
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Server did not become healthy within 30 seconds")
+
+# ====================
+# Virtual users
+# ====================
+
+class Stats:
+    """Thread-safe latency and outcome recorder"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        # Ledger of acknowledged writes used for the consistency check
+        self.acked = {}
+        self.deleted = set()
+
+    def observe(self, endpoint, seconds, ok):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+class VirtualUser(threading.Thread):
+    def __init__(self, host, port, stats, stop_at, seed):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.stop_at = stop_at
+        self.rng = random.Random(seed)
+        self.own_ids = []
+        self.conn = None
+
+    def request(self, method, path, endpoint, body=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload else {}
+        start = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.conn = None
+            data, status = b'', 0
+        elapsed = time.perf_counter() - start
+        self.stats.observe(f"{method} {endpoint}", elapsed, 200 <= status < 300)
+        return status, data
+
+    def refresh(self):
+        today = date.today().isoformat()
+        for method, path, endpoint in REFRESH_CYCLE:
+            self.request(method, path.format(today=today), endpoint)
+
+    def meal(self):
+        calories = self.rng.randint(100, 900)
+        return {
+            "food": self.rng.choice(PREDICT_FOODS),
+            "calories": calories,
+            "protein": self.rng.randint(0, calories // 10),
+            "category": self.rng.choice(["Breakfast", "Lunch", "Dinner", "Snack"]),
+            "date": date.today().isoformat()
+        }
+
+    def create(self):
+        entry = self.meal()
+        status, data = self.request("POST", "/api/entries", "/api/entries", entry)
+        if status == 201:
+            entry_id = json.loads(data)["id"]
+            self.own_ids.append(entry_id)
+            with self.stats.lock:
+                self.stats.acked[entry_id] = entry
+
+    def update(self):
+        if not self.own_ids:
+            return self.create()
+        entry_id = self.rng.choice(self.own_ids)
+        entry = self.meal()
+        status, _ = self.request("PUT", f"/api/entries/{entry_id}", "/api/entries/<id>", entry)
+        if status == 200:
+            with self.stats.lock:
+                self.stats.acked[entry_id] = entry
+
+    def delete(self):
+        if not self.own_ids:
+            return self.create()
+        entry_id = self.own_ids.pop(self.rng.randrange(len(self.own_ids)))
+        status, _ = self.request("DELETE", f"/api/entries/{entry_id}", "/api/entries/<id>")
+        if status == 200:
+            with self.stats.lock:
+                self.stats.acked.pop(entry_id, None)
+                self.stats.deleted.add(entry_id)
+
+    def predict(self):
+        body = {"food": self.rng.choice(PREDICT_FOODS), "category": "Lunch"}
+        self.request("POST", "/api/ai/predict", "/api/ai/predict", body)
+
+    def run(self):
+        actions = list(ACTION_WEIGHTS)
+        weights = list(ACTION_WEIGHTS.values())
+        while time.time() < self.stop_at:
+            action = self.rng.choices(actions, weights)[0]
+            getattr(self, action)()
+            # The frontend refreshes everything after every write
+            if action in ("create", "update", "delete"):
+                self.refresh()
+
+# ====================
+# Reporting
+# ====================
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_samples))))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+def read_shard(data_dir, user='default'):
+    """All entries persisted in a user's shard: its segment files plus the mutation log on top"""
+    sys.path.insert(0, BACKEND_DIR)
+    from database import EntryStore
+    return {entry.get('id'): entry for entry in EntryStore(os.path.join(data_dir, user)).load(archived=True)}
+
+def check_consistency(data_dir, stats):
+    """Compare acknowledged writes against what actually reached the segment files"""
+    stored = read_shard(data_dir)
+
+    lost_creates = lost_updates = 0
+    for entry_id, expected in stats.acked.items():
+        actual = stored.get(entry_id)
+        if actual is None:
+            lost_creates += 1
+        elif any(actual.get(k) != v for k, v in expected.items()):
+            lost_updates += 1
+    resurrected = sum(1 for entry_id in stats.deleted if entry_id in stored)
+
+    return {
+        "acknowledged_live_entries": len(stats.acked),
+        "acknowledged_deletes": len(stats.deleted),
+        "lost_creates": lost_creates,
+        "lost_updates": lost_updates,
+        "resurrected_deletes": resurrected,
+        "lost_update_total": lost_creates + lost_updates + resurrected
+    }
+
+def build_report(stats, elapsed, args):
+    endpoints = {}
+    total_requests = total_errors = 0
+    for endpoint, samples in sorted(stats.latencies.items()):
+        samples.sort()
+        errors = stats.errors.get(endpoint, 0)
+        total_requests += len(samples)
+        total_errors += errors
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "error_rate": round(errors / len(samples), 4),
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 99) * 1000, 2),
+            "max_ms": round(samples[-1] * 1000, 2)
+        }
+    return {
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "seed_entries": args.seed_entries
+        },
+        "elapsed_s": round(elapsed, 2),
+        "total_requests": total_requests,
+        "throughput_rps": round(total_requests / elapsed, 2),
+        "error_rate": round(total_errors / total_requests, 4) if total_requests else 0.0,
+        "endpoints": endpoints
+    }
+
+def print_report(report):
+    print("\n" + "=" * 96)
+    print(f"Load test: {report['config']['concurrency']} users for {report['elapsed_s']}s "
+          f"- {report['total_requests']} requests, {report['throughput_rps']} req/s, "
+          f"error rate {report['error_rate']:.2%}")
+    print("=" * 96)
+    print(f"{'Endpoint':40} {'reqs':>7} {'req/s':>8} {'err%':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for endpoint, e in report["endpoints"].items():
+        print(f"{endpoint:40} {e['requests']:>7} {e['throughput_rps']:>8} {e['error_rate']:>6.1%} "
+              f"{e['p50_ms']:>7.1f}ms {e['p95_ms']:>7.1f}ms {e['p99_ms']:>7.1f}ms")
+    consistency = report.get("consistency")
+    if consistency:
+        print("-" * 96)
+        print(f"Consistency: {consistency['lost_creates']} lost creates, "
+              f"{consistency['lost_updates']} lost updates, "
+              f"{consistency['resurrected_deletes']} resurrected deletes "
+              f"(out of {consistency['acknowledged_live_entries']} live acknowledged entries)")
+
+def main():
+    parser = argparse.ArgumentParser(description="NutriTrack load generator")
+    parser.add_argument('--concurrency', type=int, default=10, help="number of virtual users")
+    parser.add_argument('--duration', type=float, default=20, help="test duration in seconds")
+    parser.add_argument('--seed-entries', type=int, default=1000,
+                        help="synthetic history size for the scratch data file")
+    parser.add_argument('--url', help="target an already running server instead of starting one")
+    parser.add_argument('--data-dir', help="DATA_DIR of the --url server, for the consistency check")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    workdir = None
+    process = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+        data_dir = args.data_dir
+    else:
+        workdir = tempfile.mkdtemp(prefix='nutritrack-load-')
+        data_file = os.path.join(workdir, 'data.json')
+        data_dir = os.path.join(workdir, 'users')
+        seed_data_file(data_file, args.seed_entries)
+        host, port = '127.0.0.1', free_port()
+        process = start_server(data_file, data_dir, port)
+
+    try:
+        stats = Stats()
+        start = time.time()
+        users = [VirtualUser(host, port, stats, start + args.duration, seed=i)
+                 for i in range(args.concurrency)]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.time() - start
+
+        report = build_report(stats, elapsed, args)
+        if data_dir:
+            report["consistency"] = check_consistency(data_dir, stats)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
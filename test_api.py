@@ -1,10 +1,13 @@
 # backend/test_api.py
 import requests
 import json
+from datetime import datetime
 
 BASE_URL = "http://localhost:5000/api"
+# The per-user tests need these users on the server:
+# API_KEYS=api-test-key=api-test,api-test-other-key=api-test-other,api-test-cache-key=api-test-cache
 
-def test_all_endpoints():
+def check_all_endpoints():
     tests = []
     
     # Test 1: Get all entries
@@ -36,6 +39,126 @@ def test_all_endpoints():
     except:
         tests.append(("GET /summary/today", False))
     
+    # Test 4: Meal decomposition
+    try:
+        response = requests.post(f"{BASE_URL}/ai/predict",
+                               json={"food": "200g chicken breast with rice and broccoli", "mode": "meal"})
+        tests.append(("POST /ai/predict (meal)", response.status_code == 200
+                      and len(response.json().get("components", [])) == 3))
+    except:
+        tests.append(("POST /ai/predict (meal)", False))
+    
+    # Test 5: Prometheus metrics
+    try:
+        response = requests.get(f"{BASE_URL}/metrics")
+        tests.append(("GET /metrics", response.status_code == 200
+                      and "nutritrack_http_requests_total" in response.text))
+    except:
+        tests.append(("GET /metrics", False))
+    
+    # Test 6: Per-user goals are isolated
+    try:
+        headers = {"X-API-Key": "api-test-key"}
+        requests.put(f"{BASE_URL}/goals", json={"protein_goal": 100}, headers=headers)
+        own = requests.get(f"{BASE_URL}/goals", headers=headers).json()
+        other = requests.get(f"{BASE_URL}/goals", headers={"X-API-Key": "api-test-other-key"}).json()
+        tests.append(("PUT /goals (per user)", own.get("protein_goal") == 100
+                      and other.get("protein_goal") != 100))
+    except:
+        tests.append(("PUT /goals (per user)", False))
+    
+    # Test 7: Numeric strings are stored as ints
+    try:
+        headers = {"X-API-Key": "api-test-key"}
+        today = datetime.now().strftime('%Y-%m-%d')
+        requests.post(f"{BASE_URL}/entries", headers=headers,
+                      json={"food": "Rice", "calories": "300", "protein": "6",
+                            "category": "Lunch", "date": today})
+        stored = requests.get(f"{BASE_URL}/entries", params={"date": today}, headers=headers).json()
+        tests.append(("POST /entries (normalized)", any(e.get("calories") == 300 for e in stored)))
+    except:
+        tests.append(("POST /entries (normalized)", False))
+    
+    # Test 8: Analytics
+    try:
+        response = requests.get(f"{BASE_URL}/analytics/trends", params={"start": today, "end": today})
+        tests.append(("GET /analytics/trends", response.status_code == 200
+                      and len(response.json().get("calories_avg_7", [])) == 1))
+    except:
+        tests.append(("GET /analytics/trends", False))
+    
+    # Test 9: Group-by query
+    try:
+        response = requests.get(f"{BASE_URL}/query", params={"group_by": "category", "aggregates": "sum,count"})
+        tests.append(("GET /query", response.status_code == 200
+                      and "calories_sum" in response.json().get("columns", [])))
+    except:
+        tests.append(("GET /query", False))
+
+    # Test 10: Rate limiting, when the server runs with RATE_LIMIT_ENABLED=true (own API key,
+    # so the other tests keep their budget)
+    try:
+        headers = {"X-API-Key": f"api-test-{datetime.now().timestamp()}"}
+        statuses = [requests.get(f"{BASE_URL}/query", headers=headers) for _ in range(100)]
+        limited = [r for r in statuses if r.status_code == 429]
+        tests.append(("429 with Retry-After", bool(limited)
+                      and int(limited[0].headers.get("Retry-After", 0)) >= 1))
+    except:
+        tests.append(("429 with Retry-After", False))
+
+    # Test 11: Cached summary reflects a new entry
+    try:
+        headers = {"X-API-Key": "api-test-cache-key"}
+        requests.put(f"{BASE_URL}/goals", json={"protein_goal": 140}, headers=headers)
+        before = requests.get(f"{BASE_URL}/summary/today", headers=headers).json()["total_calories"]
+        requests.get(f"{BASE_URL}/summary/today", headers=headers)
+        requests.post(f"{BASE_URL}/entries", headers=headers, json={
+            "food": "Cache Test", "calories": 123, "protein": 4,
+            "category": "Snack", "date": datetime.now().strftime('%Y-%m-%d')})
+        after = requests.get(f"{BASE_URL}/summary/today", headers=headers).json()["total_calories"]
+        tests.append(("GET /summary/today (cached)", after == before + 123))
+    except:
+        tests.append(("GET /summary/today (cached)", False))
+
+    # Test 12: Replication status, and pulls refused without the token
+    try:
+        health = requests.get(f"{BASE_URL}/health").json()
+        response = requests.post(f"{BASE_URL}/replication/pull", json={"positions": {}})
+        tests.append(("POST /replication/pull", response.status_code == 403
+                      and health["replication"]["role"] == "primary"))
+    except:
+        tests.append(("POST /replication/pull", False))
+
+    # Test 13: Export includes archived months by default
+    try:
+        plain = requests.get(f"{BASE_URL}/export").json()
+        response = requests.get(f"{BASE_URL}/export", params={"archived": "true"})
+        tests.append(("GET /export (archived)", response.status_code == 200
+                      and response.json()["total_entries"] == plain["total_entries"]
+                      and plain["archived_excluded"] == []))
+    except:
+        tests.append(("GET /export (archived)", False))
+
+    # Test 14: Unknown foods in a meal are estimated, not dropped
+    try:
+        response = requests.post(f"{BASE_URL}/ai/predict",
+                               json={"food": "chicken breast with toast and rice", "mode": "meal"})
+        components = response.json().get("components", [])
+        tests.append(("POST /ai/predict (unknown)", response.status_code == 200 and len(components) == 3
+                      and [c["confidence"] for c in components].count("low") == 1))
+    except:
+        tests.append(("POST /ai/predict (unknown)", False))
+
+    # Test 15: Users come from API keys, and reads create no storage
+    try:
+        unknown = requests.get(f"{BASE_URL}/entries", headers={"X-API-Key": "not-a-key"})
+        header = requests.get(f"{BASE_URL}/entries", headers={"X-User-Id": "api-test"})
+        default = requests.get(f"{BASE_URL}/entries")
+        tests.append(("GET /entries (API keys)", unknown.status_code == 401
+                      and header.json() == default.json()))
+    except:
+        tests.append(("GET /entries (API keys)", False))
+
     # Print results
     print("\n" + "="*40)
     print("API Test Results")
@@ -46,6 +169,36 @@ def test_all_endpoints():
     
     return all(passed for _, passed in tests)
 
+def test_all_endpoints():
+    """Under pytest: the checks above against a server at BASE_URL, skipped when none is running"""
+    import pytest
+    try:
+        requests.get(f"{BASE_URL}/health", timeout=2)
+    except requests.ConnectionError:
+        pytest.skip(f"no server at {BASE_URL}")
+    assert check_all_endpoints()
+
+def test_entry_stream_chunks():
+    """Data files stream the same at any chunk size, even with numbers split across chunks"""
+    import os
+    import sys
+    import tempfile
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+    from jsonstream import EntryStream
+
+    document = ('{"entries": [12.5, 1, -3e2, true, null, {"food": "Rice", "calories": 130.25}],'
+                ' "metadata": {"total_entries": 6}}')
+    expected = [12.5, 1, -300.0, True, None, {"food": "Rice", "calories": 130.25}]
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        f.write(document)
+    try:
+        for chunk_size in (1, 2, 3, 4, 5, 8, 16, 64, 1 << 16):
+            stream = EntryStream(f.name, chunk_size=chunk_size)
+            assert list(stream) == expected, chunk_size
+            assert stream.members == {"metadata": {"total_entries": 6}}, chunk_size
+    finally:
+        os.unlink(f.name)
+
 if __name__ == "__main__":
-    success = test_all_endpoints()
+    success = check_all_endpoints()
     exit(0 if success else 1)
\ No newline at end of file
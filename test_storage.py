@@ -0,0 +1,282 @@
+# backend/test_storage.py
+"""Offline tests of the entry store: run with `python -m pytest` from the repository root"""
+import os
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+import database  # noqa: E402
+import wal  # noqa: E402
+from entry import Entry, EntryError  # noqa: E402
+
+def make_entry(food='Rice', calories=130, protein=3, date='2026-10-01', category='Lunch', entry_id=None):
+    return Entry.parse({"food": food, "calories": calories, "protein": protein, "category": category,
+                        "date": date}, entry_id=entry_id or str(uuid.uuid4()))
+
+def open_store(path, durability='fsync', **kwargs):
+    kwargs.setdefault('background_compaction', False)
+    return database.EntryStore(str(path), durability=durability, **kwargs)
+
+def foods(store, archived=True):
+    return sorted(entry['food'] for entry in store.load(archived=archived))
+
+# ---- mutation log ----
+
+def test_replay_skips_torn_last_record(tmp_path):
+    store = open_store(tmp_path / 'shard')
+    for food in ('Rice', 'Eggs', 'Toast'):
+        store.add(make_entry(food))
+    # A crash in the middle of an append leaves half a record behind
+    with open(tmp_path / 'shard' / 'log.jsonl', 'ab') as f:
+        f.write(b'{"seq": 99, "op": "add", "entry": {"food": "Ha')
+
+    reopened = open_store(tmp_path / 'shard')
+    assert foods(reopened) == ['Eggs', 'Rice', 'Toast']
+    # The next append cuts the torn tail off instead of appending after it
+    reopened.add(make_entry('Soup'))
+    assert foods(open_store(tmp_path / 'shard')) == ['Eggs', 'Rice', 'Soup', 'Toast']
+
+@pytest.mark.parametrize('durability', wal.DURABILITY_MODES)
+def test_writes_survive_reopen(tmp_path, durability):
+    store = open_store(tmp_path / 'shard', durability)
+    kept, changed, dropped = make_entry('Rice'), make_entry('Eggs'), make_entry('Toast')
+    for entry in (kept, changed, dropped):
+        store.add(entry)
+    assert store.update(changed.id, make_entry('Omelette', 250, entry_id=changed.id))
+    assert store.delete(dropped.id)
+    store.update_settings(protein_goal=120)
+
+    reopened = open_store(tmp_path / 'shard', durability)
+    assert foods(reopened) == ['Omelette', 'Rice']
+    assert reopened.get_settings()['protein_goal'] == 120
+    # And again from a snapshot instead of the log
+    reopened.checkpoint()
+    assert foods(open_store(tmp_path / 'shard', durability)) == ['Omelette', 'Rice']
+
+def test_group_commit_batches_concurrent_writers(tmp_path, monkeypatch):
+    appends = []
+    append = wal.MutationLog.append
+    real_fsync = os.fsync
+
+    def counting_append(log, records):
+        appends.append(len(records))
+        return append(log, records)
+
+    def slow_fsync(fd):
+        # A slow disk: writers arriving meanwhile have to queue for the next batch
+        time.sleep(0.005)
+        real_fsync(fd)
+
+    monkeypatch.setattr(wal.MutationLog, 'append', counting_append)
+    monkeypatch.setattr(os, 'fsync', slow_fsync)
+    store = open_store(tmp_path / 'shard', 'group')
+    store.add(make_entry('First'))
+    appends.clear()
+
+    threads, writes = 8, 10
+    def writer(n):
+        for i in range(writes):
+            store.add(make_entry(f'Meal {n}-{i}'))
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sum(appends) == threads * writes
+    assert len(appends) < threads * writes
+    assert max(appends) > 1
+    assert len(open_store(tmp_path / 'shard').load()) == threads * writes + 1
+
+def test_lone_write_is_not_delayed(tmp_path):
+    store = open_store(tmp_path / 'shard', 'group')
+    store.add(make_entry())
+    start = time.perf_counter()
+    for _ in range(20):
+        store.add(make_entry())
+    # No batching window is waited out when no other writer is queued
+    assert (time.perf_counter() - start) / 20 < 0.05
+
+# ---- compaction ----
+
+def _write_batch(path, prefix, count, compact_every=0):
+    """Add count entries, rename every other one, delete every fourth; compacting as it goes"""
+    store = open_store(path, 'group')
+    for i in range(count):
+        entry_id = f'{prefix}-{i}'
+        store.add(make_entry(f'{prefix} {i}', date=f'2026-{9 + i % 2:02d}-{1 + i % 28:02d}', entry_id=entry_id))
+        if i % 2:
+            store.update(entry_id, make_entry(f'{prefix} {i} renamed', date=f'2026-08-{1 + i % 28:02d}',
+                                              entry_id=entry_id))
+        if i % 4 == 3:
+            store.delete(f'{prefix}-{i - 1}')
+        if compact_every and i % compact_every == 0:
+            store.compact()
+
+def _expected(prefix, count):
+    names = set()
+    for i in range(count):
+        if i % 4 == 2 and i + 1 < count:
+            continue  # deleted
+        names.add(f'{prefix} {i} renamed' if i % 2 else f'{prefix} {i}')
+    return names
+
+def test_compaction_races_writers_in_threads_and_processes(tmp_path):
+    import multiprocessing
+
+    path = tmp_path / 'shard'
+    open_store(path).add(make_entry('Seed', entry_id='seed'))
+    count = 60
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_write_batch, args=(path, f'proc{n}', count, 7)) for n in range(3)]
+    threads = [threading.Thread(target=_write_batch, args=(path, f'thread{n}', count)) for n in range(3)]
+    done = threading.Event()
+
+    def compact_loop():
+        store = open_store(path)
+        while not done.is_set():
+            store.compact()
+            time.sleep(0.002)
+
+    compactor = threading.Thread(target=compact_loop)
+    compactor.start()
+    for worker in processes + threads:
+        worker.start()
+    for worker in threads:
+        worker.join()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    done.set()
+    compactor.join()
+
+    expected = {'Seed'}
+    for prefix in [f'proc{n}' for n in range(3)] + [f'thread{n}' for n in range(3)]:
+        expected |= _expected(prefix, count)
+    for store in (open_store(path), open_store(path)):
+        assert set(foods(store)) == expected
+        assert len(store.load()) == len(expected)
+        store.compact()
+
+# ---- archive tier ----
+
+@pytest.fixture
+def archiving(monkeypatch):
+    """Archive the months before 2020-03, whatever today is"""
+    monkeypatch.setattr(database, 'archive_boundary', lambda today=None: '2020-03')
+
+def archive_files(path, month):
+    return sorted(name for name in os.listdir(path / 'entries') if name.startswith(month))
+
+def totals(store, start=None, end=None):
+    return sorted(store.archived_totals(start, end))
+
+def test_old_months_are_archived(tmp_path, archiving):
+    store = open_store(tmp_path / 'shard')
+    store.add(make_entry('Rice', 130, 3, '2020-01-05'))
+    store.add(make_entry('Eggs', 150, 12, '2020-01-05'))
+    store.add(make_entry('Soup', 90, 4, '2020-02-10', 'Dinner'))
+    store.add(make_entry('Toast', 80, 2, '2020-03-01'))
+    store.checkpoint()
+
+    assert store.archived_months() == ['2020-01', '2020-02']
+    assert store.segment_info()['2020-01']['file'].endswith(database.ARCHIVE_SUFFIX)
+    assert len(archive_files(tmp_path / 'shard', '2020-01')) == 2  # archive and index
+    assert not store.segment_info()['2020-03']['file'].endswith(database.ARCHIVE_SUFFIX)
+    expected = [(database.day_ordinal('2020-01-05'), 'Lunch', 280, 15, 2),
+                (database.day_ordinal('2020-02-10'), 'Dinner', 90, 4, 1)]
+    for reader in (store, open_store(tmp_path / 'shard')):
+        assert foods(reader, archived=False) == ['Toast']
+        assert foods(reader) == ['Eggs', 'Rice', 'Soup', 'Toast']
+        assert totals(reader) == expected
+        assert totals(reader, '2020-02-01', '2020-12-31') == expected[1:]
+
+def test_archived_entries_can_be_edited_and_deleted(tmp_path, archiving):
+    store = open_store(tmp_path / 'shard')
+    rice, eggs = make_entry('Rice', 130, 3, '2020-01-05'), make_entry('Eggs', 150, 12, '2020-01-05')
+    store.add(rice)
+    store.add(eggs)
+    store.checkpoint()
+
+    assert store.update(rice.id, make_entry('Brown rice', 200, 5, '2020-01-05', entry_id=rice.id))
+    assert store.delete(eggs.id)
+    expected = [(database.day_ordinal('2020-01-05'), 'Lunch', 200, 5, 1)]
+    # Read from the changed month until it is archived again, then from the new index
+    assert totals(store) == expected
+    assert totals(open_store(tmp_path / 'shard')) == expected
+    store.checkpoint()
+    reopened = open_store(tmp_path / 'shard')
+    assert totals(reopened) == expected
+    assert foods(reopened) == ['Brown rice']
+    assert reopened.segment_info()['2020-01']['file'].endswith(database.ARCHIVE_SUFFIX)
+
+    assert reopened.delete(rice.id)
+    reopened.checkpoint()
+    final = open_store(tmp_path / 'shard')
+    assert final.load(archived=True) == []
+    assert final.archived_months() == [] and totals(final) == []
+    assert archive_files(tmp_path / 'shard', '2020-01') == []
+
+def test_moving_an_entry_across_months_and_the_archive_boundary(tmp_path, archiving):
+    store = open_store(tmp_path / 'shard')
+    meal = make_entry('Rice', 130, 3, '2020-04-02')
+    store.add(meal)
+    store.add(make_entry('Eggs', 150, 12, '2020-01-05'))
+    store.checkpoint()
+
+    def move(date):
+        assert store.update(meal.id, make_entry('Rice', 130, 3, date, entry_id=meal.id))
+        for reader in (store, open_store(tmp_path / 'shard')):
+            assert [entry['date'] for entry in reader.load(archived=True) if entry['id'] == meal.id] == [date]
+            assert len(reader.load(archived=True)) == 2
+
+    # Across a month of the live tier
+    move('2020-03-20')
+    assert [entry['date'] for entry in store.load()] == ['2020-03-20']
+    assert '2020-04' not in store.segment_info()
+    # Into an archived month: raw reads skip it, its totals count it
+    move('2020-01-05')
+    assert store.load() == []
+    assert totals(store) == [(database.day_ordinal('2020-01-05'), 'Lunch', 280, 15, 2)]
+    # Into a month archived for the first time by the next checkpoint
+    move('2020-02-14')
+    store.checkpoint()
+    assert store.archived_months() == ['2020-01', '2020-02']
+    assert store.segment_info()['2020-02']['file'].endswith(database.ARCHIVE_SUFFIX)
+    # And back out of the archive tier
+    move('2020-03-01')
+    store.checkpoint()
+    reopened = open_store(tmp_path / 'shard')
+    assert [entry['food'] for entry in reopened.load()] == ['Rice']
+    assert reopened.archived_months() == ['2020-01']
+    assert totals(reopened) == [(database.day_ordinal('2020-01-05'), 'Lunch', 150, 12, 1)]
+
+# ---- entries ----
+
+@pytest.mark.parametrize('calories', [True, 300.7, '300.7', 'lots'])
+def test_calories_must_be_whole_numbers(calories):
+    with pytest.raises(EntryError):
+        Entry.parse({"food": "Rice", "calories": calories, "protein": 3, "category": "Lunch",
+                     "date": "2026-10-01"})
+
+def test_integral_numbers_are_accepted():
+    entry = Entry.parse({"food": "Rice", "calories": 300.0, "protein": "12", "category": "Lunch",
+                         "date": "2026-10-01"})
+    assert (entry.calories, entry.protein) == (300, 12)
+
+def test_update_takes_the_id_it_replaces(tmp_path):
+    store = open_store(tmp_path / 'shard')
+    meal = make_entry('Rice')
+    store.add(meal)
+    replacement = Entry.parse({"food": "Soup", "calories": 90, "protein": 4, "category": "Dinner",
+                               "date": "2026-10-01"})
+    assert store.update(meal.id, replacement)
+    assert [(entry['id'], entry['food']) for entry in open_store(tmp_path / 'shard').load()] == [(meal.id, 'Soup')]
+    with pytest.raises(ValueError):
+        store.update(meal.id, make_entry('Eggs'))
+    assert foods(store) == ['Soup']
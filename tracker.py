@@ -1,18 +1,41 @@
-import json
+import os
+import sys
 from datetime import date, timedelta
 from tabulate import tabulate
+
+# Share the entry model with the web backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from entry import Entry, EntryError, CATEGORIES, DEFAULT_CATEGORY
+import jsoncodec
+from jsonstream import iter_entries
+
 DATA_FILE = "data.json"
 BODY_WEIGHT = 70  # kg
 PROTEIN_GOAL = BODY_WEIGHT * 2
 
 
 def load_data():
-    with open(DATA_FILE, "r") as f:
-        return json.load(f)
+    with open(DATA_FILE, "rb") as f:
+        return jsoncodec.loads(f.read())
 
 def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    # Kept indented, the file is meant to be readable by hand
+    with open(DATA_FILE, "wb") as f:
+        f.write(jsoncodec.dumps(data, pretty=True))
+
+def load_entries():
+    """Load the data file and parse its entries once"""
+    data = load_data()
+    return data, [Entry.from_dict(e) for e in data["entries"]]
+
+def stream_entries():
+    """Entries one at a time, without loading the whole file (read-only views)"""
+    for raw in iter_entries(DATA_FILE):
+        yield Entry.from_dict(raw)
+
+def save_entries(data, entries):
+    data["entries"] = [e.to_dict() for e in entries]
+    save_data(data)
 
 def show_menu():
     print("\n" + "="*30)
@@ -27,12 +50,12 @@ def show_menu():
 
     
 def add_meal():
-    data = load_data()  # load existing entries
+    data, entries = load_entries()  # load existing entries
 
     print("\nEnter meal details:")
     food = input("Food name: ")
-    calories = int(input("Calories: "))
-    protein = int(input("Protein (g): "))
+    calories = input("Calories: ")
+    protein = input("Protein (g): ")
 
     # New: category
     print("Select category:")
@@ -42,36 +65,39 @@ def add_meal():
     print("4. Snack")
     category_choice = input("Choose 1-4: ")
     categories = {"1": "Breakfast", "2": "Lunch", "3": "Dinner", "4": "Snack"}
-    category = categories.get(category_choice, "Other")
+    category = categories.get(category_choice, DEFAULT_CATEGORY)
+
+    try:
+        entry = Entry.parse({
+            "date": str(date.today()),
+            "food": food,
+            "calories": calories,
+            "protein": protein,
+            "category": category
+        }, categories=CATEGORIES + (DEFAULT_CATEGORY,))
+    except EntryError as e:
+        print("Invalid meal: " + "; ".join(e.errors))
+        return
 
-    entry = {
-        "date": str(date.today()),
-        "food": food,
-        "calories": calories,
-        "protein": protein,
-        "category": category
-    }
-
-    data["entries"].append(entry)
-    save_data(data)
+    entries.append(entry)
+    save_entries(data, entries)
 
     print(f"✅ Meal added successfully under '{category}'.")
 
 
 def view_today():
-    data = load_data()
-    today = str(date.today())
+    entries = stream_entries()
+    today = date.today()
 
     total_cal = 0
     total_protein = 0
     category_totals = {}
 
-    for entry in data["entries"]:
-        if entry["date"] == today:
-            total_cal += entry["calories"]
-            total_protein += entry["protein"]
-            cat = entry.get("category", "Other")
-            category_totals[cat] = category_totals.get(cat, 0) + entry["calories"]
+    for entry in entries:
+        if entry.date == today:
+            total_cal += entry.calories
+            total_protein += entry.protein
+            category_totals[entry.category] = category_totals.get(entry.category, 0) + entry.calories
 
     print("\nToday's Total:")
     print(f"Calories: {total_cal}")
@@ -88,20 +114,19 @@ def view_today():
 
 
 def view_last_7_days():
-    data = load_data()
+    entries = stream_entries()
     today = date.today()
     start_date = today - timedelta(days=6)
 
     summary = {}
 
-    for entry in data["entries"]:
-        entry_date = date.fromisoformat(entry["date"])
-        if start_date <= entry_date <= today:
-            d = entry_date.isoformat()
+    for entry in entries:
+        if start_date <= entry.date <= today:
+            d = entry.date.isoformat()
             if d not in summary:
                 summary[d] = {"calories": 0, "protein": 0}
-            summary[d]["calories"] += entry["calories"]
-            summary[d]["protein"] += entry["protein"]
+            summary[d]["calories"] += entry.calories
+            summary[d]["protein"] += entry.protein
 
     # Build table
     table = []
@@ -119,21 +144,21 @@ def view_last_7_days():
 ))
 
 def edit_or_delete_meal():
-    data = load_data()
+    data, entries = load_entries()
     
     # Step 1: Ask for the date
     date_input = input("Enter the date of the meal (YYYY-MM-DD) or leave blank for today: ")
     if date_input.strip() == "":
-        target_date = str(date.today())
+        target_date = date.today()
     else:
         try:
-            target_date = str(date.fromisoformat(date_input))
+            target_date = date.fromisoformat(date_input)
         except ValueError:
             print("Invalid date format. Use YYYY-MM-DD.")
             return
 
     # Step 2: Filter meals by that date
-    meals_on_date = [entry for entry in data["entries"] if entry["date"] == target_date]
+    meals_on_date = [entry for entry in entries if entry.date == target_date]
 
     if not meals_on_date:
         print(f"\nNo meals found for {target_date}.")
@@ -142,7 +167,7 @@ def edit_or_delete_meal():
     # Step 3: Show meals on that date
     print(f"\nMeals on {target_date}:")
     for i, meal in enumerate(meals_on_date, start=1):
-        print(f"{i}. {meal['food']} - {meal['calories']} cal, {meal['protein']}g, {meal.get('category', 'Other')}")
+        print(f"{i}. {meal.food} - {meal.calories} cal, {meal.protein}g, {meal.category}")
 
     # Step 4: Choose a meal
     choice = input("\nEnter the number of the meal to edit/delete: ")
@@ -158,34 +183,45 @@ def edit_or_delete_meal():
     action = input("Type 'e' to edit or 'd' to delete: ").lower()
 
     if action == 'd':
-        data["entries"].remove(meal)
-        save_data(data)
+        entries.remove(meal)
+        save_entries(data, entries)
         print("✅ Meal deleted successfully.")
 
     elif action == 'e':
         # Step 6: Edit meal details
         print("\nLeave blank to keep current value.")
-        new_food = input(f"Food name [{meal['food']}]: ") or meal['food']
-        new_calories = input(f"Calories [{meal['calories']}]: ")
-        new_protein = input(f"Protein (g) [{meal['protein']}]: ")
+        new_food = input(f"Food name [{meal.food}]: ") or meal.food
+        new_calories = input(f"Calories [{meal.calories}]: ")
+        new_protein = input(f"Protein (g) [{meal.protein}]: ")
         print("Select category:")
         print("1. Breakfast  2. Lunch  3. Dinner  4. Snack")
-        new_category_choice = input(f"Category [{meal.get('category', 'Other')}]: ")
-
-        meal['food'] = new_food
-        meal['calories'] = int(new_calories) if new_calories else meal['calories']
-        meal['protein'] = int(new_protein) if new_protein else meal['protein']
+        new_category_choice = input(f"Category [{meal.category}]: ")
 
         categories = {"1": "Breakfast", "2": "Lunch", "3": "Dinner", "4": "Snack"}
-        meal['category'] = categories.get(new_category_choice, meal.get('category', 'Other'))
+        try:
+            updated = Entry.parse({
+                "date": meal.date.isoformat(),
+                "food": new_food,
+                "calories": new_calories or meal.calories,
+                "protein": new_protein or meal.protein,
+                "category": categories.get(new_category_choice, meal.category)
+            }, entry_id=meal.id, categories=CATEGORIES + (DEFAULT_CATEGORY,))
+        except EntryError as e:
+            print("Invalid meal: " + "; ".join(e.errors))
+            return
+        updated.extra = meal.extra
+        entries[entries.index(meal)] = updated
 
-        save_data(data)
+        save_entries(data, entries)
         print("✅ Meal updated successfully.")
 
     else:
         print("Invalid action.")
 
 def fix_missing_categories():
+    # Scan first; the whole file is only loaded when something needs fixing
+    if all("category" in entry for entry in iter_entries(DATA_FILE)):
+        return
     data = load_data()
     updated = False
     for entry in data["entries"]: